@@ -0,0 +1,137 @@
+"""faculty availability and leave tables
+
+Revision ID: 3f1c2a9d7b40
+Revises:
+Create Date: 2026-10-19 12:00:00.000000
+
+Moves faculty availability out of the legacy ``faculty.availability`` and
+``faculty.leaves`` JSON columns into faculty_availability and
+faculty_leaves, and adds the precomputed ``faculty.unavailable_mask``.
+Databases created by ``init_db.py`` may already have the tables, so each
+step only runs when its table or column is missing.
+"""
+from datetime import date, datetime
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b40'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _json(value):
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = inspector.get_table_names()
+
+    if 'faculty_availability' not in tables:
+        op.create_table(
+            'faculty_availability',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('faculty_id', sa.Integer(), nullable=False),
+            sa.Column('time_slot_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['faculty_id'], ['faculty.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['time_slot_id'], ['time_slots.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('faculty_id', 'time_slot_id', name='uq_faculty_availability_faculty_slot')
+        )
+        op.create_index('ix_faculty_availability_id', 'faculty_availability', ['id'])
+        op.create_index('ix_faculty_availability_slot_faculty', 'faculty_availability', ['time_slot_id', 'faculty_id'])
+
+    if 'faculty_leaves' not in tables:
+        op.create_table(
+            'faculty_leaves',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('faculty_id', sa.Integer(), nullable=False),
+            sa.Column('start_date', sa.Date(), nullable=False),
+            sa.Column('end_date', sa.Date(), nullable=False),
+            sa.Column('time_slot_id', sa.Integer(), nullable=True),
+            sa.Column('reason', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['faculty_id'], ['faculty.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['time_slot_id'], ['time_slots.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_faculty_leaves_id', 'faculty_leaves', ['id'])
+        op.create_index('ix_faculty_leaves_faculty_dates', 'faculty_leaves', ['faculty_id', 'start_date', 'end_date'])
+        op.create_index('ix_faculty_leaves_dates', 'faculty_leaves', ['start_date', 'end_date'])
+
+    if 'unavailable_mask' not in {column['name'] for column in inspector.get_columns('faculty')}:
+        with op.batch_alter_table('faculty') as batch_op:
+            batch_op.add_column(sa.Column('unavailable_mask', sa.BigInteger(), server_default='0', nullable=False))
+
+    # Carry over legacy JSON in the shapes the API accepts:
+    # {"unavailable_time_slot_ids": [...]} and a list of leave dicts
+    faculty = sa.table('faculty', sa.column('id'), sa.column('availability'), sa.column('leaves'),
+                       sa.column('unavailable_mask'))
+    availability = sa.table('faculty_availability', sa.column('faculty_id'), sa.column('time_slot_id'))
+    leaves = sa.table('faculty_leaves', sa.column('faculty_id'), sa.column('start_date'), sa.column('end_date'),
+                      sa.column('time_slot_id'), sa.column('reason'), sa.column('created_at'))
+    time_slots = sa.table('time_slots', sa.column('id'), sa.column('slot_number'))
+
+    slot_numbers = dict(bind.execute(sa.select(time_slots.c.id, time_slots.c.slot_number)).all())
+    existing = set(bind.execute(sa.select(availability.c.faculty_id, availability.c.time_slot_id)).tuples())
+    with_leaves = set(bind.scalars(sa.select(leaves.c.faculty_id).distinct()))
+    new_slots, new_leaves = [], []
+    for faculty_id, legacy_availability, legacy_leaves in bind.execute(
+        sa.select(faculty.c.id, faculty.c.availability, faculty.c.leaves)
+    ):
+        legacy_availability = _json(legacy_availability)
+        if isinstance(legacy_availability, dict):
+            for time_slot_id in legacy_availability.get('unavailable_time_slot_ids') or []:
+                if time_slot_id in slot_numbers and (faculty_id, time_slot_id) not in existing:
+                    existing.add((faculty_id, time_slot_id))
+                    new_slots.append({'faculty_id': faculty_id, 'time_slot_id': time_slot_id})
+        legacy_leaves = _json(legacy_leaves)
+        if isinstance(legacy_leaves, list) and faculty_id not in with_leaves:
+            for leave in legacy_leaves:
+                if not isinstance(leave, dict):
+                    continue
+                start, end = _date(leave.get('start_date')), _date(leave.get('end_date'))
+                if start is None or end is None or end < start:
+                    continue
+                time_slot_id = leave.get('time_slot_id')
+                new_leaves.append({
+                    'faculty_id': faculty_id, 'start_date': start, 'end_date': end,
+                    'time_slot_id': time_slot_id if time_slot_id in slot_numbers else None,
+                    'reason': leave.get('reason'), 'created_at': datetime.utcnow()
+                })
+    if new_slots:
+        op.bulk_insert(availability, new_slots)
+    if new_leaves:
+        op.bulk_insert(leaves, new_leaves)
+
+    masks = {}
+    for faculty_id, time_slot_id in existing:
+        if time_slot_id in slot_numbers:
+            masks[faculty_id] = masks.get(faculty_id, 0) | (1 << slot_numbers[time_slot_id])
+    for faculty_id, mask in masks.items():
+        bind.execute(faculty.update().where(faculty.c.id == faculty_id).values(unavailable_mask=mask))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('faculty') as batch_op:
+        batch_op.drop_column('unavailable_mask')
+    op.drop_index('ix_faculty_leaves_dates', table_name='faculty_leaves')
+    op.drop_index('ix_faculty_leaves_faculty_dates', table_name='faculty_leaves')
+    op.drop_index('ix_faculty_leaves_id', table_name='faculty_leaves')
+    op.drop_table('faculty_leaves')
+    op.drop_index('ix_faculty_availability_slot_faculty', table_name='faculty_availability')
+    op.drop_index('ix_faculty_availability_id', table_name='faculty_availability')
+    op.drop_table('faculty_availability')
@@ -0,0 +1,250 @@
+"""
+Synthetic campus generator for benchmarks and scale testing.
+
+``generate_campus`` builds a deterministic (seeded) campus as plain dicts
+with explicit ids, shaped like the scheduler input the frontend sends;
+``seed_campus`` bulk-inserts one into the database.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import time
+from typing import Dict, List, Tuple
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+from models import (
+    Classroom, Batch, Subject, Faculty, FacultySubject, ElectivePreference, TimeSlot
+)
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+
+# Hourly periods from 9:00 with the 13:00-14:00 lunch break left out, the
+# same grid init_db.py seeds for the app
+FIRST_HOUR = 9
+LUNCH_HOUR = 13
+
+# Named CampusParams overrides shared by init_db.py and the benchmark runner
+PROFILES = {
+    "small": dict(departments=1, batches_per_department=2, subjects_per_batch=4,
+                  classrooms_per_department=3, labs_per_department=1, faculty_per_department=4),
+    "medium": dict(departments=2, batches_per_department=3, subjects_per_batch=5, electives_per_batch=2,
+                   classrooms_per_department=4, labs_per_department=1, faculty_per_department=6),
+    "large": dict(departments=4, batches_per_department=4, subjects_per_batch=6, electives_per_batch=2,
+                  classrooms_per_department=5, labs_per_department=2, faculty_per_department=8),
+    "xlarge": dict(departments=8, batches_per_department=6, subjects_per_batch=6, electives_per_batch=3,
+                   classrooms_per_department=7, labs_per_department=2, faculty_per_department=10),
+    # 10,000 students, 300 rooms, 800 faculty on the full 5 x 8 grid
+    "campus": dict(departments=20, batches_per_department=10, subjects_per_batch=6, electives_per_batch=2,
+                   classrooms_per_department=12, labs_per_department=3, faculty_per_department=40,
+                   qualification_density=0.05, students_per_batch=50),
+}
+
+
+@dataclass
+class CampusParams:
+    """Size and shape of a synthetic campus."""
+    departments: int = 2
+    batches_per_department: int = 2
+    subjects_per_batch: int = 5
+    # Share of each batch's subjects that are labs (run as blocks in lab rooms)
+    lab_ratio: float = 0.2
+    # Elective subjects per batch, grouped into baskets from student preferences
+    electives_per_batch: int = 0
+    electives_per_student: int = 1
+    classrooms_per_department: int = 3
+    labs_per_department: int = 1
+    faculty_per_department: int = 5
+    # Chance a faculty member is qualified for each subject of their department
+    qualification_density: float = 0.4
+    students_per_batch: int = 60
+    classes_per_week: int = 3
+    days: int = 5
+    slots_per_day: int = 8
+
+
+@dataclass
+class Campus:
+    """Generated entities as scheduler-ready dicts."""
+    params: CampusParams
+    classrooms: List[dict] = field(default_factory=list)
+    batches: List[dict] = field(default_factory=list)
+    subjects: List[dict] = field(default_factory=list)
+    faculty: List[dict] = field(default_factory=list)
+    elective_preferences: List[dict] = field(default_factory=list)
+
+    @property
+    def constraints(self) -> dict:
+        return {"days": self.params.days, "slots_per_day": self.params.slots_per_day}
+
+    @property
+    def qualifications(self) -> List[Tuple[int, int]]:
+        return [(fac["id"], subject_id) for fac in self.faculty for subject_id in fac["subjects"]]
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "classrooms": len(self.classrooms),
+            "batches": len(self.batches),
+            "subjects": len(self.subjects),
+            "faculty": len(self.faculty),
+            "qualifications": len(self.qualifications),
+            "elective_preferences": len(self.elective_preferences),
+            "classes": sum(subject["classes_per_week"] for subject in self.subjects)
+        }
+
+    def scheduler_input(self) -> dict:
+        """Request body for ``/api/generate``; qualifications are read from the database."""
+        return {
+            "classrooms": self.classrooms,
+            "faculty": [{key: value for key, value in fac.items() if key != "subjects"} for fac in self.faculty],
+            "subjects": self.subjects,
+            "batches": self.batches,
+            "constraints": self.constraints
+        }
+
+
+def generate_campus(params: CampusParams, seed: int = 0) -> Campus:
+    """
+    Generate a campus for ``params``.
+
+    Every subject is taught to a single batch and has at least one
+    qualified faculty member from its department. Lab rooms are sized for
+    a full batch so the campus is feasible whenever there are enough rooms
+    and faculty hours.
+    """
+    rng = random.Random(seed)
+    campus = Campus(params=params)
+    ids = {"room": 0, "batch": 0, "subject": 0, "faculty": 0, "student": 0}
+
+    def next_id(kind):
+        ids[kind] += 1
+        return ids[kind]
+
+    for dept_index in range(params.departments):
+        department = f"Department {dept_index + 1}"
+        prefix = f"D{dept_index + 1:02d}"
+
+        for number in range(params.classrooms_per_department):
+            campus.classrooms.append({
+                "id": next_id("room"), "name": f"{prefix} Room {number + 1}",
+                "capacity": rng.choice([params.students_per_batch, params.students_per_batch + 20]),
+                "type": "classroom", "building": prefix, "floor": number // 4
+            })
+        for number in range(params.labs_per_department):
+            campus.classrooms.append({
+                "id": next_id("room"), "name": f"{prefix} Lab {number + 1}",
+                "capacity": params.students_per_batch, "type": "lab",
+                "building": prefix, "floor": number // 4
+            })
+
+        department_subjects = []
+        for batch_index in range(params.batches_per_department):
+            batch = {
+                "id": next_id("batch"), "name": f"{prefix}-{batch_index + 1}", "program": "UG",
+                "department": department, "year": batch_index % 4 + 1,
+                "semester": (batch_index % 4) * 2 + 1, "student_count": params.students_per_batch,
+                "shift": "morning"
+            }
+            campus.batches.append(batch)
+
+            labs = round(params.subjects_per_batch * params.lab_ratio)
+            kinds = ["lab"] * labs + ["core"] * (params.subjects_per_batch - labs) + ["elective"] * params.electives_per_batch
+            electives = []
+            for number, kind in enumerate(kinds):
+                subject_id = next_id("subject")
+                subject = {
+                    "id": subject_id, "code": f"{batch['name']}-{number + 1:02d}",
+                    "name": f"{batch['name']} {kind.title()} {number + 1}", "department": department,
+                    "type": kind, "credits": 4 if kind == "lab" else 3,
+                    "hours_per_week": params.classes_per_week, "requires_lab": kind == "lab",
+                    "batch_id": batch["id"], "classes_per_week": params.classes_per_week
+                }
+                campus.subjects.append(subject)
+                department_subjects.append(subject_id)
+                if kind == "elective":
+                    electives.append(subject_id)
+
+            if electives:
+                for _ in range(params.students_per_batch):
+                    student_id = next_id("student")
+                    choices = rng.sample(electives, min(params.electives_per_student, len(electives)))
+                    for priority, subject_id in enumerate(choices, start=1):
+                        campus.elective_preferences.append({
+                            "student_id": student_id, "batch_id": batch["id"],
+                            "subject_id": subject_id, "priority": priority
+                        })
+
+        department_faculty = []
+        for number in range(params.faculty_per_department):
+            fac_id = next_id("faculty")
+            fac = {
+                "id": fac_id, "name": f"{prefix} Faculty {number + 1}",
+                "employee_id": f"{prefix}-F{number + 1:03d}", "department": department,
+                "email": f"{prefix.lower()}.f{number + 1}@campus.example", "max_hours_per_week": 20,
+                "subjects": [sid for sid in department_subjects if rng.random() < params.qualification_density]
+            }
+            department_faculty.append(fac)
+            campus.faculty.append(fac)
+
+        # Every subject needs someone to teach it
+        if department_faculty:
+            for subject_id in department_subjects:
+                if not any(subject_id in fac["subjects"] for fac in department_faculty):
+                    rng.choice(department_faculty)["subjects"].append(subject_id)
+
+    return campus
+
+
+def _time_slot_rows(params: CampusParams) -> List[dict]:
+    rows = []
+    for day_index in range(params.days):
+        for period in range(params.slots_per_day):
+            start = FIRST_HOUR + period
+            if start >= LUNCH_HOUR:
+                start += 1
+            rows.append({
+                "day": DAYS[day_index % len(DAYS)],
+                "start_time": time(start % 24, 0),
+                "end_time": time((start + 1) % 24, 0),
+                "slot_number": day_index * params.slots_per_day + period
+            })
+    return rows
+
+
+def seed_campus(db: Session, campus: Campus, time_slots: bool = True) -> None:
+    """
+    Insert a generated campus with executemany inserts and one commit.
+
+    Ids are kept as generated, so the target tables must be empty. Anything
+    already added to ``db`` is committed in the same transaction.
+    """
+    columns = {
+        Classroom: ("id", "name", "capacity", "type", "building", "floor"),
+        Batch: ("id", "name", "program", "department", "year", "semester", "student_count", "shift"),
+        Subject: ("id", "code", "name", "department", "type", "credits", "hours_per_week", "requires_lab"),
+        Faculty: ("id", "name", "employee_id", "department", "email", "max_hours_per_week"),
+    }
+    try:
+        if time_slots:
+            db.execute(insert(TimeSlot), _time_slot_rows(campus.params))
+        for model, rows in ((Classroom, campus.classrooms), (Batch, campus.batches),
+                            (Subject, campus.subjects), (Faculty, campus.faculty)):
+            if rows:
+                db.execute(insert(model), [{key: row[key] for key in columns[model]} for row in rows])
+        if campus.qualifications:
+            db.execute(insert(FacultySubject), [
+                {"faculty_id": fac_id, "subject_id": subject_id} for fac_id, subject_id in campus.qualifications
+            ])
+        if campus.elective_preferences:
+            db.execute(insert(ElectivePreference), campus.elective_preferences)
+        if db.get_bind().dialect.name == "postgresql":
+            # Explicit ids do not advance the serial sequences
+            for model in (Classroom, Batch, Subject, Faculty):
+                table = model.__tablename__
+                db.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {table}), false)"
+                ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
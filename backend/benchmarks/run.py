@@ -0,0 +1,268 @@
+"""
+Benchmark timetable generation and the API at several campus scales.
+
+Run from the backend directory:
+
+    python -m benchmarks.run --scales small,medium --output results.json
+
+Each scale seeds a fresh database (a temporary SQLite file unless
+``--database-url`` is given) with a synthetic campus, then times problem
+loading, the greedy draft, model build and solve, conflict checking,
+``create_timetable`` persistence and the read endpoints. Results are written as JSON so runs
+from different versions can be compared.
+"""
+import argparse
+import gzip
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from dataclasses import asdict
+from datetime import datetime
+from time import perf_counter
+
+# Read endpoints timed per scale; {id} is the timetable saved by the run
+READ_ENDPOINTS = [
+    "/api/dashboard/stats",
+    "/api/classrooms",
+    "/api/batches",
+    "/api/subjects",
+    "/api/faculty",
+    "/api/timetables",
+    "/api/timetables/{id}",
+    "/api/timetables/{id}?format=compact",
+    "/api/timetables/{id}/export/csv",
+]
+
+BENCH_USER = ("benchmark", "benchmark123")
+
+
+def summarize(samples):
+    """Timing summary in seconds."""
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        "max": ordered[-1],
+        "mean": statistics.fmean(ordered)
+    }
+
+
+def timed(fn, repeat=1):
+    """Call ``fn`` ``repeat`` times; returns the last result and the timing summary."""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = perf_counter()
+        result = fn()
+        samples.append(perf_counter() - started)
+    return result, summarize(samples)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def distinct_solutions(solutions):
+    """Solutions that differ as sets of (batch, subject, day, slot, classroom, faculty) entries."""
+    return len({
+        frozenset((e["batch"], e["subject"], e["day"], e["slot"], e["classroom"], e["faculty"]) for e in entries)
+        for entries in solutions
+    })
+
+
+def benchmark_scale(name, seed, repeat, num_solutions, engine="full", search=None, hint=True):
+    """Seed a fresh database with one campus and time every stage against it."""
+    from database import Base, SessionLocal, engine as db_engine
+    from scheduler import TimetableScheduler
+    from services.auth_service import AuthService
+    from services.dashboard_service import invalidate_stats_cache
+    from services.data_service import TimetableService
+    from services.scheduling_service import SchedulingService
+    from benchmarks.campus import PROFILES, CampusParams, generate_campus, seed_campus
+
+    Base.metadata.drop_all(bind=db_engine)
+    Base.metadata.create_all(bind=db_engine)
+    invalidate_stats_cache()
+
+    params = CampusParams(**PROFILES[name])
+    campus = generate_campus(params, seed=seed)
+    result = {"scale": name, "seed": seed, "params": asdict(params), "counts": campus.counts()}
+
+    db = SessionLocal()
+    try:
+        _, result["seed_database"] = timed(lambda: seed_campus(db, campus))
+        user = AuthService(db).create_user(*BENCH_USER, "admin")
+        body = campus.scheduler_input()
+        body["constraints"]["engine"] = engine
+        body["constraints"].update(search or {})
+
+        problem, result["load_problem"] = timed(
+            lambda: SchedulingService(db).load_problem(
+                body["classrooms"], body["faculty"], body["subjects"], body["batches"], body["constraints"]
+            ),
+            repeat
+        )
+
+        scheduler = TimetableScheduler(**problem)
+        (draft, unscheduled), result["greedy"] = timed(scheduler.greedy_schedule, repeat)
+        result["greedy"]["conflicts"] = len(scheduler.check_conflicts([draft]))
+        result["greedy"]["unscheduled_classes"] = sum(item["classes"] for item in unscheduled)
+        
+        solutions, generate_timing = timed(lambda: scheduler.generate_schedules(num_solutions, hint=hint))
+        result["generate"] = dict(
+            scheduler.stats, seconds=generate_timing["max"], distinct_solutions=distinct_solutions(solutions)
+        )
+
+        conflicts, result["check_conflicts"] = timed(lambda: scheduler.check_conflicts(solutions), repeat)
+        result["check_conflicts"]["conflicts"] = len(conflicts)
+
+        if not solutions:
+            result["create_timetable"] = {"skipped": "no solution"}
+            result["endpoints"] = {"skipped": "no solution"}
+            return result
+
+        entries = solutions[0]
+        timetable, result["create_timetable"] = timed(
+            lambda: TimetableService(db).create_timetable(f"Benchmark {name}", entries, user.id)
+        )
+        result["create_timetable"]["entries"] = len(entries)
+        timetable_id = timetable.id
+        result["serialization"] = benchmark_serialization(db, timetable, repeat)
+    finally:
+        db.close()
+
+    result["endpoints"] = benchmark_endpoints(timetable_id, repeat)
+    return result
+
+
+def json_encoders():
+    """JSON encoders available to the API: stdlib (JSONResponse) and orjson when installed."""
+    encoders = {"json": lambda data: json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")}
+    try:
+        import orjson
+        encoders["orjson"] = orjson.dumps
+    except ImportError:
+        pass
+    return encoders
+
+
+def benchmark_serialization(db, timetable, repeat):
+    """Build and encode the full and compact timetable formats; payload sizes raw and gzipped."""
+    from services.timetable_view_service import TimetableViewService
+
+    service = TimetableViewService(db)
+    results = {}
+    for name, build in (("full", service.full), ("compact", service.compact)):
+        payload, build_timing = timed(lambda: build([timetable]), repeat)
+        results[name] = {"build": build_timing}
+        for encoder, encode in json_encoders().items():
+            body, encode_timing = timed(lambda: encode(payload), repeat)
+            encode_timing["bytes"] = len(body)
+            encode_timing["gzip_bytes"] = len(gzip.compress(body, compresslevel=9))
+            results[name][encoder] = encode_timing
+    return results
+
+
+def benchmark_endpoints(timetable_id, repeat):
+    """Time the read endpoints through the ASGI app, without a network hop."""
+    try:
+        from fastapi.testclient import TestClient
+    except ImportError as e:  # TestClient needs httpx, which is not a runtime dependency
+        return {"skipped": str(e)}
+    import main
+
+    client = TestClient(main.app)
+    login = client.post("/api/login", json={"username": BENCH_USER[0], "password": BENCH_USER[1]})
+    headers = {"Authorization": f"Bearer {login.json()['token']}"}
+
+    timings = {}
+    for path in READ_ENDPOINTS:
+        url = path.format(id=timetable_id)
+        response, timing = timed(lambda: client.get(url, headers=headers), repeat)
+        timing["status_code"] = response.status_code
+        timing["bytes"] = len(response.content)
+        timings[f"GET {path}"] = timing
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scales", default="small,medium",
+                        help="Comma-separated profiles from benchmarks/campus.py: small, medium, large, xlarge, campus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per timed read operation")
+    parser.add_argument("--solutions", type=int, default=1, help="Solutions requested from the solver")
+    parser.add_argument("--engine", default="full", help="Scheduler engine: full or decomposed")
+    parser.add_argument("--decision-strategy", default="none",
+                        help="none, or difficulty to branch on the hardest classes first")
+    parser.add_argument("--search-branching", default="automatic", help="automatic, fixed or portfolio")
+    parser.add_argument("--no-hint", action="store_true",
+                        help="Solve without the greedy hint, to time the solver's own first solution")
+    parser.add_argument("--database-url", help="Database to benchmark against; its tables are dropped")
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    # database.py reads DATABASE_URL on import, so set it before importing the app
+    workdir = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        workdir = tempfile.TemporaryDirectory(prefix="timetable-bench-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir.name, 'bench.db')}"
+
+    from ortools import __version__ as ortools_version
+    from scheduler import MODEL_VERSION
+    from benchmarks.campus import PROFILES
+
+    scales = [scale.strip() for scale in args.scales.split(",") if scale.strip()]
+    unknown = [scale for scale in scales if scale not in PROFILES]
+    if unknown:
+        parser.error(f"unknown scales: {', '.join(unknown)}")
+
+    report = {
+        "started_at": datetime.utcnow().isoformat(),
+        "git_commit": git_commit(),
+        "model_version": MODEL_VERSION,
+        "engine": args.engine,
+        "decision_strategy": args.decision_strategy,
+        "search_branching": args.search_branching,
+        "hint": not args.no_hint,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "ortools": ortools_version,
+        "database": "sqlite (temporary)" if workdir else args.database_url.split("://")[0],
+        "results": []
+    }
+    search = {"decision_strategy": args.decision_strategy, "search_branching": args.search_branching}
+    try:
+        for scale in scales:
+            print(f"[..] {scale}", file=sys.stderr)
+            report["results"].append(
+                benchmark_scale(scale, args.seed, args.repeat, args.solutions, args.engine, search, not args.no_hint)
+            )
+    finally:
+        if workdir:
+            workdir.cleanup()
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"[OK] Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
+import metrics
+import profiling
 
 load_dotenv()
 
@@ -19,6 +21,8 @@ engine = create_engine(
     pool_pre_ping=True,
     echo=False
 )
+metrics.instrument_engine(engine)
+profiling.instrument_engine(engine)
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
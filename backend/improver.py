@@ -0,0 +1,303 @@
+"""
+Large Neighbourhood Search over an existing timetable.
+
+Each iteration frees one neighbourhood (a batch's week, a day, or a faculty
+member's week), re-solves it with ``TimetableScheduler.optimize_schedule``
+while every other class stays where it is, and keeps the result when it
+lowers the penalty. Small sub-problems solve in well under a second, and
+classes outside the neighbourhood never move.
+"""
+import random
+import time
+
+from scheduler import REPEAT_PENALTY, TimetableScheduler
+
+NEIGHBOURHOODS = ('batch', 'day', 'faculty')
+
+# Consecutive iterations without an improvement after which LNS gives up
+STALL_ITERATIONS = 50
+
+
+class TimetableImprover:
+    """
+    Improve a feasible schedule (entries as returned by the scheduler).
+
+    The penalty is the quality objective of ``optimize_schedule``: empty
+    seats per period plus REPEAT_PENALTY for each extra class of a subject
+    on one day. Fixed entries never move. Electives sharing a batch period
+    are a basket: its members are freed and re-placed together. ``occupied``
+    classes of other timetables are scheduler input as for generation.
+    """
+    def __init__(self, classrooms, faculty, subjects, batches, constraints, schedule, seed=None,
+                 max_free=200, occupied=None):
+        self.classrooms = classrooms
+        self.faculty = faculty
+        self.batches = batches
+        self.constraints = constraints
+        self.max_free = max_free
+        self.occupied = occupied or []
+        self.random = random.Random(seed)
+        self.slots_per_day = constraints.get('slots_per_day', 8)
+        self.days = constraints.get('days', 5)
+
+        self.fixed = [entry for entry in schedule if entry.get('is_fixed')]
+        self.fixed_periods = {}
+        for entry in self.fixed:
+            key = (entry['batch'], entry['subject'])
+            self.fixed_periods[key] = self.fixed_periods.get(key, 0) + 1
+        self.subjects = {(s['batch_id'], s['id']): s for s in subjects}
+        # Block lengths as the scheduler derives them, for these constraints
+        lengths_of = TimetableScheduler(classrooms, faculty, subjects, batches, constraints)
+        self.block_lengths = {key: lengths_of._block_length(s) for key, s in self.subjects.items()}
+        self.blocks, self.pinned = self._to_blocks([e for e in schedule if not e.get('is_fixed')])
+        self.periods = self._periods(self.blocks)
+        self.elective_baskets = self._baskets()
+        self._capacity = {room['id']: room.get('capacity') for room in classrooms}
+        self._students = {batch['id']: batch.get('student_count') for batch in batches}
+
+    def _to_blocks(self, entries):
+        """
+        (batch, subject, start, classroom, faculty) blocks of per-period entries.
+
+        Returns (blocks, pinned). Subjects whose periods do not cut into
+        blocks of their length within a day, whose fixed entries leave a
+        block partly covered, or that are unknown, are pinned: kept in
+        place as one-period blocks.
+        """
+        blocks, stuck = self._cut(entries)
+        stuck |= {key for key, periods in self.fixed_periods.items()
+                  if periods % self.block_lengths.get(key, 1)}
+        pinned = []
+        for entry in entries:
+            key = (entry['batch'], entry['subject'])
+            if key in stuck or key not in self.block_lengths:
+                self.block_lengths[key] = 1
+                pinned.append((entry['batch'], entry['subject'], entry['day'] * self.slots_per_day + entry['slot'],
+                               entry['classroom'], entry['faculty']))
+        blocks = [block for block in blocks if block[:2] not in stuck and block[:2] in self.subjects]
+        return blocks, pinned
+
+    def _cut(self, entries):
+        """
+        Cut entries into blocks of their subject's length.
+
+        Periods of a class with one room and teacher are taken in order,
+        ``length`` at a time; returns the blocks and the (batch, subject)
+        pairs where such a chunk is not consecutive within one day.
+        """
+        runs = {}
+        for entry in entries:
+            key = (entry['batch'], entry['subject'], entry['classroom'], entry['faculty'])
+            runs.setdefault(key, []).append(entry['day'] * self.slots_per_day + entry['slot'])
+        blocks, stuck = [], set()
+        for (batch_id, subject_id, room_id, fac_id), slots in runs.items():
+            length = self.block_lengths.get((batch_id, subject_id), 1)
+            slots.sort()
+            for i in range(0, len(slots), length):
+                chunk = slots[i:i + length]
+                if (len(chunk) != length or chunk[-1] - chunk[0] != length - 1
+                        or chunk[0] // self.slots_per_day != chunk[-1] // self.slots_per_day):
+                    stuck.add((batch_id, subject_id))
+                    break
+                blocks.append((batch_id, subject_id, chunk[0], room_id, fac_id))
+        return blocks, stuck
+
+    def _baskets(self):
+        """batch -> lists of electives found running in parallel in the schedule."""
+        parent = {}
+
+        def find(key):
+            while parent.setdefault(key, key) != key:
+                key = parent[key]
+            return key
+
+        by_period = {}
+        for batch_id, subject_id, start, _, _ in self.blocks + self.pinned:
+            for slot in range(start, start + self.block_lengths[(batch_id, subject_id)]):
+                by_period.setdefault((batch_id, slot), set()).add(subject_id)
+        for (batch_id, _), subject_ids in by_period.items():
+            first, *others = sorted(subject_ids)
+            for other in others:
+                parent[find((batch_id, other))] = find((batch_id, first))
+
+        groups = {}
+        for key in list(parent):
+            groups.setdefault(find(key), []).append(key[1])
+        baskets = {}
+        for (batch_id, _), members in groups.items():
+            if len(members) > 1:
+                baskets.setdefault(batch_id, []).append(sorted(members))
+        return baskets
+
+    def _periods(self, blocks):
+        """(batch, subject) -> periods scheduled by blocks and pinned entries."""
+        periods = {}
+        for batch_id, subject_id, _, _, _ in list(blocks) + self.pinned:
+            key = (batch_id, subject_id)
+            periods[key] = periods.get(key, 0) + self.block_lengths[key]
+        return periods
+    
+    def penalty(self, blocks=None):
+        """Empty seats per period plus REPEAT_PENALTY per extra class of a subject on one day."""
+        blocks = self.blocks if blocks is None else blocks
+        waste = 0
+        per_day = {}
+        for batch_id, subject_id, start, room_id, _ in list(blocks) + self.pinned:
+            length = self.block_lengths[(batch_id, subject_id)]
+            waste += length * self._waste_of(batch_id, room_id)
+            key = (batch_id, subject_id, start // self.slots_per_day)
+            per_day[key] = per_day.get(key, 0) + 1
+        repeats = sum(count - 1 for count in per_day.values() if count > 1)
+        return waste + REPEAT_PENALTY * repeats
+
+    def _waste_of(self, batch_id, room_id):
+        """Empty seats when a batch sits in a room."""
+        capacity, students = self._capacity.get(room_id), self._students.get(batch_id)
+        return max(capacity - students, 0) if capacity is not None and students is not None else 0
+
+    def schedule(self):
+        """The current schedule as entries: fixed ones first, then one per period of each class."""
+        entries = [dict(entry) for entry in self.fixed]
+        for batch_id, subject_id, start, room_id, fac_id in self.blocks + self.pinned:
+            for slot in range(start, start + self.block_lengths[(batch_id, subject_id)]):
+                entries.append({
+                    'batch': batch_id,
+                    'subject': subject_id,
+                    'day': slot // self.slots_per_day,
+                    'slot': slot % self.slots_per_day,
+                    'classroom': room_id,
+                    'faculty': fac_id
+                })
+        return entries
+
+    def improve(self, time_limit=30.0, iteration_limit=5.0, stall_limit=STALL_ITERATIONS):
+        """
+        Run LNS for up to ``time_limit`` seconds, yielding progress.
+
+        Stops early once the penalty is 0, its lower bound, or after
+        ``stall_limit`` iterations in a row without an improvement.
+
+        Every iteration yields a dict with the neighbourhood tried, the
+        number of classes freed, its outcome ('improved', 'rejected',
+        'infeasible', or 'timeout' when nothing was found in time), the
+        current penalty and the elapsed seconds. Each sub-problem gets at
+        most ``iteration_limit`` seconds. A candidate scheduling any
+        subject for more or fewer periods than now is rejected.
+        """
+        started = time.perf_counter()
+        current = self.penalty()
+        iteration = stalled = 0
+        while self.blocks and current > 0 and stalled < stall_limit:
+            elapsed = time.perf_counter() - started
+            if elapsed >= time_limit:
+                break
+            iteration += 1
+            kind, target, freed = self._neighbourhood()
+            outcome = 'rejected'
+            if freed:
+                blocks, status = self._resolve(freed, min(iteration_limit, time_limit - elapsed))
+                if blocks is None:
+                    outcome = 'infeasible' if status == 'INFEASIBLE' else 'timeout'
+                else:
+                    freed_set = set(freed)
+                    candidate = [b for b in self.blocks if b not in freed_set] + blocks
+                    score = self.penalty(candidate)
+                    if score < current and self._periods(candidate) == self.periods:
+                        self.blocks, current = candidate, score
+                        outcome = 'improved'
+            stalled = 0 if outcome == 'improved' else stalled + 1
+            yield {
+                'iteration': iteration,
+                'neighbourhood': kind,
+                'target': target,
+                'freed_classes': len(freed),
+                'outcome': outcome,
+                'penalty': current,
+                'seconds': time.perf_counter() - started
+            }
+
+    def _neighbourhood(self):
+        """A random (kind, target, freed blocks); basket sessions are freed whole."""
+        kind = self.random.choice(NEIGHBOURHOODS)
+        if kind == 'batch':
+            target = self.random.choice(sorted({block[0] for block in self.blocks}))
+            chosen = [block for block in self.blocks if block[0] == target]
+        elif kind == 'day':
+            target = self.random.choice(sorted({block[2] // self.slots_per_day for block in self.blocks}))
+            chosen = [block for block in self.blocks if block[2] // self.slots_per_day == target]
+        else:
+            target = self.random.choice(sorted({block[4] for block in self.blocks}))
+            chosen = [block for block in self.blocks if block[4] == target]
+
+        # Group into units that must move together: a basket session
+        basket_of = {
+            (batch_id, subject_id): tuple(basket)
+            for batch_id, baskets in self.elective_baskets.items()
+            for basket in baskets for subject_id in basket
+        }
+        sessions = {}
+        for block in self.blocks:
+            basket = basket_of.get(block[:2])
+            if basket:
+                sessions.setdefault((block[0], basket, block[2]), []).append(block)
+        units, seen = [], set()
+        for block in chosen:
+            basket = basket_of.get(block[:2])
+            key = (block[0], basket, block[2]) if basket else block
+            if key not in seen:
+                seen.add(key)
+                units.append(sessions[key] if basket else [block])
+
+        self.random.shuffle(units)
+        freed = []
+        for unit in units:
+            if freed and len(freed) + len(unit) > self.max_free:
+                break
+            freed.extend(unit)
+        return kind, target, freed
+
+    def _resolve(self, freed, time_limit):
+        """(best placement of the freed blocks with all others fixed or None, solver status)."""
+        freed_set = set(freed)
+        fixed_slots = [
+            {
+                'batch': f['batch'], 'subject': f['subject'], 'faculty': f['faculty'],
+                'classroom': f['classroom'], 'slot': f['day'] * self.slots_per_day + f['slot']
+            }
+            for f in self.fixed
+        ]
+        # Fixed entries count toward classes_per_week as the scheduler
+        # subtracts them; _to_blocks pinned subjects where they are no
+        # whole number of blocks
+        counts = {key: periods // self.block_lengths[key] for key, periods in self.fixed_periods.items()
+                  if key in self.block_lengths}
+        for batch_id, subject_id, start, room_id, fac_id in self.blocks + self.pinned:
+            key = (batch_id, subject_id)
+            counts[key] = counts.get(key, 0) + 1
+            if (batch_id, subject_id, start, room_id, fac_id) in freed_set:
+                continue
+            for slot in range(start, start + self.block_lengths[key]):
+                fixed_slots.append({
+                    'batch': batch_id, 'subject': subject_id, 'faculty': fac_id,
+                    'classroom': room_id, 'slot': slot
+                })
+
+        keys = {block[:2] for block in freed}
+        batch_ids = {key[0] for key in keys}
+        subjects = [
+            dict(self.subjects[key], classes_per_week=counts[key], block_length=self.block_lengths[key])
+            for key in sorted(keys)
+        ]
+        scheduler = TimetableScheduler(
+            self.classrooms, self.faculty, subjects,
+            [batch for batch in self.batches if batch['id'] in batch_ids],
+            self.constraints, fixed_slots,
+            {b: baskets for b, baskets in self.elective_baskets.items() if b in batch_ids},
+            self.occupied
+        )
+        schedule, _ = scheduler.optimize_schedule(time_limit, hint_blocks=freed)
+        status = scheduler.stats['status']
+        if schedule is None:
+            return None, status
+        blocks, stuck = self._cut([entry for entry in schedule if not entry.get('is_fixed')])
+        return (None if stuck else blocks), status
@@ -1,9 +1,25 @@
 """Initialize database with sample data for testing."""
+import argparse
+from time import perf_counter
+
 from database import SessionLocal, engine, Base
 from services.auth_service import AuthService
+from auth import hash_password
 from models import *
 from datetime import time
 
+def default_constraints():
+    """Default scheduling constraints."""
+    return SchedulingConstraints(
+        classes_per_day_min=4,
+        classes_per_day_max=8,
+        classes_per_week=30,
+        break_duration_minutes=10,
+        lunch_break_start=time(13, 0),
+        lunch_break_end=time(14, 0),
+        target_utilization_rate=0.8
+    )
+
 def init_database():
     """Create tables and populate with sample data."""
     # Create all tables
@@ -107,16 +123,7 @@ def init_database():
         
         # Create default scheduling constraints
         if db.query(SchedulingConstraints).count() == 0:
-            constraints = SchedulingConstraints(
-                classes_per_day_min=4,
-                classes_per_day_max=8,
-                classes_per_week=30,
-                break_duration_minutes=10,
-                lunch_break_start=time(13, 0),
-                lunch_break_end=time(14, 0),
-                target_utilization_rate=0.8
-            )
-            db.add(constraints)
+            db.add(default_constraints())
             db.commit()
             print("[OK] Created default scheduling constraints")
         
@@ -129,5 +136,57 @@ def init_database():
     finally:
         db.close()
 
+def seed_profile(profile: str, seed: int = 0):
+    """
+    Create tables and seed a synthetic campus from ``benchmarks/campus.py``.
+    
+    The campus, admin user and default constraints are bulk inserted in one
+    transaction. The same profile and seed always produce the same data.
+    """
+    # Only needed here, so the normal startup path does not import the generator
+    from benchmarks.campus import PROFILES, CampusParams, generate_campus, seed_campus
+    
+    Base.metadata.create_all(bind=engine)
+    
+    db = SessionLocal()
+    
+    try:
+        seeded = [model.__tablename__ for model in (TimeSlot, Classroom, Batch, Subject, Faculty)
+                  if db.query(model).first() is not None]
+        if seeded:
+            print(f"[ERROR] Database already has data in: {', '.join(seeded)}")
+            return
+        
+        started = perf_counter()
+        campus = generate_campus(CampusParams(**PROFILES[profile]), seed=seed)
+        
+        if not AuthService(db).get_user_by_username("admin"):
+            db.add(User(username="admin", password_hash=hash_password("admin123"), role="admin"))
+        if db.query(SchedulingConstraints).count() == 0:
+            db.add(default_constraints())
+        seed_campus(db, campus)
+        
+        counts = ", ".join(f"{count} {name}" for name, count in campus.counts().items())
+        print(f"[OK] Seeded '{profile}' profile (seed {seed}) in {perf_counter() - started:.1f}s: {counts}")
+        print("   Login with: admin / admin123")
+        
+    except Exception as e:
+        print(f"[ERROR] Error seeding database: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
 if __name__ == "__main__":
-    init_database()
+    parser = argparse.ArgumentParser(description="Initialize the database")
+    parser.add_argument("--profile",
+                        help="Seed a synthetic campus of this size (benchmarks.campus.PROFILES) instead of the demo data")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for --profile")
+    args = parser.parse_args()
+    
+    if args.profile:
+        from benchmarks.campus import PROFILES
+        if args.profile not in PROFILES:
+            parser.error(f"argument --profile: invalid choice: {args.profile!r} (choose from {', '.join(sorted(PROFILES))})")
+        seed_profile(args.profile, args.seed)
+    else:
+        init_database()
@@ -5,25 +5,51 @@ This module provides the main API endpoints for the timetable scheduling system.
 It handles authentication, data management, timetable generation, and approval workflows.
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, Response, JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
-from datetime import datetime, time
+from datetime import datetime, time, date
+from time import perf_counter
+import csv
+import io
+import json
 
 # Local imports
-from database import get_db, engine, Base
+from database import get_db, engine, Base, SessionLocal
 from services.auth_service import AuthService
 from services.data_service import (
     ClassroomService, BatchService, SubjectService, 
-    FacultyService, TimetableService, ConstraintsService
+    FacultyService, TimetableService, ConstraintsService, QualificationService,
+    AvailabilityService, FixedSlotService, ElectivePreferenceService
 )
+from services.dashboard_service import DashboardService
+from services.export_service import ExportService
+from services.improvement_service import ImprovementService
+from services.import_service import BulkImportService
+from services.scheduling_service import SchedulingService
+from services.generation_service import (
+    GenerationCacheService, GenerationRunService, peak_memory_mb, plan_generation, problem_fingerprint
+)
+from services.timetable_view_service import TimetableViewService
 from auth import verify_token as verify_jwt_token
-from scheduler import TimetableScheduler
+import metrics
+import profiling
+from scheduler import TimetableScheduler, group_electives
+from portfolio import FAILED_STATUSES, solve_portfolio, validate_strategies
 from models import *
 
+# orjson is optional; large timetable responses encode several times faster with it
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:
+    FastJSONResponse = JSONResponse
+
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
@@ -43,6 +69,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses for clients that send Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# Request latency and SQL usage for /metrics
+app.middleware("http")(metrics.metrics_middleware)
+
+# Admin requests sent with X-Profile: 1 or ?profile=1 run under cProfile
+app.middleware("http")(profiling.profiling_middleware)
+
 # Security
 security = HTTPBearer()
 
@@ -110,6 +145,17 @@ class SubjectUpdate(BaseModel):
     hours_per_week: Optional[int] = Field(None, ge=1, le=10)
     requires_lab: Optional[bool] = None
 
+class AvailabilityUpdate(BaseModel):
+    """Faculty weekly availability model"""
+    unavailable_time_slot_ids: List[int]
+
+class LeaveCreate(BaseModel):
+    """Faculty leave creation model"""
+    start_date: date
+    end_date: date
+    time_slot_id: Optional[int] = None
+    reason: Optional[str] = Field(None, max_length=500)
+
 class FacultyCreate(BaseModel):
     """Faculty creation model"""
     name: str = Field(..., min_length=1, max_length=200)
@@ -117,8 +163,8 @@ class FacultyCreate(BaseModel):
     department: str = Field(..., min_length=1, max_length=100)
     email: str = Field(..., pattern=r'^[\w\.-]+@[\w\.-]+\.\w+$')
     max_hours_per_week: int = Field(default=20, ge=1, le=40)
-    availability: Optional[Dict] = None
-    leaves: Optional[List[Dict]] = None
+    availability: Optional[AvailabilityUpdate] = None
+    leaves: Optional[List[LeaveCreate]] = None
 
 class FacultyUpdate(BaseModel):
     """Faculty update model"""
@@ -127,8 +173,33 @@ class FacultyUpdate(BaseModel):
     department: Optional[str] = Field(None, min_length=1, max_length=100)
     email: Optional[str] = Field(None, pattern=r'^[\w\.-]+@[\w\.-]+\.\w+$')
     max_hours_per_week: Optional[int] = Field(None, ge=1, le=40)
-    availability: Optional[Dict] = None
-    leaves: Optional[List[Dict]] = None
+    availability: Optional[AvailabilityUpdate] = None
+    leaves: Optional[List[LeaveCreate]] = None
+
+class FacultySubjectsUpdate(BaseModel):
+    """Faculty qualification replacement model"""
+    subject_ids: List[int]
+
+class QualificationCreate(BaseModel):
+    """Faculty-subject qualification model"""
+    faculty_id: int
+    subject_id: int
+
+class FixedSlotCreate(BaseModel):
+    """Fixed slot creation model"""
+    subject_id: int
+    faculty_id: int
+    batch_id: int
+    classroom_id: int
+    time_slot_id: int
+    reason: Optional[str] = Field(None, max_length=500)
+
+class ElectivePreferenceCreate(BaseModel):
+    """Elective preference creation model"""
+    student_id: int
+    batch_id: int
+    subject_id: int
+    priority: int = Field(..., ge=1, le=10)
 
 class ConstraintsUpdate(BaseModel):
     """Scheduling constraints update model"""
@@ -148,6 +219,12 @@ class ScheduleInput(BaseModel):
     batches: List[dict]
     constraints: dict
 
+class ImproveRequest(BaseModel):
+    """Timetable improvement input model"""
+    time_limit_seconds: float = Field(30.0, gt=0, le=300)
+    seed: Optional[int] = None
+    constraints: dict = {}
+
 class ApprovalAction(BaseModel):
     """Timetable approval/rejection model"""
     comments: Optional[str] = Field(None, max_length=1000)
@@ -195,6 +272,32 @@ def get_current_user(
     
     return user
 
+def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    """Dependency that only lets admin users through."""
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
+
+# ==================== Helpers ====================
+
+def read_csv_rows(file: UploadFile):
+    """
+    Stream records from an uploaded CSV file.
+    
+    The upload is spooled by the server, so rows are parsed lazily and
+    blank cells are dropped so optional fields fall back to their defaults.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(file.file, encoding="utf-8-sig"))
+    for record in reader:
+        yield {
+            key.strip(): value.strip()
+            for key, value in record.items()
+            if key and value is not None and value.strip() != ""
+        }
+
 # ==================== Startup Event ====================
 
 @app.on_event("startup")
@@ -222,6 +325,11 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/metrics", tags=["System"], response_class=PlainTextResponse)
+async def get_metrics():
+    """Request, database and generation metrics in the Prometheus text format"""
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/datetime", tags=["System"])
 async def get_datetime():
     """
@@ -390,6 +498,26 @@ async def create_classroom(
         "available": classroom.available
     }
 
+@app.post("/api/classrooms/bulk", tags=["Classrooms"])
+async def bulk_import_classrooms(
+    rows: List[Dict[str, Any]],
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Import many classrooms from a JSON array, reporting per-row errors"""
+    service = BulkImportService(db)
+    return service.import_rows(Classroom, ClassroomCreate, rows)
+
+@app.post("/api/classrooms/bulk/csv", tags=["Classrooms"])
+async def bulk_import_classrooms_csv(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Import many classrooms from an uploaded CSV file, reporting per-row errors"""
+    service = BulkImportService(db)
+    return service.import_rows(Classroom, ClassroomCreate, read_csv_rows(file))
+
 @app.put("/api/classrooms/{classroom_id}", tags=["Classrooms"])
 async def update_classroom(
     classroom_id: int,
@@ -506,6 +634,26 @@ async def create_batch(
         "shift": batch.shift
     }
 
+@app.post("/api/batches/bulk", tags=["Batches"])
+async def bulk_import_batches(
+    rows: List[Dict[str, Any]],
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Import many batches from a JSON array, reporting per-row errors"""
+    service = BulkImportService(db)
+    return service.import_rows(Batch, BatchCreate, rows)
+
+@app.post("/api/batches/bulk/csv", tags=["Batches"])
+async def bulk_import_batches_csv(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Import many batches from an uploaded CSV file, reporting per-row errors"""
+    service = BulkImportService(db)
+    return service.import_rows(Batch, BatchCreate, read_csv_rows(file))
+
 @app.put("/api/batches/{batch_id}", tags=["Batches"])
 async def update_batch(
     batch_id: int,
@@ -627,6 +775,26 @@ async def create_subject(
         "requires_lab": subject.requires_lab
     }
 
+@app.post("/api/subjects/bulk", tags=["Subjects"])
+async def bulk_import_subjects(
+    rows: List[Dict[str, Any]],
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Import many subjects from a JSON array, reporting per-row errors"""
+    service = BulkImportService(db)
+    return service.import_rows(Subject, SubjectCreate, rows)
+
+@app.post("/api/subjects/bulk/csv", tags=["Subjects"])
+async def bulk_import_subjects_csv(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Import many subjects from an uploaded CSV file, reporting per-row errors"""
+    service = BulkImportService(db)
+    return service.import_rows(Subject, SubjectCreate, read_csv_rows(file))
+
 @app.put("/api/subjects/{subject_id}", tags=["Subjects"])
 async def update_subject(
     subject_id: int,
@@ -669,6 +837,35 @@ async def delete_subject(
 
 # ==================== Faculty Endpoints ====================
 
+def faculty_to_dict(faculty: Faculty) -> dict:
+    """Serialize a faculty member with their weekly unavailable slots and leave."""
+    return {
+        "id": faculty.id,
+        "name": faculty.name,
+        "employee_id": faculty.employee_id,
+        "department": faculty.department,
+        "email": faculty.email,
+        "max_hours_per_week": faculty.max_hours_per_week,
+        "availability": {
+            "unavailable_time_slot_ids": sorted(a.time_slot_id for a in faculty.availability_slots),
+            "unavailable_mask": faculty.unavailable_mask
+        },
+        "leaves": [leave_to_dict(leave) for leave in sorted(faculty.leave_records, key=lambda leave: leave.start_date)]
+    }
+
+def check_availability_input(db: Session, availability: Optional[AvailabilityUpdate],
+                             leaves: Optional[List[LeaveCreate]]):
+    """Reject unknown time slots and reversed leave ranges in a faculty payload."""
+    time_slot_ids = list(availability.unavailable_time_slot_ids) if availability else []
+    for leave in leaves or []:
+        if leave.end_date < leave.start_date:
+            raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+        if leave.time_slot_id is not None:
+            time_slot_ids.append(leave.time_slot_id)
+    unknown = AvailabilityService(db).get_unknown_time_slots(time_slot_ids)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown time slot ids: {unknown}")
+
 @app.get("/api/faculty", tags=["Faculty"])
 async def get_faculty(
     db: Session = Depends(get_db),
@@ -676,20 +873,7 @@ async def get_faculty(
 ):
     """Get all faculty"""
     service = FacultyService(db)
-    faculty = service.get_all()
-    return [
-        {
-            "id": f.id,
-            "name": f.name,
-            "employee_id": f.employee_id,
-            "department": f.department,
-            "email": f.email,
-            "max_hours_per_week": f.max_hours_per_week,
-            "availability": f.availability,
-            "leaves": f.leaves
-        }
-        for f in faculty
-    ]
+    return [faculty_to_dict(f) for f in service.get_all(with_availability=True)]
 
 @app.get("/api/faculty/{faculty_id}", tags=["Faculty"])
 async def get_faculty_member(
@@ -703,16 +887,7 @@ async def get_faculty_member(
     if not faculty:
         raise HTTPException(status_code=404, detail="Faculty not found")
     
-    return {
-        "id": faculty.id,
-        "name": faculty.name,
-        "employee_id": faculty.employee_id,
-        "department": faculty.department,
-        "email": faculty.email,
-        "max_hours_per_week": faculty.max_hours_per_week,
-        "availability": faculty.availability,
-        "leaves": faculty.leaves
-    }
+    return faculty_to_dict(faculty)
 
 @app.post("/api/faculty", tags=["Faculty"], status_code=status.HTTP_201_CREATED)
 async def create_faculty(
@@ -732,25 +907,29 @@ async def create_faculty(
     if existing_email:
         raise HTTPException(status_code=400, detail="Email already exists")
     
-    faculty = service.create(
-        name=data.name,
-        employee_id=data.employee_id,
-        department=data.department,
-        email=data.email,
-        max_hours_per_week=data.max_hours_per_week,
-        availability=data.availability,
-        leaves=data.leaves
-    )
-    return {
-        "id": faculty.id,
-        "name": faculty.name,
-        "employee_id": faculty.employee_id,
-        "department": faculty.department,
-        "email": faculty.email,
-        "max_hours_per_week": faculty.max_hours_per_week,
-        "availability": faculty.availability,
-        "leaves": faculty.leaves
-    }
+    check_availability_input(db, data.availability, data.leaves)
+    faculty = service.create(**data.dict())
+    return faculty_to_dict(faculty)
+
+@app.post("/api/faculty/bulk", tags=["Faculty"])
+async def bulk_import_faculty(
+    rows: List[Dict[str, Any]],
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Import many faculty from a JSON array, reporting per-row errors"""
+    service = BulkImportService(db)
+    return service.import_rows(Faculty, FacultyCreate, rows)
+
+@app.post("/api/faculty/bulk/csv", tags=["Faculty"])
+async def bulk_import_faculty_csv(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Import many faculty from an uploaded CSV file, reporting per-row errors"""
+    service = BulkImportService(db)
+    return service.import_rows(Faculty, FacultyCreate, read_csv_rows(file))
 
 @app.put("/api/faculty/{faculty_id}", tags=["Faculty"])
 async def update_faculty(
@@ -761,22 +940,14 @@ async def update_faculty(
 ):
     """Update faculty"""
     service = FacultyService(db)
-    update_data = {k: v for k, v in data.dict().items() if v is not None}
+    if not service.get_by_id(faculty_id):
+        raise HTTPException(status_code=404, detail="Faculty not found")
     
+    check_availability_input(db, data.availability, data.leaves)
+    update_data = {k: v for k, v in data.dict().items() if v is not None}
     faculty = service.update(faculty_id, **update_data)
-    if not faculty:
-        raise HTTPException(status_code=404, detail="Faculty not found")
     
-    return {
-        "id": faculty.id,
-        "name": faculty.name,
-        "employee_id": faculty.employee_id,
-        "department": faculty.department,
-        "email": faculty.email,
-        "max_hours_per_week": faculty.max_hours_per_week,
-        "availability": faculty.availability,
-        "leaves": faculty.leaves
-    }
+    return faculty_to_dict(faculty)
 
 @app.delete("/api/faculty/{faculty_id}", tags=["Faculty"])
 async def delete_faculty(
@@ -792,6 +963,332 @@ async def delete_faculty(
     
     return {"message": "Faculty deleted successfully"}
 
+# ==================== Qualification Endpoints ====================
+
+@app.get("/api/faculty/{faculty_id}/subjects", tags=["Qualifications"])
+async def get_faculty_subjects(
+    faculty_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get subjects a faculty member is qualified to teach"""
+    if not FacultyService(db).get_by_id(faculty_id):
+        raise HTTPException(status_code=404, detail="Faculty not found")
+    
+    service = QualificationService(db)
+    return [
+        {"id": s.id, "code": s.code, "name": s.name}
+        for s in service.get_subjects_for_faculty(faculty_id)
+    ]
+
+@app.put("/api/faculty/{faculty_id}/subjects", tags=["Qualifications"])
+async def set_faculty_subjects(
+    faculty_id: int,
+    data: FacultySubjectsUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Replace the subjects a faculty member is qualified to teach"""
+    if not FacultyService(db).get_by_id(faculty_id):
+        raise HTTPException(status_code=404, detail="Faculty not found")
+    
+    known = {sid for (sid,) in db.query(Subject.id).filter(Subject.id.in_(data.subject_ids))}
+    unknown = sorted(set(data.subject_ids) - known)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown subject ids: {unknown}")
+    
+    service = QualificationService(db)
+    return {"faculty_id": faculty_id, "subject_ids": service.set_for_faculty(faculty_id, data.subject_ids)}
+
+@app.post("/api/faculty/{faculty_id}/subjects/{subject_id}", tags=["Qualifications"], status_code=status.HTTP_201_CREATED)
+async def add_faculty_subject(
+    faculty_id: int,
+    subject_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Qualify a faculty member to teach a subject"""
+    if not FacultyService(db).get_by_id(faculty_id):
+        raise HTTPException(status_code=404, detail="Faculty not found")
+    if not SubjectService(db).get_by_id(subject_id):
+        raise HTTPException(status_code=404, detail="Subject not found")
+    
+    service = QualificationService(db)
+    if not service.add(faculty_id, subject_id):
+        raise HTTPException(status_code=400, detail="Qualification already exists")
+    
+    return {"faculty_id": faculty_id, "subject_id": subject_id}
+
+@app.delete("/api/faculty/{faculty_id}/subjects/{subject_id}", tags=["Qualifications"])
+async def remove_faculty_subject(
+    faculty_id: int,
+    subject_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Remove a faculty member's qualification for a subject"""
+    service = QualificationService(db)
+    if not service.remove(faculty_id, subject_id):
+        raise HTTPException(status_code=404, detail="Qualification not found")
+    
+    return {"message": "Qualification removed successfully"}
+
+@app.get("/api/subjects/{subject_id}/faculty", tags=["Qualifications"])
+async def get_subject_faculty(
+    subject_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get faculty qualified to teach a subject"""
+    if not SubjectService(db).get_by_id(subject_id):
+        raise HTTPException(status_code=404, detail="Subject not found")
+    
+    service = QualificationService(db)
+    return [
+        {"id": f.id, "name": f.name, "employee_id": f.employee_id, "department": f.department}
+        for f in service.get_faculty_for_subject(subject_id)
+    ]
+
+@app.post("/api/faculty-subjects/bulk", tags=["Qualifications"])
+async def bulk_add_qualifications(
+    data: List[QualificationCreate],
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Add many faculty-subject qualifications in one transaction"""
+    service = QualificationService(db)
+    return service.bulk_add([(q.faculty_id, q.subject_id) for q in data])
+
+# ==================== Availability Endpoints ====================
+
+def leave_to_dict(leave: FacultyLeave) -> dict:
+    """Serialize a faculty leave record."""
+    return {
+        "id": leave.id,
+        "faculty_id": leave.faculty_id,
+        "start_date": leave.start_date.isoformat(),
+        "end_date": leave.end_date.isoformat(),
+        "time_slot_id": leave.time_slot_id,
+        "reason": leave.reason
+    }
+
+@app.get("/api/faculty/{faculty_id}/availability", tags=["Availability"])
+async def get_faculty_availability(
+    faculty_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get a faculty member's weekly unavailable slots"""
+    faculty = FacultyService(db).get_by_id(faculty_id)
+    if not faculty:
+        raise HTTPException(status_code=404, detail="Faculty not found")
+    
+    service = AvailabilityService(db)
+    return {
+        "faculty_id": faculty_id,
+        "unavailable_time_slot_ids": service.get_unavailable_slots(faculty_id),
+        "unavailable_mask": faculty.unavailable_mask
+    }
+
+@app.put("/api/faculty/{faculty_id}/availability", tags=["Availability"])
+async def set_faculty_availability(
+    faculty_id: int,
+    data: AvailabilityUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Replace a faculty member's weekly unavailable slots"""
+    if not FacultyService(db).get_by_id(faculty_id):
+        raise HTTPException(status_code=404, detail="Faculty not found")
+    
+    check_availability_input(db, data, None)
+    
+    service = AvailabilityService(db)
+    mask = service.set_unavailable_slots(faculty_id, data.unavailable_time_slot_ids)
+    return {
+        "faculty_id": faculty_id,
+        "unavailable_time_slot_ids": sorted(set(data.unavailable_time_slot_ids)),
+        "unavailable_mask": mask
+    }
+
+@app.get("/api/faculty/{faculty_id}/leaves", tags=["Availability"])
+async def get_faculty_leaves(
+    faculty_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get a faculty member's leave records"""
+    if not FacultyService(db).get_by_id(faculty_id):
+        raise HTTPException(status_code=404, detail="Faculty not found")
+    
+    service = AvailabilityService(db)
+    return [leave_to_dict(leave) for leave in service.get_leaves(faculty_id)]
+
+@app.post("/api/faculty/{faculty_id}/leaves", tags=["Availability"], status_code=status.HTTP_201_CREATED)
+async def add_faculty_leave(
+    faculty_id: int,
+    data: LeaveCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Record leave for a faculty member (whole days unless a time slot is given)"""
+    if data.end_date < data.start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    
+    leave = FacultyService(db).add_leave(faculty_id, data.dict())
+    if not leave:
+        raise HTTPException(status_code=404, detail="Faculty not found")
+    
+    return leave_to_dict(leave)
+
+@app.delete("/api/faculty/{faculty_id}/leaves/{leave_id}", tags=["Availability"])
+async def delete_faculty_leave(
+    faculty_id: int,
+    leave_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Delete a leave record"""
+    service = AvailabilityService(db)
+    if not service.delete_leave(faculty_id, leave_id):
+        raise HTTPException(status_code=404, detail="Leave not found")
+    
+    return {"message": "Leave deleted successfully"}
+
+@app.get("/api/availability/free-faculty", tags=["Availability"])
+async def get_free_faculty(
+    time_slot_id: int,
+    on_date: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get faculty free in a time slot, optionally also not on leave on a date"""
+    service = AvailabilityService(db)
+    return [
+        {"id": f.id, "name": f.name, "employee_id": f.employee_id, "department": f.department}
+        for f in service.get_free_faculty(time_slot_id, on_date)
+    ]
+
+# ==================== Fixed Slot Endpoints ====================
+
+def fixed_slot_to_dict(fixed_slot: FixedSlot) -> dict:
+    """Serialize a fixed slot."""
+    return {
+        "id": fixed_slot.id,
+        "subject_id": fixed_slot.subject_id,
+        "faculty_id": fixed_slot.faculty_id,
+        "batch_id": fixed_slot.batch_id,
+        "classroom_id": fixed_slot.classroom_id,
+        "time_slot_id": fixed_slot.time_slot_id,
+        "reason": fixed_slot.reason
+    }
+
+@app.get("/api/fixed-slots", tags=["Fixed Slots"])
+async def get_fixed_slots(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get all fixed slots"""
+    service = FixedSlotService(db)
+    return [fixed_slot_to_dict(f) for f in service.get_all()]
+
+@app.post("/api/fixed-slots", tags=["Fixed Slots"], status_code=status.HTTP_201_CREATED)
+async def create_fixed_slot(
+    data: FixedSlotCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Pin a class to a time slot; generation keeps it and schedules around it"""
+    service = FixedSlotService(db)
+    
+    clash = service.find_clash(data.batch_id, data.faculty_id, data.classroom_id, data.time_slot_id)
+    if clash:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Clashes with fixed slot {clash.id} in the same time slot"
+        )
+    
+    fixed_slot = service.create(**data.dict())
+    return fixed_slot_to_dict(fixed_slot)
+
+@app.delete("/api/fixed-slots/{fixed_slot_id}", tags=["Fixed Slots"])
+async def delete_fixed_slot(
+    fixed_slot_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Delete a fixed slot"""
+    service = FixedSlotService(db)
+    if not service.delete(fixed_slot_id):
+        raise HTTPException(status_code=404, detail="Fixed slot not found")
+    
+    return {"message": "Fixed slot deleted successfully"}
+
+# ==================== Elective Endpoints ====================
+
+@app.get("/api/batches/{batch_id}/elective-preferences", tags=["Electives"])
+async def get_elective_preferences(
+    batch_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get a batch's student elective preferences"""
+    service = ElectivePreferenceService(db)
+    return [
+        {
+            "id": p.id,
+            "student_id": p.student_id,
+            "batch_id": p.batch_id,
+            "subject_id": p.subject_id,
+            "priority": p.priority
+        }
+        for p in service.get_for_batch(batch_id)
+    ]
+
+@app.delete("/api/batches/{batch_id}/elective-preferences", tags=["Electives"])
+async def delete_elective_preferences(
+    batch_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Delete all elective preferences of a batch"""
+    service = ElectivePreferenceService(db)
+    return {"deleted": service.delete_for_batch(batch_id)}
+
+@app.post("/api/elective-preferences/bulk", tags=["Electives"])
+async def bulk_import_elective_preferences(
+    rows: List[Dict[str, Any]],
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Import many elective preferences from a JSON array, reporting per-row errors"""
+    service = BulkImportService(db)
+    return service.import_rows(ElectivePreference, ElectivePreferenceCreate, rows)
+
+@app.post("/api/elective-preferences/bulk/csv", tags=["Electives"])
+async def bulk_import_elective_preferences_csv(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Import many elective preferences from an uploaded CSV file, reporting per-row errors"""
+    service = BulkImportService(db)
+    return service.import_rows(ElectivePreference, ElectivePreferenceCreate, read_csv_rows(file))
+
+@app.get("/api/batches/{batch_id}/elective-baskets", tags=["Electives"])
+async def get_elective_baskets(
+    batch_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Preview how a batch's electives are grouped into parallel baskets"""
+    pairs = ElectivePreferenceService(db).get_pairs_for_batches([batch_id]).get(batch_id, [])
+    max_basket_size = db.query(Classroom).count()
+    return {
+        "batch_id": batch_id,
+        "baskets": group_electives(pairs, max_basket_size)
+    }
+
 # ==================== Constraints Endpoints ====================
 
 @app.get("/api/constraints", tags=["Constraints"])
@@ -861,6 +1358,14 @@ async def update_constraints(
 
 # ==================== Timetable Generation ====================
 
+# Solver settings that are part of the cache fingerprint
+GENERATION_SETTINGS = {"num_solutions": 3}
+
+# Seconds per generation, and the share of them kept back for the relaxed
+# re-solve when the problem turns out infeasible
+GENERATION_TIME_LIMIT = 30.0
+RELAXED_TIME_SHARE = 1 / 3
+
 @app.post("/api/generate", tags=["Timetable"])
 async def generate_timetable(
     data: ScheduleInput,
@@ -871,177 +1376,424 @@ async def generate_timetable(
     Generate optimized timetable options.
     
     This endpoint uses constraint programming to generate multiple
-    feasible timetable solutions based on the provided data.
+    feasible timetable solutions based on the provided data. When none is
+    found, the problem is re-solved with violations allowed (unless
+    ``constraints.relax_when_infeasible`` is false) and one best-effort
+    option is saved, with what it violates in ``violations``. If the
+    solver itself fails (every portfolio strategy erred), the response is
+    a 500 solver error rather than a verdict on the constraints.
+    
+    Requests whose estimated model exceeds the memory budget are solved
+    with the decomposed engine (``decomposed`` in the response) or, when
+    even that does not fit, rejected with 413 before any model is built.
+    """
+    with metrics.GENERATION_IN_PROGRESS.track_inprogress():
+        started = perf_counter()
+        problem = SchedulingService(db).load_problem(
+            data.classrooms,
+            data.faculty,
+            data.subjects,
+            data.batches,
+            data.constraints
+        )
+        load_seconds = perf_counter() - started
+        if not problem["batches"]:
+            raise HTTPException(status_code=400, detail="No batches to schedule")
+        run_service = GenerationRunService(db)
+        
+        # Identical input (after loading DB data) gives identical options
+        cache_service = GenerationCacheService(db)
+        fingerprint = problem_fingerprint(problem, GENERATION_SETTINGS)
+        cached = cache_service.get(fingerprint)
+        if cached:
+            persist_started = perf_counter()
+            timetables = cache_service.get_timetables(cached)
+            missing = [idx for idx, tt in enumerate(timetables) if tt is None]
+            if missing:
+                # Options deleted since are saved again from the stored solutions
+                saved = save_generated_timetables(db, cached.solutions, current_user.id, only=missing)
+                for idx, tt in zip(missing, saved):
+                    timetables[idx] = tt
+                cache_service.store(fingerprint, cached.solutions, [tt.id for tt in timetables])
+            run_service.record(
+                current_user.id, fingerprint, cached=True,
+                total_seconds=perf_counter() - started,
+                status="CACHED",
+                load_seconds=load_seconds,
+                persistence_seconds=perf_counter() - persist_started,
+                solutions_found=len(cached.solutions)
+            )
+            return {
+                "success": True,
+                "cached": True,
+                "relaxed": False,
+                "timetables": [
+                    {"id": tt.id, "name": tt.name, "schedule": schedule}
+                    for tt, schedule in zip(timetables, cached.solutions)
+                ],
+                "conflicts": []
+            }
+        
+        portfolio = data.constraints.get("portfolio")
+        relax = data.constraints.get("relax_when_infeasible", True)
+        try:
+            scheduler = TimetableScheduler(**problem)
+            strategies = validate_strategies(portfolio) if portfolio else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        plan = plan_generation(scheduler, strategies, relax)
+        estimate = {
+            "estimated_variables": plan["estimate"]["variables"],
+            "estimated_memory_mb": plan["estimate"]["memory_mb"]
+        }
+        if plan["rejected"]:
+            run_service.record(
+                current_user.id, fingerprint, cached=False,
+                total_seconds=perf_counter() - started,
+                status="REJECTED",
+                load_seconds=load_seconds,
+                **estimate
+            )
+            raise HTTPException(status_code=413, detail=plan["rejected"])
+        strategies = plan["strategies"]
+        if plan["decomposed"]:
+            problem = dict(problem, constraints=dict(problem["constraints"], engine=plan["engine"]))
+            scheduler = TimetableScheduler(**problem)
+        
+        solve_started = perf_counter()
+        time_limit = GENERATION_TIME_LIMIT * (1 - RELAXED_TIME_SHARE if relax else 1)
+        if strategies:
+            results, stats = solve_portfolio(
+                problem, strategies=strategies, time_limit=time_limit, **GENERATION_SETTINGS
+            )
+        else:
+            results = scheduler.generate_schedules(
+                **GENERATION_SETTINGS, solver_parameters={"max_time_in_seconds": time_limit}
+            )
+            stats = scheduler.stats
+        solver_failed = not results and stats.get("status") in FAILED_STATUSES
+        
+        if not results and relax and not solver_failed:
+            # Best effort within what is left of the budget
+            remaining = GENERATION_TIME_LIMIT - (perf_counter() - solve_started)
+            schedule, violations = scheduler.solve_relaxed(max(remaining, 1.0))
+            if schedule is not None:
+                persist_started = perf_counter()
+                timetable = save_generated_timetables(db, [schedule], current_user.id, label="Best effort")[0]
+                timetable.conflict_count = len(violations)
+                db.commit()
+                run_service.record(
+                    current_user.id, fingerprint, cached=False,
+                    total_seconds=perf_counter() - started,
+                    load_seconds=load_seconds,
+                    persistence_seconds=perf_counter() - persist_started,
+                    solutions_found=1,
+                    violation_count=len(violations),
+                    peak_memory_mb=peak_memory_mb(),
+                    **estimate,
+                    **scheduler.stats
+                )
+                # Not cached: a later run with more time may find a feasible timetable
+                return {
+                    "success": True,
+                    "cached": False,
+                    "relaxed": True,
+                    "decomposed": plan["decomposed"],
+                    "timetables": [{"id": timetable.id, "name": timetable.name, "schedule": schedule}],
+                    "violations": violations,
+                    "conflicts": scheduler.check_conflicts([schedule])
+                }
+            stats = scheduler.stats
+        
+        if not results:
+            run_service.record(
+                current_user.id, fingerprint, cached=False,
+                total_seconds=perf_counter() - started,
+                load_seconds=load_seconds,
+                peak_memory_mb=peak_memory_mb(),
+                **estimate,
+                **stats
+            )
+            if solver_failed:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Solver error: {stats.get('error', stats['status'])}"
+                )
+            return {
+                "success": False,
+                "message": "No feasible solution found with current constraints",
+                "suggestions": scheduler.get_suggestions()
+            }
+        
+        # Save generated timetables to database
+        persist_started = perf_counter()
+        timetables = save_generated_timetables(db, results, current_user.id)
+        cache_service.store(fingerprint, results, [tt.id for tt in timetables])
+        run_service.record(
+            current_user.id, fingerprint, cached=False,
+            total_seconds=perf_counter() - started,
+            load_seconds=load_seconds,
+            persistence_seconds=perf_counter() - persist_started,
+            peak_memory_mb=peak_memory_mb(),
+            **estimate,
+            **stats
+        )
+        
+        return {
+            "success": True,
+            "cached": False,
+            "relaxed": False,
+            "decomposed": plan["decomposed"],
+            "timetables": [
+                {"id": tt.id, "name": tt.name, "schedule": schedule}
+                for tt, schedule in zip(timetables, results)
+            ],
+            "conflicts": scheduler.check_conflicts(results)
+        }
+
+@app.post("/api/generate/preview", tags=["Timetable"])
+async def preview_timetable(
+    data: ScheduleInput,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
     """
-    scheduler = TimetableScheduler(
+    Build a draft timetable instantly, without the solver.
+    
+    Uses the greedy constructor, so the draft may contain conflicts (listed
+    in ``conflicts``) and classes that fit nowhere (``unscheduled``).
+    Nothing is saved.
+    """
+    started = perf_counter()
+    problem = SchedulingService(db).load_problem(
         data.classrooms,
         data.faculty,
         data.subjects,
         data.batches,
         data.constraints
     )
+    try:
+        scheduler = TimetableScheduler(**problem)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    results = scheduler.generate_schedules(num_solutions=3)
-    
-    if not results:
-        return {
-            "success": False,
-            "message": "No feasible solution found with current constraints",
-            "suggestions": scheduler.get_suggestions()
-        }
-    
-    # Save generated timetables to database
+    schedule, unscheduled = scheduler.greedy_schedule()
+    conflicts = scheduler.check_conflicts([schedule])
+    return {
+        "success": not conflicts and not unscheduled,
+        "schedule": schedule,
+        "conflicts": conflicts,
+        "unscheduled": unscheduled,
+        "seconds": perf_counter() - started
+    }
+
+def save_generated_timetables(db: Session, results: List[list], user_id: int,
+                              only: Optional[List[int]] = None, label: str = "Option") -> List[TimetableOption]:
+    """Save generated schedules (all, or the indexes in ``only``) as draft timetable options."""
     service = TimetableService(db)
-    saved_timetables = []
-    
     current_date = datetime.now()
-    for idx, schedule in enumerate(results):
-        timetable = service.create_timetable(
-            name=f"Option {idx + 1} - {current_date.strftime('%B %Y')} ({current_date.strftime('%Y-%m-%d %H:%M')})",
-            entries=schedule,
-            generated_by=current_user.id
+    indexes = range(len(results)) if only is None else only
+    return [
+        service.create_timetable(
+            name=f"{label} {idx + 1} - {current_date.strftime('%B %Y')} ({current_date.strftime('%Y-%m-%d %H:%M')})",
+            entries=results[idx],
+            generated_by=user_id
         )
-        saved_timetables.append({
-            "id": timetable.id,
-            "name": timetable.name,
-            "schedule": schedule
-        })
-    
-    return {
-        "success": True,
-        "timetables": saved_timetables,
-        "conflicts": scheduler.check_conflicts()
-    }
+        for idx in indexes
+    ]
+
+@app.delete("/api/generation-cache", tags=["Timetable"])
+async def clear_generation_cache(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Forget cached generation results so the next generate re-solves"""
+    service = GenerationCacheService(db)
+    return {"deleted": service.clear()}
+
+def generation_run_to_dict(run: GenerationRun) -> dict:
+    data = {column: getattr(run, column) for column in GenerationRun.__table__.columns.keys()}
+    data["created_at"] = run.created_at.isoformat() if run.created_at else None
+    return data
+
+@app.get("/api/generation-runs", tags=["Timetable"])
+async def get_generation_runs(
+    limit: int = 50,
+    cached: Optional[bool] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get solver telemetry of recent generate calls, newest first"""
+    service = GenerationRunService(db)
+    return [generation_run_to_dict(run) for run in service.get_recent(min(limit, 500), cached)]
+
+@app.get("/api/generation-runs/strategies", tags=["Timetable"])
+async def get_generation_run_strategies(
+    days: int = 30,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get wins and timings per portfolio strategy"""
+    service = GenerationRunService(db)
+    return service.get_strategy_stats(days)
+
+@app.get("/api/generation-runs/trends", tags=["Timetable"])
+async def get_generation_run_trends(
+    days: int = 30,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get daily averages of model size and phase timings of generate calls"""
+    service = GenerationRunService(db)
+    return service.get_trends(days)
+
+TIMETABLE_FORMATS = ("full", "compact")
 
 @app.get("/api/timetables", tags=["Timetable"])
 async def get_timetables(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    status: Optional[str] = None
+    status: Optional[str] = None,
+    format: str = "full"
 ):
-    """Get all timetables, optionally filtered by status."""
+    """
+    Get all timetables, optionally filtered by status.
+    
+    ``format=compact`` returns entries as id lists plus one lookup table
+    of the subjects, faculty, batches, classrooms and time slots they use.
+    """
+    if format not in TIMETABLE_FORMATS:
+        raise HTTPException(status_code=400, detail="Format must be 'full' or 'compact'")
+    
     service = TimetableService(db)
     timetables = service.get_all_timetables()
     
     if status:
         timetables = [tt for tt in timetables if tt.status == status]
     
-    result = []
-    for tt in timetables:
-        entries = db.query(TimetableEntry).filter(
-            TimetableEntry.timetable_id == tt.id
-        ).all()
-        
-        entry_list = []
-        for entry in entries:
-            time_slot = db.query(TimeSlot).filter(TimeSlot.id == entry.time_slot_id).first()
-            entry_list.append({
-                "id": entry.id,
-                "subject": {
-                    "id": entry.subject.id,
-                    "code": entry.subject.code,
-                    "name": entry.subject.name
-                },
-                "faculty": {
-                    "id": entry.faculty.id,
-                    "name": entry.faculty.name,
-                    "employee_id": entry.faculty.employee_id
-                },
-                "batch": {
-                    "id": entry.batch.id,
-                    "name": entry.batch.name,
-                    "department": entry.batch.department
-                },
-                "classroom": {
-                    "id": entry.classroom.id,
-                    "name": entry.classroom.name,
-                    "capacity": entry.classroom.capacity
-                },
-                "time_slot": {
-                    "id": entry.time_slot_id,
-                    "day": time_slot.day if time_slot else None,
-                    "start_time": str(time_slot.start_time) if time_slot else None,
-                    "end_time": str(time_slot.end_time) if time_slot else None,
-                    "slot_number": time_slot.slot_number if time_slot else None
-                },
-                "is_fixed": entry.is_fixed
-            })
-        
-        result.append({
-            "id": tt.id,
-            "name": tt.name,
-            "status": tt.status,
-            "generated_at": tt.generated_at.isoformat() if tt.generated_at else None,
-            "utilization_rate": tt.utilization_rate,
-            "conflict_count": tt.conflict_count,
-            "quality_score": tt.quality_score,
-            "entries": entry_list
-        })
-    
-    return result
+    view_service = TimetableViewService(db)
+    if format == "compact":
+        return FastJSONResponse(view_service.compact(timetables))
+    return FastJSONResponse(view_service.full(timetables))
 
 @app.get("/api/timetables/{timetable_id}", tags=["Timetable"])
 async def get_timetable(
     timetable_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    format: str = "full"
 ):
-    """Get a specific timetable by ID."""
+    """Get a specific timetable by ID (``format=compact`` as for the list)."""
+    if format not in TIMETABLE_FORMATS:
+        raise HTTPException(status_code=400, detail="Format must be 'full' or 'compact'")
+    
     service = TimetableService(db)
     timetable = service.get_by_id(timetable_id)
     
     if not timetable:
         raise HTTPException(status_code=404, detail="Timetable not found")
     
-    entries = db.query(TimetableEntry).filter(
-        TimetableEntry.timetable_id == timetable.id
-    ).all()
-    
-    entry_list = []
-    for entry in entries:
-        time_slot = db.query(TimeSlot).filter(TimeSlot.id == entry.time_slot_id).first()
-        entry_list.append({
-            "id": entry.id,
-            "subject": {
-                "id": entry.subject.id,
-                "code": entry.subject.code,
-                "name": entry.subject.name
-            },
-            "faculty": {
-                "id": entry.faculty.id,
-                "name": entry.faculty.name,
-                "employee_id": entry.faculty.employee_id
-            },
-            "batch": {
-                "id": entry.batch.id,
-                "name": entry.batch.name,
-                "department": entry.batch.department
-            },
-            "classroom": {
-                "id": entry.classroom.id,
-                "name": entry.classroom.name,
-                "capacity": entry.classroom.capacity
-            },
-            "time_slot": {
-                "id": entry.time_slot_id,
-                "day": time_slot.day if time_slot else None,
-                "start_time": str(time_slot.start_time) if time_slot else None,
-                "end_time": str(time_slot.end_time) if time_slot else None,
-                "slot_number": time_slot.slot_number if time_slot else None
-            },
-            "is_fixed": entry.is_fixed
-        })
+    view_service = TimetableViewService(db)
+    if format == "compact":
+        view = view_service.compact([timetable])
+        return FastJSONResponse(dict(view["timetables"][0], entry_fields=view["entry_fields"], lookup=view["lookup"]))
+    return FastJSONResponse(view_service.full([timetable])[0])
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+@app.get("/api/timetables/{timetable_id}/export/{export_format}", tags=["Timetable"])
+async def export_timetable(
+    timetable_id: int,
+    export_format: str,
+    batch_id: Optional[int] = None,
+    faculty_id: Optional[int] = None,
+    classroom_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Stream timetable entries as NDJSON or CSV.
+    
+    Entries are read through a server-side cursor and sent chunk by chunk,
+    optionally filtered by batch, faculty or classroom. The stream is not
+    gzipped, so the first rows reach the client without waiting for a
+    compression block to fill.
+    """
+    if export_format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Export format must be 'ndjson' or 'csv'")
     
-    return {
-        "id": timetable.id,
-        "name": timetable.name,
-        "status": timetable.status,
-        "generated_at": timetable.generated_at.isoformat() if timetable.generated_at else None,
-        "utilization_rate": timetable.utilization_rate,
-        "conflict_count": timetable.conflict_count,
-        "quality_score": timetable.quality_score,
-        "entries": entry_list
-    }
+    if not TimetableService(db).get_by_id(timetable_id):
+        raise HTTPException(status_code=404, detail="Timetable not found")
+    
+    filters = {"batch_id": batch_id, "faculty_id": faculty_id, "classroom_id": classroom_id}
+    
+    def stream():
+        # The request session is closed before the body is sent, so the
+        # stream owns a session for its whole lifetime.
+        export_db = SessionLocal()
+        try:
+            service = ExportService(export_db)
+            if export_format == "csv":
+                yield from service.stream_csv(timetable_id, **filters)
+            else:
+                yield from service.stream_ndjson(timetable_id, **filters)
+        finally:
+            export_db.close()
+    
+    return StreamingResponse(
+        stream(),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="timetable_{timetable_id}.{export_format}"',
+            # An explicit encoding keeps GZipMiddleware from buffering the stream
+            "Content-Encoding": "identity"
+        }
+    )
+
+@app.post("/api/timetables/{timetable_id}/improve", tags=["Timetable"])
+async def improve_timetable(
+    timetable_id: int,
+    data: ImproveRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Improve a timetable with Large Neighbourhood Search, streaming progress.
+    
+    Repeatedly frees one batch, day or faculty member's week and re-solves
+    it with everything else fixed, for up to ``time_limit_seconds``. Each
+    NDJSON line is one iteration; the last (``"event": "done"``) carries
+    the id of the improved timetable, saved as a new draft, or null when
+    no improvement was found.
+    """
+    timetable = TimetableService(db).get_by_id(timetable_id)
+    if not timetable:
+        raise HTTPException(status_code=404, detail="Timetable not found")
+    
+    try:
+        improver = ImprovementService(db).load(timetable_id, data.constraints, data.seed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    name = f"{timetable.name} (improved)"
+    
+    def stream():
+        # The request session is closed before the body is sent, so the
+        # stream owns a session for its whole lifetime.
+        improve_db = SessionLocal()
+        try:
+            service = ImprovementService(improve_db)
+            for event in service.improve(improver, name, data.time_limit_seconds, current_user.id):
+                yield json.dumps(event) + "\n"
+        finally:
+            improve_db.close()
+    
+    # An explicit encoding keeps GZipMiddleware from buffering progress lines
+    return StreamingResponse(stream(), media_type="application/x-ndjson",
+                             headers={"Content-Encoding": "identity"})
 
 @app.post("/api/timetables/{timetable_id}/approve", tags=["Timetable"])
 async def approve_timetable(
@@ -1050,13 +1802,13 @@ async def approve_timetable(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Approve a timetable and set it as active."""
-    service = TimetableService(db)
+    """
+    Approve a timetable and set it as active.
     
-    # Set all other active timetables to archived
-    db.query(TimetableOption).filter(
-        TimetableOption.status == "active"
-    ).update({"status": "archived"})
+    Active timetables sharing a batch with it are archived; those of other
+    batches (another program scheduled around it) stay active.
+    """
+    service = TimetableService(db)
     
     # Approve and activate this timetable
     success = service.approve_timetable(
@@ -1068,6 +1820,8 @@ async def approve_timetable(
     if not success:
         raise HTTPException(status_code=404, detail="Timetable not found")
     
+    archived = service.archive_overlapping(timetable_id)
+    
     # Set status to active
     timetable = service.get_by_id(timetable_id)
     timetable.status = "active"
@@ -1076,7 +1830,8 @@ async def approve_timetable(
     return {
         "success": True,
         "message": "Timetable approved and activated successfully",
-        "timetable_id": timetable_id
+        "timetable_id": timetable_id,
+        "archived": archived
     }
 
 @app.post("/api/timetables/{timetable_id}/reject", tags=["Timetable"])
@@ -1131,29 +1886,33 @@ async def get_dashboard_stats(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get dashboard statistics"""
-    # Count entities
-    classroom_count = db.query(Classroom).count()
-    batch_count = db.query(Batch).count()
-    subject_count = db.query(Subject).count()
-    faculty_count = db.query(Faculty).count()
-    
-    # Get active timetable
-    active_timetable = db.query(TimetableOption).filter(
-        TimetableOption.status == "active"
-    ).first()
-    
-    # Get pending approvals
-    pending_count = db.query(TimetableOption).filter(
-        TimetableOption.status == "draft"
-    ).count()
-    
-    return {
-        "activeTimetable": active_timetable.name if active_timetable else None,
-        "pendingApprovals": pending_count,
-        "totalClassrooms": classroom_count,
-        "totalFaculty": faculty_count,
-        "totalBatches": batch_count,
-        "totalSubjects": subject_count,
-        "utilizationRate": active_timetable.utilization_rate if active_timetable else 0
-    }
+    """Get dashboard statistics (cached, invalidated on data changes)"""
+    service = DashboardService(db)
+    return service.get_stats()
+
+# ==================== Profiling Endpoints ====================
+
+@app.get("/api/profiles", tags=["Profiling"])
+async def get_profiles(current_user: User = Depends(get_current_admin)):
+    """List profiled requests held in memory, newest first"""
+    return profiling.get_profiles()
+
+@app.get("/api/profiles/{profile_id}", tags=["Profiling"])
+async def get_profile(profile_id: str, current_user: User = Depends(get_current_admin)):
+    """Get a profiled request with its SQL statements and slowest functions"""
+    profile = profiling.get_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {key: value for key, value in profile.items() if key != "pstats"}
+
+@app.get("/api/profiles/{profile_id}/pstats", tags=["Profiling"])
+async def download_profile(profile_id: str, current_user: User = Depends(get_current_admin)):
+    """Download a profile for pstats.Stats(), snakeviz or similar tools"""
+    profile = profiling.get_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(
+        content=profile["pstats"],
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.pstats"'}
+    )
@@ -0,0 +1,293 @@
+"""
+In-process metrics exposed in the Prometheus text format.
+
+Counters, gauges and histograms are kept per worker process and rendered
+by ``render_metrics`` for the ``/metrics`` endpoint, so no external
+service or client library is needed. SQL statement counts and time are
+attributed to the HTTP request that issued them through a context
+variable set by the request middleware.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Prometheus default latency buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+GENERATION_BUCKETS = (0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+_registry = []
+
+# [statements, seconds] of the current request, None outside a request
+_request_sql: ContextVar[Optional[list]] = ContextVar("request_sql", default=None)
+
+# When the session statement or flush now starting may need a pooled
+# connection; None once it has one
+_checkout_started: ContextVar[Optional[float]] = ContextVar("checkout_started", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, object] = {}
+        self._lock = Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, or is read from ``callback`` at render time."""
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self._callback = callback
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def render(self) -> list:
+        if self._callback is not None:
+            value = self._callback()
+            if value is None:
+                return []
+            self.set(value)
+        return super().render()
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, with sum and count."""
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+# ==================== HTTP ====================
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests handled.", ("method", "route", "status")
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ("method", "route")
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being handled."
+)
+HTTP_REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements", "SQL statements executed per HTTP request.",
+    ("method", "route"), buckets=SQL_COUNT_BUCKETS
+)
+HTTP_REQUEST_SQL_DURATION = Histogram(
+    "http_request_sql_duration_seconds", "Time spent in SQL per HTTP request.", ("method", "route")
+)
+
+# ==================== Database ====================
+
+SQL_STATEMENTS = Counter("sql_statements_total", "SQL statements executed.")
+SQL_DURATION = Histogram("sql_statement_duration_seconds", "SQL statement execution time.")
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time waiting for a pooled database connection."
+)
+
+# ==================== Generation ====================
+
+GENERATION_JOBS = Counter(
+    "generation_jobs_total", "Timetable generation requests by outcome.", ("status",)
+)
+GENERATION_DURATION = Histogram(
+    "generation_duration_seconds", "Timetable generation request duration.",
+    ("status",), buckets=GENERATION_BUCKETS
+)
+GENERATION_IN_PROGRESS = Gauge(
+    "generation_jobs_in_progress", "Timetable generation requests being handled."
+)
+
+
+def route_label(request) -> str:
+    """The route template of a request, so path parameters do not explode label values."""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+async def metrics_middleware(request, call_next):
+    """Record latency, status and SQL usage of each HTTP request."""
+    sql = [0, 0.0]
+    token = _request_sql.set(sql)
+    started = time.perf_counter()
+    status_code = 500
+    HTTP_REQUESTS_IN_PROGRESS.inc()
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        HTTP_REQUESTS_IN_PROGRESS.dec()
+        _request_sql.reset(token)
+        method, route = request.method, route_label(request)
+        HTTP_REQUESTS.inc(method=method, route=route, status=status_code)
+        HTTP_REQUEST_DURATION.observe(elapsed, method=method, route=route)
+        HTTP_REQUEST_SQL_STATEMENTS.observe(sql[0], method=method, route=route)
+        HTTP_REQUEST_SQL_DURATION.observe(sql[1], method=method, route=route)
+
+
+def instrument_engine(engine):
+    """Count and time SQL statements and pool checkouts, and expose pool usage, for ``engine``."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _checkout_started.set(None)
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        SQL_STATEMENTS.inc()
+        SQL_DURATION.observe(elapsed)
+        sql = _request_sql.get()
+        if sql is not None:
+            sql[0] += 1
+            sql[1] += elapsed
+
+    # Registered on the engine, so the listener moves to the new pool
+    # when the engine is disposed
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        started = _checkout_started.get()
+        if started is not None:
+            _checkout_started.set(None)
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+    def pool_stat(name):
+        # Read from the engine's current pool; not every pool class
+        # (e.g. SingletonThreadPool) reports sizes
+        def read():
+            method = getattr(engine.pool, name, None)
+            return method() if callable(method) else None
+        return read
+
+    Gauge("db_pool_size", "Configured size of the connection pool.", callback=pool_stat("size"))
+    Gauge("db_pool_checked_out", "Connections currently checked out.", callback=pool_stat("checkedout"))
+    Gauge("db_pool_checked_in", "Idle connections in the pool.", callback=pool_stat("checkedin"))
+    overflow = pool_stat("overflow")
+    # QueuePool reports negative overflow until the pool has filled up
+    Gauge("db_pool_overflow", "Connections opened beyond the pool size.",
+          callback=lambda: None if overflow() is None else max(0, overflow()))
+
+
+# The pool has no event for a checkout starting, so the start is stamped
+# when a session statement or flush begins (when a session acquires its
+# connection) and the wait observed by the engine's "checkout" event.
+# The first cursor execute clears a stamp that needed no checkout.
+@event.listens_for(Session, "do_orm_execute")
+def _stamp_execute(orm_execute_state):
+    _checkout_started.set(time.perf_counter())
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_flush(session, flush_context, instances):
+    _checkout_started.set(time.perf_counter())
+
+
+def observe_generation(status: str, seconds: float):
+    GENERATION_JOBS.inc(status=status)
+    GENERATION_DURATION.observe(seconds, status=status)
+
+
+def render_metrics() -> str:
+    """All metrics of this process in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, Time, ForeignKey, JSON, Text
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Float, Date, DateTime, Time, ForeignKey, JSON, Text, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -55,6 +55,7 @@ class Subject(Base):
     
     timetable_entries = relationship("TimetableEntry", back_populates="subject")
     elective_preferences = relationship("ElectivePreference", back_populates="subject")
+    qualified_faculty = relationship("Faculty", secondary="faculty_subjects", back_populates="subjects")
 
 class Faculty(Base):
     __tablename__ = "faculty"
@@ -65,10 +66,59 @@ class Faculty(Base):
     department = Column(String, nullable=False)
     email = Column(String, unique=True, nullable=False)
     max_hours_per_week = Column(Integer, default=20)
-    availability = Column(JSON, nullable=True)  # Store as JSON array
-    leaves = Column(JSON, nullable=True)  # Store as JSON array
+    # Legacy JSON, no longer written: availability and leave live in
+    # faculty_availability and faculty_leaves
+    availability = Column(JSON, nullable=True)
+    leaves = Column(JSON, nullable=True)
+    # Bit n set = unavailable in the slot with slot_number n, every week.
+    # Kept in sync with faculty_availability by AvailabilityService.
+    unavailable_mask = Column(BigInteger, default=0, server_default="0", nullable=False)
     
     timetable_entries = relationship("TimetableEntry", back_populates="faculty")
+    subjects = relationship("Subject", secondary="faculty_subjects", back_populates="qualified_faculty")
+    availability_slots = relationship("FacultyAvailability", back_populates="faculty", cascade="all, delete-orphan")
+    leave_records = relationship("FacultyLeave", back_populates="faculty", cascade="all, delete-orphan")
+
+class FacultySubject(Base):
+    __tablename__ = "faculty_subjects"
+    __table_args__ = (
+        # The primary key serves faculty -> subjects lookups, this index subjects -> faculty
+        Index("ix_faculty_subjects_subject_faculty", "subject_id", "faculty_id"),
+    )
+    
+    faculty_id = Column(Integer, ForeignKey("faculty.id", ondelete="CASCADE"), primary_key=True)
+    subject_id = Column(Integer, ForeignKey("subjects.id", ondelete="CASCADE"), primary_key=True)
+
+class FacultyAvailability(Base):
+    # Each row marks a weekly time slot in which the faculty member cannot teach
+    __tablename__ = "faculty_availability"
+    __table_args__ = (
+        UniqueConstraint("faculty_id", "time_slot_id", name="uq_faculty_availability_faculty_slot"),
+        Index("ix_faculty_availability_slot_faculty", "time_slot_id", "faculty_id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    faculty_id = Column(Integer, ForeignKey("faculty.id", ondelete="CASCADE"), nullable=False)
+    time_slot_id = Column(Integer, ForeignKey("time_slots.id", ondelete="CASCADE"), nullable=False)
+    
+    faculty = relationship("Faculty", back_populates="availability_slots")
+
+class FacultyLeave(Base):
+    __tablename__ = "faculty_leaves"
+    __table_args__ = (
+        Index("ix_faculty_leaves_faculty_dates", "faculty_id", "start_date", "end_date"),
+        Index("ix_faculty_leaves_dates", "start_date", "end_date"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    faculty_id = Column(Integer, ForeignKey("faculty.id", ondelete="CASCADE"), nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    time_slot_id = Column(Integer, ForeignKey("time_slots.id", ondelete="CASCADE"), nullable=True)  # NULL = whole day
+    reason = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    faculty = relationship("Faculty", back_populates="leave_records")
 
 class TimeSlot(Base):
     __tablename__ = "time_slots"
@@ -213,3 +263,53 @@ class ChangeLog(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
     
     timetable = relationship("TimetableOption", back_populates="change_logs")
+
+class GenerationCache(Base):
+    __tablename__ = "generation_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    fingerprint = Column(String(64), unique=True, index=True, nullable=False)
+    solutions = Column(JSON, nullable=False)  # Solver output, one schedule per option
+    timetable_ids = Column(JSON, nullable=False)  # Options saved from these solutions
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_hit_at = Column(DateTime, nullable=True)
+
+class GenerationRun(Base):
+    __tablename__ = "generation_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    fingerprint = Column(String(64), index=True, nullable=True)
+    cached = Column(Boolean, default=False, nullable=False)
+    status = Column(String, nullable=False)  # CP-SAT status name, 'CACHED' or 'REJECTED'
+    num_classes = Column(Integer, nullable=True)
+    num_variables = Column(Integer, nullable=True)
+    num_constraints = Column(Integer, nullable=True)
+    # Phase timings in seconds
+    load_seconds = Column(Float, nullable=True)
+    model_build_seconds = Column(Float, nullable=True)
+    presolve_seconds = Column(Float, nullable=True)
+    solve_seconds = Column(Float, nullable=True)
+    first_solution_seconds = Column(Float, nullable=True)
+    persistence_seconds = Column(Float, nullable=True)
+    total_seconds = Column(Float, nullable=False)
+    # CP-SAT response statistics
+    num_branches = Column(BigInteger, nullable=True)
+    num_conflicts = Column(BigInteger, nullable=True)
+    objective_value = Column(Float, nullable=True)
+    best_objective_bound = Column(Float, nullable=True)
+    gap = Column(Float, nullable=True)
+    solutions_found = Column(Integer, default=0)
+    # Portfolio mode: winning strategy and name -> {status, seconds, solutions} of all raced
+    strategy = Column(String, nullable=True, index=True)
+    strategy_results = Column(JSON, nullable=True)
+    # Best-effort runs: the relaxed re-solve after an infeasible one, and what its timetable violates
+    relaxed = Column(Boolean, default=False, nullable=False)
+    violation_count = Column(Integer, nullable=True)
+    # Model size estimated before building, next to the num_variables above
+    # and the process's peak resident memory after the run (a high-water mark)
+    estimated_variables = Column(Integer, nullable=True)
+    estimated_memory_mb = Column(Float, nullable=True)
+    peak_memory_mb = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,153 @@
+"""
+Race solver strategies against each other in separate processes.
+
+No single configuration wins on every campus, so portfolio mode runs
+several (different engines, seeds, search branching, greedy draft plus
+repair) at once, takes the first that finds all requested solutions or
+proves the problem infeasible, and terminates the rest. Processes are
+started with ``spawn``, so scripts that call ``solve_portfolio`` need the
+usual ``if __name__ == '__main__'`` guard.
+"""
+import multiprocessing
+import time
+from multiprocessing.connection import wait
+
+from scheduler import TimetableScheduler
+
+# name -> constraint overrides, whether to hint the greedy draft, and
+# CP-SAT parameters over the generate_schedules defaults
+STRATEGIES = {
+    'full': {'hint': False},
+    'full_seed_1': {'hint': False, 'parameters': {'random_seed': 1}},
+    'decomposed': {'constraints': {'engine': 'decomposed'}, 'hint': False},
+    'decomposed_seed_1': {'constraints': {'engine': 'decomposed'}, 'hint': False, 'parameters': {'random_seed': 1}},
+    'fixed_search': {'constraints': {'search_branching': 'fixed'}, 'hint': False},
+    'difficulty_first': {
+        'constraints': {'engine': 'decomposed', 'decision_strategy': 'difficulty', 'search_branching': 'fixed'},
+        'hint': False
+    },
+    'greedy_repair': {'hint': True, 'parameters': {'repair_hint': True}},
+}
+
+DEFAULT_STRATEGIES = ('full', 'decomposed', 'fixed_search', 'greedy_repair')
+
+# Statuses that settle the race: every strategy solves the same problem
+# (the decomposed engine a relaxation of it), so one proof is enough
+DECISIVE_STATUSES = ('INFEASIBLE',)
+
+# Statuses of a strategy that failed rather than searched: it loses, and
+# when every strategy fails the portfolio reports ERROR
+FAILED_STATUSES = ('ERROR', 'MODEL_INVALID')
+
+# Time past the budget allowed for strategies to report before termination
+GRACE_SECONDS = 5.0
+
+
+def _run_strategy(conn, problem, name, num_solutions, time_limit):
+    """Process entry point: solve with one strategy and send (solutions, stats) back."""
+    spec = STRATEGIES[name]
+    try:
+        constraints = dict(problem['constraints'], **spec.get('constraints', {}))
+        scheduler = TimetableScheduler(**dict(problem, constraints=constraints))
+        parameters = dict(max_time_in_seconds=time_limit, **spec.get('parameters', {}))
+        solutions = scheduler.generate_schedules(num_solutions, hint=spec['hint'], solver_parameters=parameters)
+        conn.send((solutions, scheduler.stats))
+    except Exception as e:  # reported as this strategy's result, not raised in the parent
+        conn.send(([], {'status': 'ERROR', 'error': str(e)}))
+    finally:
+        conn.close()
+
+
+def validate_strategies(strategies):
+    """Strategy names to race from a name, a list, or None/True for DEFAULT_STRATEGIES; ValueError for unknown names."""
+    if isinstance(strategies, str):
+        strategies = [strategies]
+    names = list(DEFAULT_STRATEGIES if strategies in (None, True) else strategies)
+    unknown = [name for name in names if name not in STRATEGIES]
+    if unknown or not names:
+        raise ValueError(
+            f"Unknown portfolio strategies: {', '.join(map(str, unknown)) or 'none given'}; "
+            f"expected some of: {', '.join(STRATEGIES)}"
+        )
+    return names
+
+
+def solve_portfolio(problem, num_solutions=3, strategies=None, time_limit=30.0):
+    """
+    Solve ``problem`` (``TimetableScheduler`` keyword arguments) with a race of strategies.
+
+    Each strategy runs in its own process with ``time_limit`` seconds, on
+    one core: CP-SAT enumerates solutions with a single worker. The first to return
+    ``num_solutions`` solutions, or to prove infeasibility, wins and the
+    others are terminated; otherwise, once all have reported or the
+    budget has run out, the strategy with the most solutions wins.
+
+    A strategy that fails (FAILED_STATUSES) only loses; when all fail,
+    the status is ERROR and ``error`` holds their messages.
+
+    Returns:
+        (solutions, stats): the winner's solutions and ``stats``, plus
+        ``strategy`` (the winner's name, None if nothing was found) and
+        ``strategy_results`` (name -> status, seconds, solutions found and
+        any error)
+    """
+    names = validate_strategies(strategies)
+    context = multiprocessing.get_context('spawn')
+
+    started = time.perf_counter()
+    running = {}
+    for name in names:
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_run_strategy, args=(sender, problem, name, num_solutions, time_limit),
+            daemon=True
+        )
+        process.start()
+        sender.close()
+        running[receiver] = (name, process)
+
+    results = {}
+    winner = None
+    try:
+        deadline = started + time_limit + GRACE_SECONDS
+        while running:
+            ready = wait(list(running), timeout=max(0.0, deadline - time.perf_counter()))
+            if not ready:
+                break
+            for receiver in ready:
+                name, process = running.pop(receiver)
+                try:
+                    solutions, stats = receiver.recv()
+                except EOFError:  # the process died without reporting
+                    solutions, stats = [], {'status': 'ERROR', 'error': f'exit code {process.exitcode}'}
+                process.join()
+                results[name] = {
+                    'status': stats.get('status'),
+                    'seconds': time.perf_counter() - started,
+                    'solutions': len(solutions)
+                }
+                if stats.get('status') in FAILED_STATUSES:
+                    results[name]['error'] = stats.get('error', stats.get('status'))
+                    continue
+                if stats.get('status') in DECISIVE_STATUSES and winner is None:
+                    winner = (name, solutions, stats)
+                elif solutions and (winner is None or len(solutions) > len(winner[1])):
+                    winner = (name, solutions, stats)
+            if winner and (len(winner[1]) >= num_solutions or winner[2].get('status') in DECISIVE_STATUSES):
+                break
+    finally:
+        for receiver, (name, process) in running.items():
+            process.terminate()
+            receiver.close()
+            results[name] = {'status': 'TERMINATED', 'seconds': time.perf_counter() - started, 'solutions': 0}
+        for _, process in running.values():
+            process.join()
+
+    if winner is None:
+        failed = {name: result['error'] for name, result in results.items() if 'error' in result}
+        if len(failed) == len(names):
+            error = '; '.join(f'{name}: {message}' for name, message in failed.items())
+            return [], {'status': 'ERROR', 'error': error, 'strategy': None, 'strategy_results': results}
+        return [], {'status': 'UNKNOWN', 'strategy': None, 'strategy_results': results}
+    name, solutions, stats = winner
+    return solutions, dict(stats, strategy=name, strategy_results=results)
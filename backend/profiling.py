@@ -0,0 +1,187 @@
+"""
+Opt-in request profiling for admins.
+
+A request carrying an ``X-Profile: 1`` header or a ``profile=1`` query
+parameter, sent by an admin user, runs under cProfile. The profile and
+the SQL statements the request issued are kept in an in-memory ring buffer
+and the response gets an ``X-Profile-Id`` header to look them up with.
+
+cProfile only sees code running on the event loop thread, which covers
+async endpoints and their response serialization but not sync
+dependencies run in the thread pool (their SQL is still captured). Other
+requests handled at the same time show up in the profile too, and only
+one request is profiled at a time.
+"""
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from threading import Lock
+from typing import List, Optional
+
+from sqlalchemy import event
+
+from auth import verify_token
+
+# Profiles kept in memory per worker process
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "20"))
+
+# Functions listed in a profile summary
+PROFILE_TOP_FUNCTIONS = 30
+
+# Longest statement / parameter text stored per SQL statement
+MAX_SQL_TEXT = 2000
+
+_profiles = deque(maxlen=PROFILE_BUFFER_SIZE)
+_profiles_lock = Lock()
+_profiler_lock = Lock()
+
+# SQL statements of the request being profiled, None otherwise
+_captured_sql: ContextVar[Optional[list]] = ContextVar("captured_sql", default=None)
+
+
+def _truncate(text: str) -> str:
+    return text if len(text) <= MAX_SQL_TEXT else text[:MAX_SQL_TEXT] + "..."
+
+
+def is_requested(request) -> bool:
+    """Whether the request asks to be profiled."""
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    return flag is not None and flag.lower() in ("1", "true", "yes")
+
+
+def is_admin(request) -> bool:
+    """
+    Whether the request's token belongs to a user who is an admin now.
+
+    Like ``get_current_admin``, the role is read from the user's row rather
+    than the token, so a demoted admin loses access straight away.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    payload = verify_token(token)
+    if not payload or not payload.get("sub"):
+        return False
+
+    # Imported here: database imports this module to instrument its engine
+    from database import SessionLocal
+    from services.auth_service import AuthService
+    db = SessionLocal()
+    try:
+        user = AuthService(db).get_user_by_username(payload["sub"])
+        return user is not None and user.role == "admin"
+    finally:
+        db.close()
+
+
+def instrument_engine(engine):
+    """Capture the statements ``engine`` executes while a request is profiled."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _captured_sql.get() is not None:
+            conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        captured = _captured_sql.get()
+        if captured is None or not conn.info.get("profile_started"):
+            return
+        captured.append({
+            "statement": _truncate(statement),
+            "parameters": _truncate(repr(parameters)),
+            "executemany": executemany,
+            "seconds": time.perf_counter() - conn.info["profile_started"].pop()
+        })
+
+
+def _top_functions(profiler: cProfile.Profile) -> List[dict]:
+    stats = pstats.Stats(profiler, stream=io.StringIO()).sort_stats(pstats.SortKey.CUMULATIVE)
+    top = []
+    for func in stats.fcn_list[:PROFILE_TOP_FUNCTIONS]:
+        primitive_calls, calls, total_time, cumulative_time, _ = stats.stats[func]
+        filename, line, name = func
+        top.append({
+            "function": f"{filename}:{line}({name})",
+            "calls": calls,
+            "primitive_calls": primitive_calls,
+            "total_seconds": total_time,
+            "cumulative_seconds": cumulative_time
+        })
+    return top
+
+
+async def profiling_middleware(request, call_next):
+    """Run admin requests that ask for it under cProfile."""
+    if not is_requested(request) or not is_admin(request):
+        return await call_next(request)
+
+    # cProfile allows one active profiler per process
+    if not _profiler_lock.acquire(blocking=False):
+        response = await call_next(request)
+        response.headers["X-Profile-Error"] = "another request is being profiled"
+        return response
+
+    sql = []
+    token = _captured_sql.set(sql)
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    try:
+        profiler.enable()
+        try:
+            response = await call_next(request)
+        finally:
+            profiler.disable()
+    finally:
+        _captured_sql.reset(token)
+        _profiler_lock.release()
+    elapsed = time.perf_counter() - started
+
+    profiler.create_stats()
+    # Dump before summarizing: pstats.Stats() takes the profiler's stats over
+    raw_stats = marshal.dumps(profiler.stats)
+    route = request.scope.get("route")
+    profile = {
+        "id": uuid.uuid4().hex[:12],
+        "method": request.method,
+        "path": request.url.path,
+        "route": getattr(route, "path", None),
+        "status_code": response.status_code,
+        "created_at": datetime.utcnow().isoformat(),
+        "duration_seconds": elapsed,
+        "sql_count": len(sql),
+        "sql_seconds": sum(statement["seconds"] for statement in sql),
+        "sql": sql,
+        "top_functions": _top_functions(profiler),
+        "pstats": raw_stats
+    }
+    with _profiles_lock:
+        _profiles.append(profile)
+
+    response.headers["X-Profile-Id"] = profile["id"]
+    return response
+
+
+def get_profiles() -> List[dict]:
+    """Summaries of the stored profiles, newest first."""
+    with _profiles_lock:
+        profiles = list(_profiles)
+    return [
+        {key: value for key, value in profile.items() if key not in ("sql", "top_functions", "pstats")}
+        for profile in reversed(profiles)
+    ]
+
+
+def get_profile(profile_id: str) -> Optional[dict]:
+    """A stored profile, with its raw pstats data under ``pstats``."""
+    with _profiles_lock:
+        for profile in _profiles:
+            if profile["id"] == profile_id:
+                return profile
+    return None
@@ -1,110 +1,1319 @@
 from ortools.sat.python import cp_model
-from typing import List, Dict
+from ortools.graph.python import min_cost_flow
+from typing import List, Dict, Iterable, Tuple
+import heapq
 import json
+import re
+import time
+from functools import partial
+from itertools import compress
+
+# Bump when the formulation changes so cached generation results are not reused
+MODEL_VERSION = 3
+
+# constraints['engine']: 'full' decides slot, room and faculty in one model;
+# 'decomposed' decides slot and faculty, then matches rooms per slot
+ENGINES = ('full', 'decomposed')
+
+# constraints['search_branching']: CP-SAT's search_branching parameter
+SEARCH_BRANCHING = {
+    'automatic': cp_model.AUTOMATIC_SEARCH,
+    'fixed': cp_model.FIXED_SEARCH,
+    'portfolio': cp_model.PORTFOLIO_SEARCH,
+    'quick_restart': cp_model.PORTFOLIO_WITH_QUICK_RESTART_SEARCH
+}
+
+# constraints['decision_strategy']: 'none' leaves the variable order to
+# CP-SAT; 'difficulty' decides the hardest classes first (_class_difficulty)
+DECISION_STRATEGIES = ('none', 'difficulty')
+
+# Matching cost of a non-lab class in a lab, on top of its empty seats,
+# so labs stay free for the lab blocks that need them
+LAB_MISUSE_COST = 1000
+
+# Relaxed-model weights, per unscheduled class, per hour over a faculty
+# member's max_hours_per_week and per student without a seat for a period
+UNSCHEDULED_WEIGHT = 1000
+OVERTIME_WEIGHT = 100
+OVERFLOW_WEIGHT = 10
+
+# Model size estimate (estimate_size): solver memory on top of the process,
+# fixed plus per variable, measured on the benchmark campuses (about 5 KB per
+# variable up to 70k variables, less beyond)
+ESTIMATE_BASE_MB = 20.0
+ESTIMATE_KB_PER_VARIABLE = 5.0
+
+# Subject key of the periods left to complete a block only partly covered by
+# fixed slots: (subject_id, PARTIAL), scheduled as a shorter block of its own
+PARTIAL = 'partial'
+
+# Quality objective weight of each extra class of a subject on the same
+# day, in empty seats for one period
+REPEAT_PENALTY = 30
+
+def group_electives(preferences: Iterable[Tuple[int, int]], max_basket_size=None) -> List[List[int]]:
+    """
+    Cluster electives into baskets that can run in parallel.
+    
+    Two electives sharing a student must not be in the same basket. The
+    student-overlap graph is the off-diagonal of M^T M for the sparse
+    student x subject incidence matrix M, accumulated per student as a
+    dict of pair counts. Electives are then greedily colored, most
+    overlapping first; each color is one basket.
+    
+    Args:
+        preferences: (student_id, subject_id) pairs
+        max_basket_size: Most electives per basket (e.g. available rooms)
+    
+    Returns:
+        Baskets as lists of subject ids
+    """
+    subjects_of_student = {}
+    for student_id, subject_id in preferences:
+        subjects_of_student.setdefault(student_id, set()).add(subject_id)
+    
+    subject_ids = set()
+    overlap = {}
+    for subjects in subjects_of_student.values():
+        subject_ids.update(subjects)
+        ordered = sorted(subjects)
+        for i, a in enumerate(ordered):
+            for b in ordered[i + 1:]:
+                overlap[(a, b)] = overlap.get((a, b), 0) + 1
+    
+    neighbours = {subject_id: set() for subject_id in subject_ids}
+    for a, b in overlap:
+        neighbours[a].add(b)
+        neighbours[b].add(a)
+    
+    baskets = []
+    for subject_id in sorted(subject_ids, key=lambda sid: (-len(neighbours[sid]), sid)):
+        for basket in baskets:
+            if max_basket_size and len(basket) >= max_basket_size:
+                continue
+            if not neighbours[subject_id].intersection(basket):
+                basket.append(subject_id)
+                break
+        else:
+            baskets.append([subject_id])
+    
+    return baskets
 
 class TimetableScheduler:
-    def __init__(self, classrooms, faculty, subjects, batches, constraints):
+    def __init__(self, classrooms, faculty, subjects, batches, constraints, fixed_slots=None,
+                 elective_baskets=None, occupied=None):
         self.classrooms = classrooms
         self.faculty = faculty
         self.subjects = subjects
         self.batches = batches
         self.constraints = constraints
+        # Pinned classes: dicts with batch, subject, faculty, classroom and slot (grid index)
+        self.fixed_slots = fixed_slots or []
+        # batch_id -> lists of elective subject ids scheduled in parallel
+        self.elective_baskets = elective_baskets or {}
+        # Classes of other active timetables: dicts with slot (grid index),
+        # classroom and faculty, whose rooms and faculty are taken then
+        self.occupied = occupied or []
         
         # Time slots: 5 days, 8 slots per day (9am-5pm)
         self.days = constraints.get('days', 5)
         self.slots_per_day = constraints.get('slots_per_day', 8)
         self.total_slots = self.days * self.slots_per_day
         
-    def generate_schedules(self, num_solutions=3):
+        self.engine = constraints.get('engine', 'full')
+        if self.engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{self.engine}', expected one of: {', '.join(ENGINES)}")
+        self.search_branching = constraints.get('search_branching', 'automatic')
+        if self.search_branching not in SEARCH_BRANCHING:
+            raise ValueError(
+                f"Unknown search_branching '{self.search_branching}', expected one of: {', '.join(SEARCH_BRANCHING)}"
+            )
+        self.decision_strategy = constraints.get('decision_strategy', 'none')
+        if self.decision_strategy not in DECISION_STRATEGIES:
+            raise ValueError(
+                f"Unknown decision_strategy '{self.decision_strategy}', "
+                f"expected one of: {', '.join(DECISION_STRATEGIES)}"
+            )
+        
+        # True while solving the relaxed model (solve_relaxed): rooms then
+        # fit regardless of capacity, at OVERFLOW_WEIGHT per missing seat
+        self.relaxed = False
+        
+        # subject_id -> faculty qualified to teach it
+        self.qualified_faculty = {}
+        for fac in faculty:
+            for subject_id in fac.get('subjects', []):
+                self.qualified_faculty.setdefault(subject_id, []).append(fac)
+        
+    def generate_schedules(self, num_solutions=3, hint=True, solver_parameters=None):
+        # solver_parameters: CP-SAT parameter name -> value, over the defaults below
+        # Per-phase timings and solver statistics of the last run
+        self.stats = {'engine': self.engine}
+        build_started = time.perf_counter()
+        built = self._build_model()
+        model = built['model']
+        
+        hinted = None
+        if hint:
+            # Start the search from the greedy timetable, clashes and all
+            greedy_started = time.perf_counter()
+            blocks, _ = self._greedy_blocks(
+                built['class_counts'], built['block_lengths'], built['room_kinds'],
+                built['candidates'], built['basket_of']
+            )
+            hinted = self._add_hint(built, blocks)
+            self.stats['greedy_seconds'] = time.perf_counter() - greedy_started
+        
+        proto = model.Proto()
+        self.stats['num_variables'] = len(proto.variables)
+        self.stats['num_constraints'] = len(proto.constraints)
+        self.stats['num_classes'] = sum(built['class_counts'].values())
+        self.stats['model_build_seconds'] = time.perf_counter() - build_started
+        
+        # Solve
+        solver = cp_model.CpSolver()
+        solution_collector = self._collector(built, num_solutions)
+        solver.parameters.enumerate_all_solutions = True
+        solver.parameters.max_time_in_seconds = 30.0
+        solver.parameters.search_branching = SEARCH_BRANCHING[self.search_branching]
+        
+        # The search log is the only place CP-SAT reports presolve timing
+        solve_log = []
+        solver.parameters.log_search_progress = True
+        solver.parameters.log_to_stdout = False
+        solver.log_callback = solve_log.append
+        for name, value in (solver_parameters or {}).items():
+            setattr(solver.parameters, name, value)
+        
+        if hinted is not None:
+            # A greedy timetable that satisfies the model is the first
+            # solution, so the search only has to find the others
+            self.stats['hint_solution'] = self._hint_is_feasible(model)
+            if self.stats['hint_solution']:
+                solution_collector.add_solution(hinted)
+        
+        if solution_collector.solution_count < num_solutions:
+            status = solver.Solve(model, solution_collector)
+            self.stats.update(self._solver_stats(solver, status, proto, solve_log, solution_collector))
+            if status == cp_model.UNKNOWN and solution_collector.solution_count:
+                status = cp_model.FEASIBLE
+                self.stats['status'] = 'FEASIBLE'
+        else:
+            status = cp_model.FEASIBLE
+            self.stats.update(status='FEASIBLE', first_solution_seconds=0.0,
+                              solutions_found=solution_collector.solution_count)
+        
+        if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+            solutions = solution_collector.solutions
+            if self.engine == 'decomposed':
+                self.stats['room_assignment_failures'] = solution_collector.solution_count - len(solutions)
+            return solutions
+        
+        return []
+    
+    def optimize_schedule(self, time_limit=10.0, hint_blocks=None):
+        """
+        The best timetable by quality found within ``time_limit`` seconds.
+        
+        Same model as ``generate_schedules`` plus an objective (see
+        ``_quality_objective``). ``hint_blocks`` are (batch, subject, start,
+        classroom, faculty) tuples of a known placement to start from.
+        
+        Returns:
+            (schedule entries, objective value), or (None, None) when no
+            solution was found
+        """
+        self.stats = {'engine': self.engine}
+        built = self._build_model()
+        model = built['model']
+        model.Minimize(self._quality_objective(model, built))
+        if hint_blocks is not None:
+            self._add_hint(built, hint_blocks)
+        return self._solve_objective(built, time_limit)
+    
+    def solve_relaxed(self, time_limit=30.0, hint=True):
+        """
+        A best-effort timetable for a problem with no feasible one.
+        
+        Re-solves with slack on the constraints that can give: classes may
+        go unscheduled, faculty may teach past ``max_hours_per_week`` and
+        batches may sit in rooms too small for them. Lab requirements,
+        availability and double-booking stay hard. Violations are
+        minimised, weighted UNSCHEDULED_WEIGHT per class, OVERTIME_WEIGHT
+        per extra hour and OVERFLOW_WEIGHT per student without a seat for a
+        period (the decomposed engine leaves overflow to room matching).
+        
+        Returns:
+            (schedule entries, violations as from ``find_violations``), or
+            (None, None) when no solution was found
+        """
+        started = time.perf_counter()
+        self.stats = {'engine': self.engine, 'relaxed': True}
+        self.relaxed = True
+        try:
+            built = self._build_model()
+            model = built['model']
+            model.Minimize(self._violation_objective(built))
+            best = (None, None)
+            if hint:
+                blocks, _ = self._greedy_blocks(
+                    built['class_counts'], built['block_lengths'], built['room_kinds'],
+                    built['candidates'], built['basket_of'], force=False
+                )
+                self._add_hint(built, blocks)
+                # The search does not reliably start from the hint on large
+                # models, so the greedy timetable is priced first as a fallback
+                best = self._solve_objective(built, min(5.0, time_limit), fixed_hint=True)
+                self.stats['hint_solution'] = best[0] is not None
+            remaining = time_limit - (time.perf_counter() - started)
+            if remaining > 0:
+                schedule, objective = self._solve_objective(built, remaining)
+                if schedule is not None and (best[0] is None or objective < best[1]):
+                    best = (schedule, objective)
+        finally:
+            self.relaxed = False
+        schedule, objective = best
+        if schedule is None:
+            return None, None
+        if self.stats['status'] == 'UNKNOWN':
+            self.stats['status'] = 'FEASIBLE'
+        self.stats['objective_value'] = objective
+        return schedule, self.find_violations(schedule)
+    
+    def _violation_objective(self, built):
+        """Weighted slack of a relaxed ``_build_model`` model (see ``solve_relaxed``)."""
+        terms = [var * UNSCHEDULED_WEIGHT for var in built['unscheduled'].values()]
+        terms += [var * OVERTIME_WEIGHT for var in built['overtime'].values()]
+        capacity = {room['id']: room.get('capacity') for room in self.classrooms}
+        for batch_id, subject_id in built['class_counts']:
+            _, student_count = built['room_kinds'][(batch_id, subject_id)]
+            length = built['block_lengths'][(batch_id, subject_id)]
+            for (_, room_id, _), var in built['assignments'][batch_id][subject_id].items():
+                seats = capacity.get(room_id)
+                if student_count is not None and seats is not None and seats < student_count:
+                    terms.append(var * (OVERFLOW_WEIGHT * length * (student_count - seats)))
+        return cp_model.LinearExpr.Sum(terms)
+    
+    def _solve_objective(self, built, time_limit, fixed_hint=False):
+        """
+        Solve a ``_build_model`` model with an objective; (schedule, objective value) or (None, None).
+        
+        ``fixed_hint`` fixes the hinted variables to their hint, leaving
+        the solver only the rest, as ``_hint_is_feasible`` does.
+        """
+        solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = time_limit
+        solver.parameters.search_branching = SEARCH_BRANCHING[self.search_branching]
+        # Presolve may otherwise drop the hinted solution as dominated
+        solver.parameters.keep_all_feasible_solutions_in_presolve = True
+        if fixed_hint:
+            solver.parameters.fix_variables_to_their_hinted_value = True
+            solver.parameters.cp_model_presolve = False
+            solver.parameters.num_workers = 1
+        status = solver.Solve(built['model'])
+        self.stats.update(status=solver.StatusName(status), solve_seconds=solver.WallTime())
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            return None, None
+        
+        collector = self._collector(built, 1)
+        values = solver.ResponseProto().solution
+        collector.add_solution(list(compress(range(len(values)), values)))
+        solutions = collector.solutions
+        if not solutions:
+            return None, None
+        return solutions[0], solver.ObjectiveValue()
+    
+    def find_violations(self, schedule):
+        """
+        The soft-able constraints a schedule breaks.
+        
+        Returns dicts by ``type``: 'unscheduled' (batch, subject, classes
+        missing of its weekly count), 'faculty_hours' (faculty, hours,
+        max_hours) and 'room_capacity' (batch, subject, classroom, day,
+        slot, students, capacity), one per overfull period.
+        """
+        capacity = {room['id']: room.get('capacity') for room in self.classrooms}
+        students = {batch['id']: batch.get('student_count') for batch in self.batches}
+        periods, hours = {}, {}
+        for f in self.occupied:
+            hours[f['faculty']] = hours.get(f['faculty'], 0) + 1
+        violations = []
+        for entry in schedule:
+            key = (entry['batch'], entry['subject'])
+            periods[key] = periods.get(key, 0) + 1
+            hours[entry['faculty']] = hours.get(entry['faculty'], 0) + 1
+            seats, count = capacity.get(entry['classroom']), students.get(entry['batch'])
+            if seats is not None and count is not None and seats < count:
+                violations.append({
+                    'type': 'room_capacity', 'batch': entry['batch'], 'subject': entry['subject'],
+                    'classroom': entry['classroom'], 'day': entry['day'], 'slot': entry['slot'],
+                    'students': count, 'capacity': seats
+                })
+        
+        unscheduled = []
+        for subject in self.subjects:
+            key = (subject['batch_id'], subject['id'])
+            if subject['batch_id'] not in students:
+                continue
+            placed = -(-periods.get(key, 0) // self._block_length(subject))
+            missing = subject.get('classes_per_week', 3) - placed
+            if missing > 0:
+                unscheduled.append({'type': 'unscheduled', 'batch': key[0], 'subject': key[1], 'classes': missing})
+        overtime = [
+            {'type': 'faculty_hours', 'faculty': fac['id'], 'hours': hours[fac['id']],
+             'max_hours': fac['max_hours_per_week']}
+            for fac in self.faculty
+            if fac.get('max_hours_per_week') is not None and hours.get(fac['id'], 0) > fac['max_hours_per_week']
+        ]
+        return unscheduled + overtime + violations
+    
+    def estimate_size(self, engine=None, relaxed=False):
+        """
+        Predict the model's size without building it.
+        
+        Counts the placements ``_build_model`` would create for ``engine``
+        (default: this scheduler's) from the problem snapshot alone: block
+        starts times fitting rooms (full engine only) times qualified
+        faculty, each weighted by the share of the week they are available.
+        Occupied slots are not subtracted, so counts are an upper bound.
+        ``relaxed`` estimates the ``solve_relaxed`` model, where every room
+        of the right type fits. ``memory_mb`` is the solver's peak on top of
+        the process.
+        
+        Returns:
+            dict with variables, constraints and memory_mb
+        """
+        if relaxed and not self.relaxed:
+            self.relaxed = True
+            try:
+                return self.estimate_size(engine)
+            finally:
+                self.relaxed = False
+        decomposed = (engine or self.engine) == 'decomposed'
+        students = {batch['id']: batch for batch in self.batches}
+        fixed_counts = {}
+        for f in self.fixed_slots:
+            fixed_counts[(f['batch'], f['subject'])] = fixed_counts.get((f['batch'], f['subject']), 0) + 1
+        available = {
+            fac['id']: (bin(fac['availability_mask'] & ((1 << self.total_slots) - 1)).count('1') / self.total_slots
+                        if fac.get('availability_mask') is not None else 1.0)
+            for fac in self.faculty
+        }
+        rooms_of_kind, starts_of_length = {}, {}
+        
+        variables = classes = 0
+        for subject in self.subjects:
+            batch = students.get(subject['batch_id'])
+            if batch is None:
+                continue
+            length = self._block_length(subject)
+            fixed_periods = fixed_counts.get((batch['id'], subject['id']), 0)
+            if subject.get('classes_per_week', 3) <= fixed_periods // length:
+                continue
+            kind = self._room_kind(batch, subject)
+            if kind not in rooms_of_kind:
+                rooms_of_kind[kind] = sum(self._room_fits(room, *kind) for room in self.classrooms)
+            faculty = sum(available.get(fac['id'], 1.0) for fac in self.qualified_faculty.get(subject['id'], []))
+            # A partial block (see _class_candidates) has placements of its own
+            lengths = [length] + ([length - fixed_periods % length] if fixed_periods % length else [])
+            for block_length in lengths:
+                if block_length not in starts_of_length:
+                    starts_of_length[block_length] = len(self._block_starts(block_length))
+                classes += 1
+                variables += starts_of_length[block_length] * faculty * (1 if decomposed else rooms_of_kind[kind])
+        
+        # Weekly counts, double-booking per slot and resource, faculty hours
+        constraints = classes + self.total_slots * (len(self.classrooms) + len(self.faculty) + len(self.batches))
+        constraints += len(self.faculty)
+        memory_mb = ESTIMATE_BASE_MB + ESTIMATE_KB_PER_VARIABLE * variables / 1024
+        return {'variables': int(variables), 'constraints': constraints, 'memory_mb': round(memory_mb, 1)}
+    
+    def _build_model(self):
+        """
+        The CP-SAT model of the problem, without an objective.
+        
+        Returns a dict with the model and what solving, hinting and
+        decoding need: assignments, class_counts, block_lengths,
+        room_kinds, candidates, basket_of, session_vars and busy_rooms.
+        """
+        decomposed = self.engine == 'decomposed'
         model = cp_model.CpModel()
         
-        # Variables: assignment[batch][subject][slot][classroom][faculty]
-        assignments = {}
+        # Fixed slots are constants: their resources are taken out of every
+        # other class's domain and they need no variables of their own.
+        busy_batches, busy_rooms, busy_faculty = self._fixed_occupancy()
+        basket_of = self._basket_of()
+        class_counts, block_lengths, room_kinds, candidates = self._class_candidates()
+        
+        # Variables: assignments[batch][subject][(start, classroom, faculty)].
+        # The weekly classes of a subject are interchangeable, so there is
+        # one variable per placement and class_counts[(batch, subject)] of
+        # them are chosen, rather than one copy per class whose permutations
+        # would all be distinct solutions. The decomposed engine leaves the
+        # classroom out of the key (None) and assigns rooms after solving.
+        assignments = {batch['id']: {} for batch in self.batches}
+        
+        # Resource usage per slot, collected while creating variables
+        faculty_usage = {}
+        room_usage = {}
+        batch_usage = {}
+        # Decomposed engine: slot -> [(room kind, var)] of classes needing a room
+        room_demand = {}
+        
+        for (batch_id, subject_id), options in candidates.items():
+            placements = assignments[batch_id][subject_id] = {}
+            kind = room_kinds[(batch_id, subject_id)]
+            in_basket = (batch_id, subject_id) in basket_of
+            if decomposed:
+                for start, (covered, _, free_faculty) in options.items():
+                    for fac in free_faculty:
+                        var = model.NewBoolVar(f'b{batch_id}_s{subject_id}_sl{start}_f{fac["id"]}')
+                        placements[(start, None, fac['id'])] = var
+                        for slot in covered:
+                            faculty_usage.setdefault((slot, fac['id']), []).append(var)
+                            room_demand.setdefault(slot, []).append((kind, var))
+                            if not in_basket:
+                                batch_usage.setdefault((slot, batch_id), []).append(var)
+                continue
+            
+            for start, (covered, free_rooms, free_faculty) in options.items():
+                for classroom in free_rooms:
+                    for fac in free_faculty:
+                        var = model.NewBoolVar(f'b{batch_id}_s{subject_id}_sl{start}_c{classroom["id"]}_f{fac["id"]}')
+                        placements[(start, classroom['id'], fac['id'])] = var
+                        for slot in covered:
+                            faculty_usage.setdefault((slot, fac['id']), []).append(var)
+                            room_usage.setdefault((slot, classroom['id']), []).append(var)
+                            if not in_basket:
+                                batch_usage.setdefault((slot, batch_id), []).append(var)
+        
+        session_vars = self._link_elective_baskets(
+            model, assignments, class_counts, basket_of, batch_usage, block_lengths
+        )
+        
+        # Constraint 1: Each subject gets exactly its weekly number of classes;
+        # the relaxed model counts the classes left out instead
+        unscheduled = {}
+        for (batch_id, subject_id), count in class_counts.items():
+            placements = list(assignments[batch_id][subject_id].values())
+            if self.relaxed:
+                if count:
+                    missing = unscheduled[(batch_id, subject_id)] = model.NewIntVar(
+                        0, count, f'unscheduled_b{batch_id}_s{subject_id}'
+                    )
+                    model.Add(cp_model.LinearExpr.Sum(placements) + missing == count)
+            elif placements:
+                model.Add(cp_model.LinearExpr.Sum(placements) == count)
+            elif count:
+                # Nowhere to put it: the model is infeasible
+                model.AddBoolOr([])
+        
+        # Constraints 2-4: No faculty, classroom or batch double-booking
+        for usage in (faculty_usage, room_usage, batch_usage):
+            for slot_vars in usage.values():
+                if len(slot_vars) > 1:
+                    model.AddAtMostOne(slot_vars)
+        if decomposed:
+            self._limit_room_demand(model, room_demand, busy_rooms)
+        overtime = self._limit_faculty_hours(model, faculty_usage)
+        if self.decision_strategy == 'difficulty':
+            difficulty = self._class_difficulty(class_counts, block_lengths, candidates)
+            self._add_difficulty_strategy(model, assignments, difficulty, room_kinds)
+        
+        return {
+            'model': model,
+            'assignments': assignments,
+            'class_counts': class_counts,
+            'block_lengths': block_lengths,
+            'room_kinds': room_kinds,
+            'candidates': candidates,
+            'basket_of': basket_of,
+            'session_vars': session_vars,
+            'busy_rooms': busy_rooms,
+            'unscheduled': unscheduled,
+            'overtime': overtime
+        }
+    
+    def _limit_faculty_hours(self, model, faculty_usage):
+        """
+        Constraint 5: Faculty teach at most max_hours_per_week periods, fixed slots and occupied classes included.
+        
+        Returns the relaxed model's overtime variables by faculty id; the
+        strict model has none.
+        """
+        fixed_hours = self._taken_hours()
+        taught = {}
+        for (_, fac_id), slot_vars in faculty_usage.items():
+            taught.setdefault(fac_id, []).extend(slot_vars)
+        
+        overtime = {}
+        for fac in self.faculty:
+            limit = fac.get('max_hours_per_week')
+            periods = taught.get(fac['id'])
+            if limit is None or not periods:
+                continue
+            spare = max(limit - fixed_hours.get(fac['id'], 0), 0)
+            if len(periods) <= spare:
+                continue
+            if self.relaxed:
+                extra = overtime[fac['id']] = model.NewIntVar(0, len(periods), f'overtime_f{fac["id"]}')
+                model.Add(cp_model.LinearExpr.Sum(periods) <= spare + extra)
+            else:
+                model.Add(cp_model.LinearExpr.Sum(periods) <= spare)
+        return overtime
+    
+    def _class_difficulty(self, class_counts, block_lengths, candidates):
+        """
+        (batch, subject) -> how hard its classes are to place; higher is harder.
+        
+        Each class spreads its periods evenly over the rooms and faculty
+        that could take it, giving every room and faculty member an
+        expected load. A class's contention is the mean load, as a share of
+        the week, of its rooms plus that of its faculty. Difficulty is
+        (1 + contention) times the classes needed per candidate start, so
+        a class with few starts on busy resources comes first.
+        """
+        room_load, faculty_load, resources = {}, {}, {}
+        for key, options in candidates.items():
+            rooms = {room['id'] for _, free_rooms, _ in options.values() for room in free_rooms}
+            faculty = {fac['id'] for _, _, free_faculty in options.values() for fac in free_faculty}
+            resources[key] = rooms, faculty
+            periods = class_counts[key] * block_lengths[key]
+            for room_id in rooms:
+                room_load[room_id] = room_load.get(room_id, 0.0) + periods / len(rooms)
+            for fac_id in faculty:
+                faculty_load[fac_id] = faculty_load.get(fac_id, 0.0) + periods / len(faculty)
+        
+        difficulty = {}
+        for key, options in candidates.items():
+            if not class_counts[key] or not options:
+                continue
+            rooms, faculty = resources[key]
+            contention = (
+                sum(room_load[r] for r in rooms) / len(rooms) + sum(faculty_load[f] for f in faculty) / len(faculty)
+            ) / self.total_slots
+            difficulty[key] = (1 + contention) * class_counts[key] / len(options)
+        return difficulty
+    
+    def _add_difficulty_strategy(self, model, assignments, difficulty, room_kinds):
+        """
+        Branch on the hardest classes first, trying to place them (value 1) before ruling slots out.
+        
+        Within a class, the same period on each day comes first so its
+        classes spread over the week, then the best-fitting room. Basket
+        session variables are left out: member placements imply them, and
+        deciding sessions first was slower in benchmarks.
+        """
+        rooms = {room['id']: room for room in self.classrooms}
+        
+        ordered = []
+        for batch_id, subject_id in sorted(difficulty, key=difficulty.get, reverse=True):
+            placements = assignments[batch_id][subject_id]
+            kind = room_kinds[(batch_id, subject_id)]
+            
+            def order(key):
+                start, room_id, _ = key
+                cost = self._room_cost(rooms[room_id], *kind) if room_id is not None else 0
+                return start % self.slots_per_day, start // self.slots_per_day, cost
+            
+            ordered.extend(placements[key] for key in sorted(placements, key=order))
+        if ordered:
+            model.AddDecisionStrategy(ordered, cp_model.CHOOSE_FIRST, cp_model.SELECT_MAX_VALUE)
+    
+    def _collector(self, built, limit):
+        """Solution collector for a model from ``_build_model``."""
+        assign_rooms = None
+        if self.engine == 'decomposed':
+            assign_rooms = partial(self._assign_rooms, block_lengths=built['block_lengths'],
+                                   room_kinds=built['room_kinds'], busy_rooms=built['busy_rooms'])
+        return SolutionCollector(
+            built['assignments'], limit, self.slots_per_day, self._fixed_entries(), built['block_lengths'],
+            assign_rooms
+        )
+    
+    def _quality_objective(self, model, built):
+        """
+        Empty seats plus REPEAT_PENALTY per extra class of a subject on one day.
+        
+        Empty seats are counted per period a class sits in a room larger
+        than its batch; the decomposed engine picks rooms after solving, so
+        there only repeats count. Fixed slots count toward repeats.
+        """
+        fixed_periods = {}
+        for f in self.fixed_slots:
+            key = (f['batch'], f['subject'], f['slot'] // self.slots_per_day)
+            fixed_periods[key] = fixed_periods.get(key, 0) + 1
+        rooms = {room['id']: room for room in self.classrooms}
+        
+        terms = []
+        for (batch_id, subject_id), count in built['class_counts'].items():
+            placements = built['assignments'][batch_id][subject_id]
+            if not count or not placements:
+                continue
+            length = built['block_lengths'][(batch_id, subject_id)]
+            needs_lab, student_count = built['room_kinds'][(batch_id, subject_id)]
+            by_day = {}
+            for (start, room_id, _), var in placements.items():
+                by_day.setdefault(start // self.slots_per_day, []).append(var)
+                room = rooms.get(room_id)
+                if room and student_count is not None and room.get('capacity') is not None:
+                    terms.append(var * (length * max(room['capacity'] - student_count, 0)))
+            for day, day_vars in by_day.items():
+                fixed = -(-fixed_periods.get((batch_id, subject_id, day), 0) // length)
+                if len(day_vars) + fixed < 2:
+                    continue
+                extra = model.NewIntVar(0, len(day_vars) + fixed, f'repeat_b{batch_id}_s{subject_id}_d{day}')
+                model.Add(extra >= cp_model.LinearExpr.Sum(day_vars) + fixed - 1)
+                terms.append(extra * REPEAT_PENALTY)
+        return cp_model.LinearExpr.Sum(terms)
+    
+    def greedy_schedule(self):
+        """
+        Build a timetable in one pass, without the solver.
+        
+        Takes a fraction of a second where the solver can take many, so it serves as
+        an instant preview. It may contain conflicts: a subject with no
+        free start left is still placed where it clashes least. See
+        ``_greedy_blocks``.
+        
+        Returns:
+            (schedule entries, unscheduled) where unscheduled lists
+            {'batch', 'subject', 'classes'} for classes with no candidate
+            start at all
+        """
+        class_counts, block_lengths, room_kinds, candidates = self._class_candidates()
+        blocks, unscheduled = self._greedy_blocks(
+            class_counts, block_lengths, room_kinds, candidates, self._basket_of()
+        )
+        schedule = self._fixed_entries() + _block_entries(blocks, block_lengths, self.slots_per_day)
+        return schedule, unscheduled
+    
+    def _greedy_blocks(self, class_counts, block_lengths, room_kinds, candidates, basket_of, force=True):
+        """
+        DSatur-style constructor over the candidate sets.
         
+        Each subject, or elective basket placed as one, is a group. The
+        group with the least slack (feasible starts left minus sessions
+        still needed) goes next, at the start fewest other groups can use,
+        preferring days the group does not use yet. Each class gets the
+        cheapest fitting room and the least-loaded qualified faculty with
+        hours left. A group with no feasible start left is placed where it
+        clashes least, or left unscheduled without ``force``.
+        
+        Returns:
+            (blocks, unscheduled): (batch, subject, start, classroom,
+            faculty) tuples and the classes that could not be placed
+        """
+        busy = {}
+        for f in self.fixed_slots:
+            busy.setdefault(('batch', f['batch']), set()).add(f['slot'])
+        for f in self.fixed_slots + self.occupied:
+            for resource in (('room', f['classroom']), ('faculty', f['faculty'])):
+                busy.setdefault(resource, set()).add(f['slot'])
+        load = {}
+        # Periods each faculty member may still teach under max_hours_per_week
+        taken = self._taken_hours()
+        hours_left = {
+            fac['id']: fac['max_hours_per_week'] - taken.get(fac['id'], 0) for fac in self.faculty
+            if fac.get('max_hours_per_week') is not None
+        }
+        
+        # Candidate rooms cheapest first, so the first free one is the best
+        options = {}
+        for key, starts in candidates.items():
+            cost = {room['id']: self._room_cost(room, *room_kinds[key]) for room in self.classrooms}
+            options[key] = {
+                start: (covered, sorted(rooms, key=lambda room: cost[room['id']]), faculty)
+                for start, (covered, rooms, faculty) in starts.items()
+            }
+        
+        groups = []
+        seen_baskets = set()
+        for (batch_id, subject_id), count in class_counts.items():
+            if not count:
+                continue
+            basket = basket_of.get((batch_id, subject_id))
+            if basket is not None:
+                if (batch_id, tuple(basket)) in seen_baskets:
+                    continue
+                seen_baskets.add((batch_id, tuple(basket)))
+            members = basket or [subject_id]
+            remaining = {sid: class_counts[(batch_id, sid)] for sid in members if class_counts.get((batch_id, sid))}
+            groups.append({
+                'batch': batch_id,
+                'basket': tuple(basket) if basket else None,
+                'remaining': remaining,
+                # Basket members with the fewest qualified faculty pick first
+                'order': sorted(remaining, key=lambda sid: len(self.qualified_faculty.get(sid, []))),
+                'length': max(block_lengths[(batch_id, sid)] for sid in remaining),
+                'starts': sorted({start for sid in remaining for start in candidates[(batch_id, sid)]}),
+                'days': {}
+            })
+        
+        def free(resource, covered):
+            slots = busy.get(resource)
+            return not slots or slots.isdisjoint(covered)
+        
+        def has_hours(fac_id, covered):
+            return hours_left.get(fac_id, len(covered)) >= len(covered)
+        
+        def clashes(resource, covered):
+            slots = busy.get(resource)
+            return len(slots.intersection(covered)) if slots else 0
+        
+        def fit(group, start, balance=False):
+            """Clash-free [(subject, room, faculty)] at start, or None; ``balance`` picks the least-loaded faculty."""
+            batch_id = group['batch']
+            if not free(('batch', batch_id), range(start, start + group['length'])):
+                return None
+            needed = max(group['remaining'].values())
+            taken_rooms, taken_faculty, placed = set(), set(), []
+            for sid in group['order']:
+                left = group['remaining'][sid]
+                if not left:
+                    continue
+                option = options[(batch_id, sid)].get(start)
+                room = fac = None
+                if option:
+                    covered, rooms, faculty = option
+                    room = next((r['id'] for r in rooms
+                                 if r['id'] not in taken_rooms and free(('room', r['id']), covered)), None)
+                    free_faculty = (f['id'] for f in faculty
+                                    if f['id'] not in taken_faculty and free(('faculty', f['id']), covered)
+                                    and has_hours(f['id'], covered))
+                    if balance:
+                        fac = min(free_faculty, key=lambda fac_id: load.get(fac_id, 0), default=None)
+                    else:
+                        fac = next(free_faculty, None)
+                if room is None or fac is None:
+                    if left == needed:
+                        return None
+                    continue
+                taken_rooms.add(room)
+                taken_faculty.add(fac)
+                placed.append((sid, room, fac))
+            return placed
+        
+        def force_at(group, start):
+            """Least-clashing [(subject, room, faculty)] at start with its clash count, or (None, 0)."""
+            batch_id = group['batch']
+            total = clashes(('batch', batch_id), range(start, start + group['length']))
+            needed = max(group['remaining'].values())
+            taken_rooms, taken_faculty, placed = set(), set(), []
+            for sid in group['order']:
+                left = group['remaining'][sid]
+                option = options[(batch_id, sid)].get(start) if left else None
+                if option is None:
+                    if left == needed:
+                        return None, 0
+                    continue
+                covered, rooms, faculty = option
+                room = min(rooms, key=lambda r: clashes(('room', r['id']), covered) + (r['id'] in taken_rooms))
+                fac = min(faculty, key=lambda f: (
+                    clashes(('faculty', f['id']), covered) + (f['id'] in taken_faculty),
+                    not has_hours(f['id'], covered), load.get(f['id'], 0)
+                ))
+                total += (clashes(('room', room['id']), covered) + (room['id'] in taken_rooms)
+                          + clashes(('faculty', fac['id']), covered) + (fac['id'] in taken_faculty))
+                taken_rooms.add(room['id'])
+                taken_faculty.add(fac['id'])
+                placed.append((sid, room['id'], fac['id']))
+            return placed, total
+        
+        # Groups sharing a batch, room or faculty member, to recheck after a placement
+        users = {}
+        for index, group in enumerate(groups):
+            users.setdefault(('batch', group['batch']), set()).add(index)
+            for sid in group['remaining']:
+                for _, rooms, faculty in candidates[(group['batch'], sid)].values():
+                    for room in rooms:
+                        users.setdefault(('room', room['id']), set()).add(index)
+                    for fac in faculty:
+                        users.setdefault(('faculty', fac['id']), set()).add(index)
+        
+        feasible = [{start for start in group['starts'] if fit(group, start) is not None} for group in groups]
+        demand = {}
+        for starts in feasible:
+            for start in starts:
+                demand[start] = demand.get(start, 0) + 1
+        
+        def priority(index):
+            group = groups[index]
+            return (len(feasible[index]) - max(group['remaining'].values()), -group['length'], index)
+        
+        longest = max((group['length'] for group in groups), default=1)
+        heap = [(priority(index), index) for index in range(len(groups))]
+        heapq.heapify(heap)
+        done = set()
+        blocks, unscheduled = [], []
+        
+        while heap:
+            key, index = heapq.heappop(heap)
+            if index in done or key != priority(index):
+                continue
+            group = groups[index]
+            batch_id = group['batch']
+            
+            placed = None
+            if feasible[index]:
+                start = min(feasible[index], key=lambda s: (
+                    group['days'].get(s // self.slots_per_day, 0), demand[s], s
+                ))
+                placed = fit(group, start, balance=True)
+            elif force:
+                forced = [(force_at(group, s), s) for s in group['starts']]
+                forced = [(total, s, placement) for (placement, total), s in forced if placement]
+                if forced:
+                    _, start, placed = min(forced, key=lambda option: option[:2])
+            
+            if not placed:
+                for sid, left in group['remaining'].items():
+                    if left:
+                        unscheduled.append({'batch': batch_id, 'subject': _subject_id(sid), 'classes': left})
+                group['remaining'] = dict.fromkeys(group['remaining'], 0)
+                affected, anywhere, start, end = {index}, set(), 0, 0
+            else:
+                affected = set(users[('batch', batch_id)])
+                # Groups of faculty running out of hours, to recheck at every start
+                anywhere = set()
+                end = start + group['length']
+                busy.setdefault(('batch', batch_id), set()).update(range(start, end))
+                for sid, room_id, fac_id in placed:
+                    covered = range(start, start + block_lengths[(batch_id, sid)])
+                    busy.setdefault(('room', room_id), set()).update(covered)
+                    busy.setdefault(('faculty', fac_id), set()).update(covered)
+                    affected |= users[('room', room_id)] | users[('faculty', fac_id)]
+                    load[fac_id] = load.get(fac_id, 0) + len(covered)
+                    if fac_id in hours_left:
+                        hours_left[fac_id] -= len(covered)
+                        if hours_left[fac_id] < longest:
+                            anywhere |= users[('faculty', fac_id)]
+                    group['remaining'][sid] -= 1
+                    blocks.append((batch_id, sid, start, room_id, fac_id))
+                day = start // self.slots_per_day
+                group['days'][day] = group['days'].get(day, 0) + 1
+            
+            # Only starts overlapping the placement can have become
+            # infeasible, or any start for faculty short of hours
+            for other in (affected | anywhere) - done:
+                old = feasible[other]
+                if not any(groups[other]['remaining'].values()):
+                    new = set()
+                    done.add(other)
+                else:
+                    length = groups[other]['length']
+                    new = {s for s in old
+                           if (other not in anywhere and (s >= end or s + length <= start))
+                           or fit(groups[other], s) is not None}
+                for s in old - new:
+                    demand[s] -= 1
+                feasible[other] = new
+                if other not in done:
+                    heapq.heappush(heap, (priority(other), other))
+        
+        return blocks, unscheduled
+    
+    def _add_hint(self, built, blocks):
+        """Hint every variable of a ``_build_model`` model with its value in ``blocks``; returns the indexes hinted 1."""
+        model = built['model']
+        decomposed = self.engine == 'decomposed'
+        hinted = []
+        chosen = {
+            (batch_id, subject_id, start, None if decomposed else room_id, fac_id)
+            for batch_id, subject_id, start, room_id, fac_id in blocks
+        }
+        sessions = {}
+        for batch_id, subject_id, start, _, _ in blocks:
+            basket = built['basket_of'].get((batch_id, subject_id))
+            if basket:
+                sessions.setdefault((batch_id, tuple(basket)), set()).add(start)
+        for batch_id, subjects in built['assignments'].items():
+            for subject_id, placements in subjects.items():
+                for (start, room_id, fac_id), var in placements.items():
+                    value = (batch_id, subject_id, start, room_id, fac_id) in chosen
+                    model.AddHint(var, int(value))
+                    if value:
+                        hinted.append(var.Index())
+        for key, session in built['session_vars'].items():
+            starts = sessions.get(key, set())
+            for start, var in session.items():
+                model.AddHint(var, int(start in starts))
+                if start in starts:
+                    hinted.append(var.Index())
+        return sorted(hinted)
+    
+    def _hint_is_feasible(self, model):
+        """
+        Whether the model's complete hint satisfies all its constraints.
+        
+        Checked with every variable fixed to its hint and presolve off:
+        presolve rewrites the model and loses the hint, and the enumerating
+        search only uses it as a preference.
+        """
+        solver = cp_model.CpSolver()
+        solver.parameters.fix_variables_to_their_hinted_value = True
+        solver.parameters.cp_model_presolve = False
+        solver.parameters.num_workers = 1
+        solver.parameters.max_time_in_seconds = 5.0
+        return solver.Solve(model) in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    
+    def _solver_stats(self, solver, status, proto, solve_log, solution_collector):
+        """Summarize a finished CP-SAT solve."""
+        has_objective = proto.HasField('objective')
+        objective = solver.ObjectiveValue() if has_objective else None
+        bound = solver.BestObjectiveBound() if has_objective else None
+        gap = None
+        if has_objective and solution_collector.solution_count:
+            gap = abs(objective - bound) / max(1.0, abs(objective))
+        
+        return {
+            'status': solver.StatusName(status),
+            'presolve_seconds': _presolve_seconds(solve_log),
+            'solve_seconds': solver.WallTime(),
+            'first_solution_seconds': solution_collector.first_solution_seconds,
+            'num_branches': solver.NumBranches(),
+            'num_conflicts': solver.NumConflicts(),
+            'objective_value': objective,
+            'best_objective_bound': bound,
+            'gap': gap,
+            'solutions_found': solution_collector.solution_count
+        }
+    
+    def _basket_of(self):
+        """
+        (batch, subject) -> basket, for electives in baskets of two or more.
+        
+        Electives in a basket share the batch's slot, so the batch is
+        booked once per basket session rather than once per elective.
+        """
+        basket_of = {}
+        for batch_id, baskets in self.elective_baskets.items():
+            for basket in baskets:
+                if len(basket) > 1:
+                    for subject_id in basket:
+                        basket_of[(batch_id, subject_id)] = basket
+        return basket_of
+    
+    def _class_candidates(self):
+        """
+        Where each subject's weekly classes can go, after fixed slots.
+        
+        Returns class_counts, block_lengths and room_kinds keyed by
+        (batch, subject), and candidates mapping (batch, subject) to
+        {start slot: (covered slots, free rooms, free faculty)}. Labs run as
+        contiguous blocks; a start is a candidate only if the batch, a
+        room and a faculty member are free for the whole block.
+        
+        Only complete blocks of fixed slots count as sessions. When fixed
+        periods leave a block partly covered, the periods still missing
+        are a block of their own under (batch, (subject, PARTIAL)).
+        """
+        busy_batches, busy_rooms, busy_faculty = self._fixed_occupancy()
+        fixed_counts = {}
+        for fixed in self.fixed_slots:
+            key = (fixed['batch'], fixed['subject'])
+            fixed_counts[key] = fixed_counts.get(key, 0) + 1
+        
+        class_counts, block_lengths, room_kinds, candidates = {}, {}, {}, {}
         for batch in self.batches:
             batch_id = batch['id']
-            assignments[batch_id] = {}
-            
             for subject in self.subjects:
                 if subject['batch_id'] != batch_id:
                     continue
-                    
-                subject_id = subject['id']
-                classes_needed = subject.get('classes_per_week', 3)
-                assignments[batch_id][subject_id] = []
                 
-                for _ in range(classes_needed):
-                    slot_vars = {}
-                    for slot in range(self.total_slots):
-                        for classroom in self.classrooms:
-                            for fac in self.faculty:
-                                if subject_id in fac.get('subjects', []):
-                                    var = model.NewBoolVar(f'b{batch_id}_s{subject_id}_sl{slot}_c{classroom["id"]}_f{fac["id"]}')
-                                    slot_vars[(slot, classroom['id'], fac['id'])] = var
-                    
-                    assignments[batch_id][subject_id].append(slot_vars)
-        
-        # Constraint 1: Each class assigned exactly once
-        for batch_id in assignments:
-            for subject_id in assignments[batch_id]:
-                for class_vars in assignments[batch_id][subject_id]:
-                    model.Add(sum(class_vars.values()) == 1)
-        
-        # Constraint 2: No faculty double-booking
-        for slot in range(self.total_slots):
-            for fac in self.faculty:
-                fac_id = fac['id']
-                slot_assignments = []
-                for batch_id in assignments:
-                    for subject_id in assignments[batch_id]:
-                        for class_vars in assignments[batch_id][subject_id]:
-                            for (s, c, f), var in class_vars.items():
-                                if s == slot and f == fac_id:
-                                    slot_assignments.append(var)
-                if slot_assignments:
-                    model.Add(sum(slot_assignments) <= 1)
-        
-        # Constraint 3: No classroom double-booking
-        for slot in range(self.total_slots):
-            for classroom in self.classrooms:
-                c_id = classroom['id']
-                room_assignments = []
-                for batch_id in assignments:
-                    for subject_id in assignments[batch_id]:
-                        for class_vars in assignments[batch_id][subject_id]:
-                            for (s, c, f), var in class_vars.items():
-                                if s == slot and c == c_id:
-                                    room_assignments.append(var)
-                if room_assignments:
-                    model.Add(sum(room_assignments) <= 1)
-        
-        # Constraint 4: No batch double-booking
-        for slot in range(self.total_slots):
-            for batch_id in assignments:
-                batch_assignments = []
-                for subject_id in assignments[batch_id]:
-                    for class_vars in assignments[batch_id][subject_id]:
-                        for (s, c, f), var in class_vars.items():
-                            if s == slot:
-                                batch_assignments.append(var)
-                if batch_assignments:
-                    model.Add(sum(batch_assignments) <= 1)
+                key = (batch_id, subject['id'])
+                length = self._block_length(subject)
+                fixed_periods = fixed_counts.get(key, 0)
+                count = max(subject.get('classes_per_week', 3) - fixed_periods // length, 0)
+                blocks = [(key, length, count)]
+                if fixed_periods % length and count:
+                    blocks = [(key, length, count - 1),
+                              ((batch_id, (subject['id'], PARTIAL)), length - fixed_periods % length, 1)]
+                
+                for key, length, count in blocks:
+                    block_lengths[key] = length
+                    room_kinds[key] = self._room_kind(batch, subject)
+                    class_counts[key] = count
+                    candidates[key] = self._start_options(
+                        batch, subject, length, busy_batches, busy_rooms, busy_faculty
+                    ) if count else {}
+        return class_counts, block_lengths, room_kinds, candidates
+    
+    def _start_options(self, batch, subject, length, busy_batches, busy_rooms, busy_faculty):
+        """{start slot: (covered slots, free rooms, free faculty)} for a block of the subject."""
+        batch_id = batch['id']
+        options = {}
+        qualified = self.qualified_faculty.get(subject['id'], [])
+        rooms = self._suitable_rooms(batch, subject)
+        for start in self._block_starts(length):
+            covered = range(start, start + length)
+            if any((slot, batch_id) in busy_batches for slot in covered):
+                continue
+            free_rooms = [
+                room for room in rooms
+                if not any((slot, room['id']) in busy_rooms for slot in covered)
+            ]
+            free_faculty = [
+                fac for fac in qualified
+                if all(self._is_available(fac, slot) and (slot, fac['id']) not in busy_faculty
+                       for slot in covered)
+            ]
+            if free_rooms and free_faculty:
+                options[start] = (covered, free_rooms, free_faculty)
+        return options
+    
+    def _block_length(self, subject):
+        """Consecutive periods per session: labs default to lab_block_length, others to 1."""
+        if 'block_length' in subject:
+            return max(1, min(subject['block_length'], self.slots_per_day))
+        if subject.get('requires_lab') or subject.get('type') == 'lab':
+            return max(1, min(self.constraints.get('lab_block_length', 2), self.slots_per_day))
+        return 1
+    
+    def _block_starts(self, length):
+        """
+        Grid slots where a block of ``length`` periods can start.
         
-        # Solve
-        solver = cp_model.CpSolver()
-        solution_collector = SolutionCollector(assignments, num_solutions)
-        solver.parameters.enumerate_all_solutions = True
-        solver.parameters.max_time_in_seconds = 30.0
+        A block stays within one day and does not cross the lunch break,
+        which falls before period ``lunch_after_slot`` of each day.
+        """
+        lunch = self.constraints.get('lunch_after_slot', self.slots_per_day // 2)
+        starts = []
+        for day in range(self.days):
+            for period in range(self.slots_per_day - length + 1):
+                if period < lunch < period + length:
+                    continue
+                starts.append(day * self.slots_per_day + period)
+        return starts
+    
+    def _room_kind(self, batch, subject):
+        """(needs a lab, student count): all that decides which rooms fit a class."""
+        needs_lab = bool(subject.get('requires_lab') or subject.get('type') == 'lab')
+        return needs_lab, batch.get('student_count')
+    
+    def _room_fits(self, room, needs_lab, student_count):
+        return (
+            (not needs_lab or room.get('type') == 'lab')
+            and (self.relaxed or student_count is None or room.get('capacity') is None
+                 or room['capacity'] >= student_count)
+        )
+    
+    def _suitable_rooms(self, batch, subject):
+        """Rooms that fit the batch; lab subjects need a lab."""
+        kind = self._room_kind(batch, subject)
+        return [room for room in self.classrooms if self._room_fits(room, *kind)]
+    
+    def _limit_room_demand(self, model, room_demand, busy_rooms):
+        """
+        Keep the classes of each slot within the rooms that can hold them.
         
-        status = solver.Solve(model, solution_collector)
+        Stands in for room variables in the decomposed engine. The rooms
+        fitting non-lab classes are nested by capacity, and so are those
+        fitting lab classes, so any union of them is one non-lab set plus
+        one lab set. Capping the classes whose rooms all lie in each such
+        union at its size is Hall's condition: the classes of the slot can
+        then be matched to distinct rooms.
+        """
+        for slot, demand in room_demand.items():
+            free = [room for room in self.classrooms if (slot, room['id']) not in busy_rooms]
+            vars_of_kind = {}
+            for kind, var in demand:
+                vars_of_kind.setdefault(kind, []).append(var)
+            fitting = {
+                kind: frozenset(room['id'] for room in free if self._room_fits(room, *kind))
+                for kind in vars_of_kind
+            }
+            general = {rooms for kind, rooms in fitting.items() if not kind[0]} | {frozenset()}
+            labs = {rooms for kind, rooms in fitting.items() if kind[0]} | {frozenset()}
+            for union in {a | b for a in general for b in labs}:
+                within = [var for kind, kind_vars in vars_of_kind.items() if fitting[kind] <= union
+                          for var in kind_vars]
+                if len(within) > len(union):
+                    model.Add(cp_model.LinearExpr.Sum(within) <= len(union))
+    
+    def _assign_rooms(self, blocks, block_lengths, room_kinds, busy_rooms):
+        """
+        Give each class placed by the decomposed engine a room.
         
-        if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
-            return solution_collector.solutions
+        ``blocks`` are (batch, subject, start, None, faculty) tuples. Blocks
+        are taken in start order; those starting together are matched to
+        the rooms free for their whole length at the least total cost in
+        empty seats, and a room stays taken until its block ends. Returns
+        the blocks with rooms filled in, or None when a start cannot be
+        matched, which the per-slot limits rule out for single periods but
+        not for every mix of overlapping blocks.
+        """
+        by_start = {}
+        for block in blocks:
+            by_start.setdefault(block[2], []).append(block)
         
-        return []
+        taken_until = {}
+        assigned = []
+        for start in sorted(by_start):
+            starting = by_start[start]
+            options = []
+            for batch_id, subject_id, _, _, _ in starting:
+                covered = range(start, start + block_lengths.get((batch_id, subject_id), 1))
+                needs_lab, student_count = room_kinds[(batch_id, subject_id)]
+                options.append([
+                    (room['id'], self._room_cost(room, needs_lab, student_count))
+                    for room in self.classrooms
+                    if taken_until.get(room['id'], -1) < start
+                    and self._room_fits(room, needs_lab, student_count)
+                    and not any((slot, room['id']) in busy_rooms for slot in covered)
+                ])
+            
+            rooms = _min_cost_matching(options)
+            if rooms is None:
+                return None
+            for (batch_id, subject_id, _, _, faculty_id), room_id in zip(starting, rooms):
+                taken_until[room_id] = start + block_lengths.get((batch_id, subject_id), 1) - 1
+                assigned.append((batch_id, subject_id, start, room_id, faculty_id))
+        return assigned
     
-    def check_conflicts(self):
-        return []
+    def _room_cost(self, room, needs_lab, student_count):
+        """
+        Empty seats left by a class in a room, plus LAB_MISUSE_COST for a non-lab class in a lab.
+        
+        A room too small (relaxed model only) costs OVERFLOW_WEIGHT per missing seat.
+        """
+        waste = 0
+        if student_count is not None and room.get('capacity') is not None:
+            waste = room['capacity'] - student_count
+            if waste < 0:
+                waste *= -OVERFLOW_WEIGHT
+        if not needs_lab and room.get('type') == 'lab':
+            waste += LAB_MISUSE_COST
+        return waste
+    
+    def _link_elective_baskets(self, model, assignments, class_counts, basket_of, batch_usage, block_lengths):
+        """
+        Schedule each basket's sessions as shared blocks.
+        
+        The basket picks as many session slots as its largest member needs;
+        every member elective is placed only in those slots, each in its
+        own room with its own faculty. Only the session slots count toward
+        batch double-booking. Returns the session variables, keyed by
+        (batch, basket) and then start slot.
+        """
+        session_vars = {}
+        linked = set()
+        for (batch_id, _), basket in basket_of.items():
+            key = (batch_id, tuple(basket))
+            if key in linked:
+                continue
+            linked.add(key)
+            
+            members = [sid for sid in basket if sid in assignments.get(batch_id, {})]
+            sessions = max((class_counts.get((batch_id, sid), 0) for sid in members), default=0)
+            if not sessions:
+                continue
+            length = max(block_lengths.get((batch_id, sid), 1) for sid in basket)
+            slots = sorted({key[0] for sid in members for key in assignments[batch_id][sid]})
+            session = {
+                slot: model.NewBoolVar(f'b{batch_id}_basket{basket[0]}_sl{slot}')
+                for slot in slots
+            }
+            session_vars[key] = session
+            if self.relaxed:
+                # Members may miss classes, so sessions may go unused too
+                model.Add(cp_model.LinearExpr.Sum(list(session.values())) <= sessions)
+            else:
+                model.Add(cp_model.LinearExpr.Sum(list(session.values())) == sessions)
+            for start, var in session.items():
+                for slot in range(start, start + length):
+                    batch_usage.setdefault((slot, batch_id), []).append(var)
+            
+            for sid in members:
+                by_slot = {}
+                for (start, _, _), var in assignments[batch_id][sid].items():
+                    by_slot.setdefault(start, []).append(var)
+                # Members with a class in every session must be in each chosen slot
+                attends_all = class_counts.get((batch_id, sid), 0) == sessions and not self.relaxed
+                for start, var in session.items():
+                    placed = cp_model.LinearExpr.Sum(by_slot.get(start, []))
+                    if attends_all:
+                        model.Add(placed == var)
+                    else:
+                        model.Add(placed <= var)
+        return session_vars
+    
+    def _fixed_occupancy(self):
+        """(slot, batch), (slot, classroom) and (slot, faculty) pairs taken by fixed slots and occupied classes."""
+        busy_batches = {(f['slot'], f['batch']) for f in self.fixed_slots}
+        busy_rooms = {(f['slot'], f['classroom']) for f in self.fixed_slots + self.occupied}
+        busy_faculty = {(f['slot'], f['faculty']) for f in self.fixed_slots + self.occupied}
+        return busy_batches, busy_rooms, busy_faculty
+    
+    def _taken_hours(self):
+        """faculty_id -> periods already taught in fixed slots and occupied classes."""
+        hours = {}
+        for f in self.fixed_slots + self.occupied:
+            hours[f['faculty']] = hours.get(f['faculty'], 0) + 1
+        return hours
+    
+    def _fixed_entries(self):
+        """Schedule entries for fixed slots, added unchanged to every solution."""
+        return [
+            {
+                'batch': f['batch'],
+                'subject': f['subject'],
+                'day': f['slot'] // self.slots_per_day,
+                'slot': f['slot'] % self.slots_per_day,
+                'classroom': f['classroom'],
+                'faculty': f['faculty'],
+                'is_fixed': True
+            }
+            for f in self.fixed_slots
+        ]
+    
+    def _is_available(self, fac, slot):
+        """Whether a faculty member may teach in a slot (bit set in availability_mask)."""
+        mask = fac.get('availability_mask')
+        return mask is None or bool((mask >> slot) & 1)
+    
+    def check_conflicts(self, schedules=None):
+        """
+        Find double bookings in generated schedules.
+        
+        A faculty member, classroom or batch used twice in the same period is
+        a conflict, except a batch attending electives of one basket in
+        parallel; occupied classes count as bookings. Returns one dict per
+        clash, with the index of the schedule it was found in.
+        """
+        basket_number = {}
+        for batch_id, baskets in self.elective_baskets.items():
+            for number, basket in enumerate(baskets):
+                for subject_id in basket:
+                    basket_number[(batch_id, subject_id)] = number
+        
+        conflicts = []
+        for option, entries in enumerate(schedules or []):
+            bookings = {}
+            # One group, so only clashes with this schedule are reported
+            for f in self.occupied:
+                period = divmod(f['slot'], self.slots_per_day)
+                bookings.setdefault(('faculty', f['faculty'], period), []).append('occupied')
+                bookings.setdefault(('classroom', f['classroom'], period), []).append('occupied')
+            for index, entry in enumerate(entries):
+                period = (entry['day'], entry['slot'])
+                bookings.setdefault(('faculty', entry['faculty'], period), []).append(index)
+                bookings.setdefault(('classroom', entry['classroom'], period), []).append(index)
+                # Electives of one basket share a group; every other class is its own
+                group = basket_number.get((entry['batch'], entry['subject']), ('class', index))
+                bookings.setdefault(('batch', entry['batch'], period), []).append(group)
+            
+            for (kind, resource_id, (day, slot)), used_by in bookings.items():
+                if len(set(used_by)) > 1:
+                    conflicts.append({
+                        'option': option,
+                        'type': kind,
+                        'id': resource_id,
+                        'day': day,
+                        'slot': slot,
+                        'count': len(used_by)
+                    })
+        return conflicts
     
     def get_suggestions(self):
         return [
@@ -113,33 +1322,141 @@ class TimetableScheduler:
             "Increase available time slots"
         ]
 
+_LOG_TIME = re.compile(r'^Starting (presolve|to load the model|search|sequential search) at ([0-9.]+)s')
+
+def _presolve_seconds(solve_log):
+    """Time between the start of presolve and the start of loading/search in a CP-SAT log."""
+    presolve_started = None
+    for line in solve_log:
+        match = _LOG_TIME.match(line)
+        if not match:
+            continue
+        if match.group(1) == 'presolve':
+            presolve_started = float(match.group(2))
+        elif presolve_started is not None:
+            return float(match.group(2)) - presolve_started
+    return None
+
+def _subject_id(subject_key):
+    """The subject id of a class key's subject, which is (subject_id, PARTIAL) for partial blocks."""
+    return subject_key[0] if isinstance(subject_key, tuple) else subject_key
+
+def _block_entries(blocks, block_lengths, slots_per_day):
+    """Schedule entries for (batch, subject, start, classroom, faculty) blocks, one per period covered."""
+    entries = []
+    for batch_id, subject_id, start, classroom, faculty in blocks:
+        for slot in range(start, start + block_lengths.get((batch_id, subject_id), 1)):
+            entries.append({
+                'batch': batch_id,
+                'subject': _subject_id(subject_id),
+                'day': slot // slots_per_day,
+                'slot': slot % slots_per_day,
+                'classroom': classroom,
+                'faculty': faculty
+            })
+    return entries
+
+def _min_cost_matching(options):
+    """
+    Match every row of ``options`` to a distinct room at the least total cost.
+    
+    Each row lists the (room id, cost) pairs it may take. Solved as a
+    min-cost flow from the rows through the rooms to a sink; returns one
+    room id per row, or None if no matching covers every row.
+    """
+    if any(not choices for choices in options):
+        return None
+    room_ids = sorted({room_id for choices in options for room_id, _ in choices})
+    room_node = {room_id: len(options) + i for i, room_id in enumerate(room_ids)}
+    sink = len(options) + len(room_ids)
+    
+    flow = min_cost_flow.SimpleMinCostFlow()
+    arcs = []
+    for row, choices in enumerate(options):
+        flow.set_node_supply(row, 1)
+        for room_id, cost in choices:
+            arcs.append((row, room_id, flow.add_arc_with_capacity_and_unit_cost(row, room_node[room_id], 1, cost)))
+    for node in room_node.values():
+        flow.add_arc_with_capacity_and_unit_cost(node, sink, 1, 0)
+    flow.set_node_supply(sink, -len(options))
+    
+    if flow.solve() != flow.OPTIMAL:
+        return None
+    matched = [None] * len(options)
+    for row, room_id, arc in arcs:
+        if flow.flow(arc):
+            matched[row] = room_id
+    return matched
+
 class SolutionCollector(cp_model.CpSolverSolutionCallback):
-    def __init__(self, assignments, limit):
+    """
+    Collect up to ``limit`` solutions, then stop the search.
+    
+    Each callback copies the solver's value array in one call and keeps
+    only the indexes of variables set to 1; turning those into schedule
+    entries waits until ``solutions`` is read. ``assign_rooms``, when
+    given, fills in the rooms of the decoded blocks; solutions it cannot
+    place are left out.
+    """
+    def __init__(self, assignments, limit, slots_per_day=8, fixed_entries=None, block_lengths=None,
+                 assign_rooms=None):
         cp_model.CpSolverSolutionCallback.__init__(self)
         self._assignments = assignments
         self._limit = limit
-        self.solutions = []
+        self._slots_per_day = slots_per_day
+        self._fixed_entries = fixed_entries or []
+        self._block_lengths = block_lengths or {}
+        self._assign_rooms = assign_rooms
+        self._raw_solutions = []
+        self._seen = set()
+        self._decoded = []
+        self._decode_table = None
+        self.first_solution_seconds = None
     
     def on_solution_callback(self):
-        if len(self.solutions) >= self._limit:
+        if self.first_solution_seconds is None:
+            self.first_solution_seconds = self.WallTime()
+        
+        values = self.Response().solution
+        if self.add_solution(list(compress(range(len(values)), values))):
             self.StopSearch()
-            return
-        
-        schedule = []
-        for batch_id in self._assignments:
-            for subject_id in self._assignments[batch_id]:
-                for idx, class_vars in enumerate(self._assignments[batch_id][subject_id]):
-                    for (slot, classroom, faculty), var in class_vars.items():
-                        if self.Value(var):
-                            day = slot // 8
-                            time_slot = slot % 8
-                            schedule.append({
-                                'batch': batch_id,
-                                'subject': subject_id,
-                                'day': day,
-                                'slot': time_slot,
-                                'classroom': classroom,
-                                'faculty': faculty
-                            })
-        
-        self.solutions.append(schedule)
+    
+    def add_solution(self, chosen):
+        """Keep a solution given as the indexes of variables set to 1; True once the limit is reached."""
+        if self.first_solution_seconds is None:
+            self.first_solution_seconds = 0.0
+        key = tuple(chosen)
+        if key not in self._seen:
+            self._seen.add(key)
+            self._raw_solutions.append(chosen)
+        return len(self._raw_solutions) >= self._limit
+    
+    @property
+    def solution_count(self):
+        return len(self._raw_solutions)
+    
+    @property
+    def solutions(self):
+        """Schedules found so far, decoded on first access."""
+        while len(self._decoded) < len(self._raw_solutions):
+            self._decoded.append(self._decode(self._raw_solutions[len(self._decoded)]))
+        return [schedule for schedule in self._decoded if schedule is not None]
+    
+    def _decode(self, chosen):
+        if self._decode_table is None:
+            # variable index -> (batch, subject, start slot, classroom, faculty)
+            self._decode_table = {}
+            for batch_id, subjects in self._assignments.items():
+                for subject_id, placements in subjects.items():
+                    for (start, classroom, faculty), var in placements.items():
+                        self._decode_table[var.Index()] = (batch_id, subject_id, start, classroom, faculty)
+        
+        blocks = [self._decode_table[index] for index in chosen if index in self._decode_table]
+        if self._assign_rooms is not None:
+            blocks = self._assign_rooms(blocks)
+            if blocks is None:
+                return None
+        
+        schedule = [dict(entry) for entry in self._fixed_entries]
+        schedule.extend(_block_entries(blocks, self._block_lengths, self._slots_per_day))
+        return schedule
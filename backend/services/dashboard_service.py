@@ -0,0 +1,110 @@
+"""Service for dashboard statistics."""
+import time
+from threading import Lock
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from models import Classroom, Batch, Subject, Faculty, TimetableOption
+
+# Models whose writes change the dashboard numbers
+TRACKED_MODELS = (Classroom, Batch, Subject, Faculty, TimetableOption)
+
+# Safety net for writes made by other worker processes
+CACHE_TTL_SECONDS = 30
+
+# ``generation`` counts invalidations, so stats computed across one are not stored
+_cache = {"stats": None, "expires_at": 0.0, "generation": 0}
+_cache_lock = Lock()
+
+
+def invalidate_stats_cache():
+    """Drop the cached dashboard statistics."""
+    with _cache_lock:
+        _cache["stats"] = None
+        _cache["expires_at"] = 0.0
+        _cache["generation"] += 1
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_stats_dirty(session, flush_context):
+    """Remember that this transaction touched a tracked table."""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, TRACKED_MODELS):
+            session.info["dashboard_stats_dirty"] = True
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_stats_dirty_bulk(orm_execute_state):
+    """Catch bulk ``query(...).update()``/``delete()`` and ``insert()`` statements."""
+    if orm_execute_state.is_select:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and issubclass(mapper.class_, TRACKED_MODELS):
+        orm_execute_state.session.info["dashboard_stats_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    """Clear the cache once tracked changes are visible to other sessions."""
+    if session.info.pop("dashboard_stats_dirty", False):
+        invalidate_stats_cache()
+
+
+@event.listens_for(Session, "after_rollback")
+def _reset_after_rollback(session):
+    session.info.pop("dashboard_stats_dirty", None)
+
+
+class DashboardService:
+    """Service for computing and caching dashboard statistics."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_stats(self) -> dict:
+        """Get dashboard statistics, served from cache when fresh."""
+        now = time.monotonic()
+        with _cache_lock:
+            if _cache["stats"] is not None and now < _cache["expires_at"]:
+                return dict(_cache["stats"])
+            generation = _cache["generation"]
+
+        stats = self._compute_stats()
+        with _cache_lock:
+            # A write committed while computing may not be in these numbers
+            if _cache["generation"] == generation:
+                _cache["stats"] = stats
+                _cache["expires_at"] = now + CACHE_TTL_SECONDS
+        return dict(stats)
+
+    def _compute_stats(self) -> dict:
+        """Compute all statistics in a single round trip."""
+        def count_of(model, *criteria):
+            return select(func.count(model.id)).where(*criteria).scalar_subquery()
+
+        active = select(TimetableOption).where(
+            TimetableOption.status == "active"
+        ).order_by(TimetableOption.id).limit(1)
+
+        row = self.db.execute(
+            select(
+                count_of(Classroom).label("classrooms"),
+                count_of(Batch).label("batches"),
+                count_of(Subject).label("subjects"),
+                count_of(Faculty).label("faculty"),
+                count_of(TimetableOption, TimetableOption.status == "draft").label("pending"),
+                active.with_only_columns(TimetableOption.name).scalar_subquery().label("active_name"),
+                active.with_only_columns(TimetableOption.utilization_rate).scalar_subquery().label("active_utilization"),
+            )
+        ).one()
+
+        return {
+            "activeTimetable": row.active_name,
+            "pendingApprovals": row.pending,
+            "totalClassrooms": row.classrooms,
+            "totalFaculty": row.faculty,
+            "totalBatches": row.batches,
+            "totalSubjects": row.subjects,
+            "utilizationRate": row.active_utilization if row.active_name else 0
+        }
@@ -1,7 +1,14 @@
 """Services for managing input data entities."""
-from sqlalchemy.orm import Session
-from models import Classroom, Batch, Subject, Faculty, SchedulingConstraints, TimetableOption, TimetableEntry, ApprovalRecord
-from typing import List, Optional
+from sqlalchemy import select, delete, insert, exists, or_
+from sqlalchemy.orm import Session, selectinload
+from models import (
+    Classroom, Batch, Subject, Faculty, FacultySubject, FacultyAvailability, FacultyLeave,
+    TimeSlot, FixedSlot, ElectivePreference, SchedulingConstraints, TimetableOption, TimetableEntry, ApprovalRecord
+)
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 
 class ClassroomService:
     """Service for classroom CRUD operations."""
@@ -172,18 +179,23 @@ class FacultyService:
         self.db = db
     
     def create(self, name: str, employee_id: str, department: str, email: str,
-               max_hours_per_week: int = 20, availability: dict = None, leaves: dict = None) -> Faculty:
-        """Create a new faculty member."""
+               max_hours_per_week: int = 20, availability: dict = None, leaves: List[dict] = None) -> Faculty:
+        """
+        Create a new faculty member.
+        
+        ``availability`` ({"unavailable_time_slot_ids": [...]}) and ``leaves``
+        (leave dicts) are stored in faculty_availability and faculty_leaves.
+        """
         faculty = Faculty(
             name=name,
             employee_id=employee_id,
             department=department,
             email=email,
-            max_hours_per_week=max_hours_per_week,
-            availability=availability,
-            leaves=leaves
+            max_hours_per_week=max_hours_per_week
         )
         self.db.add(faculty)
+        self.db.flush()
+        self._write_availability(faculty.id, availability, leaves)
         self.db.commit()
         self.db.refresh(faculty)
         return faculty
@@ -192,9 +204,12 @@ class FacultyService:
         """Get faculty by ID."""
         return self.db.query(Faculty).filter(Faculty.id == faculty_id).first()
     
-    def get_all(self) -> List[Faculty]:
-        """Get all faculty."""
-        return self.db.query(Faculty).all()
+    def get_all(self, with_availability: bool = False) -> List[Faculty]:
+        """Get all faculty, optionally loading availability and leave in two more queries."""
+        query = self.db.query(Faculty)
+        if with_availability:
+            query = query.options(selectinload(Faculty.availability_slots), selectinload(Faculty.leave_records))
+        return query.all()
     
     def update(self, faculty_id: int, **kwargs) -> Optional[Faculty]:
         """Update faculty."""
@@ -202,6 +217,7 @@ class FacultyService:
         if not faculty:
             return None
         
+        self._write_availability(faculty_id, kwargs.pop("availability", None), kwargs.pop("leaves", None))
         for key, value in kwargs.items():
             if hasattr(faculty, key):
                 setattr(faculty, key, value)
@@ -210,6 +226,14 @@ class FacultyService:
         self.db.refresh(faculty)
         return faculty
     
+    def _write_availability(self, faculty_id: int, availability: Optional[dict], leaves: Optional[List[dict]]):
+        """Replace weekly unavailable slots and/or leave records given in the legacy payload shape."""
+        service = AvailabilityService(self.db)
+        if availability is not None:
+            service.replace_unavailable_slots(faculty_id, availability.get("unavailable_time_slot_ids", []))
+        if leaves is not None:
+            service.replace_leaves(faculty_id, leaves)
+    
     def delete(self, faculty_id: int) -> bool:
         """Delete faculty."""
         faculty = self.get_by_id(faculty_id)
@@ -221,18 +245,369 @@ class FacultyService:
         return True
     
     def update_availability(self, faculty_id: int, availability: dict) -> Optional[Faculty]:
-        """Update faculty availability."""
+        """Update faculty availability ({"unavailable_time_slot_ids": [...]})."""
         return self.update(faculty_id, availability=availability)
     
-    def add_leave(self, faculty_id: int, leave_data: dict) -> Optional[Faculty]:
+    def add_leave(self, faculty_id: int, leave_data: dict) -> Optional[FacultyLeave]:
         """Add leave for faculty."""
-        faculty = self.get_by_id(faculty_id)
-        if not faculty:
+        if not self.get_by_id(faculty_id):
             return None
         
-        leaves = faculty.leaves or []
-        leaves.append(leave_data)
-        return self.update(faculty_id, leaves=leaves)
+        return AvailabilityService(self.db).add_leave(faculty_id, **leave_data)
+
+
+class QualificationService:
+    """Service for the faculty-subject qualification table."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_subjects_for_faculty(self, faculty_id: int) -> List[Subject]:
+        """Get subjects a faculty member is qualified to teach."""
+        return self.db.query(Subject).join(
+            FacultySubject, FacultySubject.subject_id == Subject.id
+        ).filter(FacultySubject.faculty_id == faculty_id).order_by(Subject.id).all()
+    
+    def get_faculty_for_subject(self, subject_id: int) -> List[Faculty]:
+        """Get faculty qualified to teach a subject."""
+        return self.db.query(Faculty).join(
+            FacultySubject, FacultySubject.faculty_id == Faculty.id
+        ).filter(FacultySubject.subject_id == subject_id).order_by(Faculty.id).all()
+    
+    def add(self, faculty_id: int, subject_id: int) -> bool:
+        """Add a qualification. Returns False if it already exists."""
+        exists = self.db.get(FacultySubject, (faculty_id, subject_id))
+        if exists:
+            return False
+        
+        self.db.add(FacultySubject(faculty_id=faculty_id, subject_id=subject_id))
+        self.db.commit()
+        return True
+    
+    def remove(self, faculty_id: int, subject_id: int) -> bool:
+        """Remove a qualification."""
+        result = self.db.execute(
+            delete(FacultySubject).where(
+                FacultySubject.faculty_id == faculty_id,
+                FacultySubject.subject_id == subject_id
+            )
+        )
+        self.db.commit()
+        return result.rowcount > 0
+    
+    def set_for_faculty(self, faculty_id: int, subject_ids: List[int]) -> List[int]:
+        """Replace all qualifications of a faculty member."""
+        subject_ids = sorted(set(subject_ids))
+        self.db.execute(delete(FacultySubject).where(FacultySubject.faculty_id == faculty_id))
+        if subject_ids:
+            self.db.execute(
+                insert(FacultySubject),
+                [{"faculty_id": faculty_id, "subject_id": sid} for sid in subject_ids]
+            )
+        self.db.commit()
+        return subject_ids
+    
+    def bulk_add(self, pairs: List[Tuple[int, int]]) -> dict:
+        """
+        Add many (faculty_id, subject_id) qualifications in one transaction.
+        
+        Pairs that already exist or reference unknown faculty/subjects are
+        skipped and reported.
+        """
+        pairs = list(dict.fromkeys(pairs))
+        if not pairs:
+            return {"created": 0, "skipped": []}
+        
+        faculty_ids = {f for f, _ in pairs}
+        subject_ids = {s for _, s in pairs}
+        known_faculty = set(self.db.scalars(select(Faculty.id).where(Faculty.id.in_(faculty_ids))))
+        known_subjects = set(self.db.scalars(select(Subject.id).where(Subject.id.in_(subject_ids))))
+        existing = set(
+            self.db.execute(
+                select(FacultySubject.faculty_id, FacultySubject.subject_id).where(
+                    FacultySubject.faculty_id.in_(faculty_ids)
+                )
+            ).tuples()
+        )
+        
+        to_insert = []
+        skipped = []
+        for faculty_id, subject_id in pairs:
+            if faculty_id not in known_faculty:
+                skipped.append({"faculty_id": faculty_id, "subject_id": subject_id, "reason": "Faculty not found"})
+            elif subject_id not in known_subjects:
+                skipped.append({"faculty_id": faculty_id, "subject_id": subject_id, "reason": "Subject not found"})
+            elif (faculty_id, subject_id) in existing:
+                skipped.append({"faculty_id": faculty_id, "subject_id": subject_id, "reason": "Already exists"})
+            else:
+                to_insert.append({"faculty_id": faculty_id, "subject_id": subject_id})
+        
+        if to_insert:
+            self.db.execute(insert(FacultySubject), to_insert)
+        self.db.commit()
+        return {"created": len(to_insert), "skipped": skipped}
+    
+    def get_qualification_map(self, faculty_ids: Optional[List[int]] = None) -> Dict[int, List[int]]:
+        """Map faculty_id -> qualified subject ids, read in one query."""
+        stmt = select(FacultySubject.faculty_id, FacultySubject.subject_id).order_by(
+            FacultySubject.faculty_id, FacultySubject.subject_id
+        )
+        if faculty_ids is not None:
+            stmt = stmt.where(FacultySubject.faculty_id.in_(faculty_ids))
+        
+        qualifications = {}
+        for faculty_id, subject_id in self.db.execute(stmt):
+            qualifications.setdefault(faculty_id, []).append(subject_id)
+        return qualifications
+
+
+class AvailabilityService:
+    """Service for faculty weekly availability and dated leave."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_unavailable_slots(self, faculty_id: int) -> List[int]:
+        """Get time slot ids in which a faculty member cannot teach."""
+        return list(self.db.scalars(
+            select(FacultyAvailability.time_slot_id)
+            .where(FacultyAvailability.faculty_id == faculty_id)
+            .order_by(FacultyAvailability.time_slot_id)
+        ))
+    
+    def get_unknown_time_slots(self, time_slot_ids: List[int]) -> List[int]:
+        """Get the given time slot ids that do not exist."""
+        known = set(self.db.scalars(select(TimeSlot.id).where(TimeSlot.id.in_(time_slot_ids))))
+        return sorted(set(time_slot_ids) - known)
+    
+    def set_unavailable_slots(self, faculty_id: int, time_slot_ids: List[int]) -> int:
+        """
+        Replace a faculty member's weekly unavailable slots.
+        
+        Returns:
+            The recomputed unavailable slot bitmask
+        """
+        mask = self.replace_unavailable_slots(faculty_id, time_slot_ids)
+        self.db.commit()
+        return mask
+    
+    def replace_unavailable_slots(self, faculty_id: int, time_slot_ids: List[int]) -> int:
+        """
+        Replace weekly unavailable slots and the stored ``Faculty.unavailable_mask``
+        without committing.
+        
+        Returns:
+            The recomputed unavailable slot bitmask
+        """
+        time_slot_ids = sorted(set(time_slot_ids))
+        self.db.execute(delete(FacultyAvailability).where(FacultyAvailability.faculty_id == faculty_id))
+        if time_slot_ids:
+            self.db.execute(
+                insert(FacultyAvailability),
+                [{"faculty_id": faculty_id, "time_slot_id": tid} for tid in time_slot_ids]
+            )
+        
+        mask = 0
+        for slot_number in self.db.scalars(select(TimeSlot.slot_number).where(TimeSlot.id.in_(time_slot_ids))):
+            mask |= 1 << slot_number
+        self.db.query(Faculty).filter(Faculty.id == faculty_id).update({"unavailable_mask": mask})
+        return mask
+    
+    def replace_leaves(self, faculty_id: int, leaves: List[dict]):
+        """Replace all leave records of a faculty member without committing."""
+        self.db.execute(delete(FacultyLeave).where(FacultyLeave.faculty_id == faculty_id))
+        if leaves:
+            self.db.execute(insert(FacultyLeave), [
+                {"faculty_id": faculty_id, "start_date": leave["start_date"], "end_date": leave["end_date"],
+                 "time_slot_id": leave.get("time_slot_id"), "reason": leave.get("reason")}
+                for leave in leaves
+            ])
+    
+    def get_leaves(self, faculty_id: int) -> List[FacultyLeave]:
+        """Get all leave records of a faculty member."""
+        return self.db.query(FacultyLeave).filter(
+            FacultyLeave.faculty_id == faculty_id
+        ).order_by(FacultyLeave.start_date).all()
+    
+    def add_leave(self, faculty_id: int, start_date: date, end_date: date,
+                  time_slot_id: int = None, reason: str = None) -> FacultyLeave:
+        """Add a leave record; without a time slot it covers whole days."""
+        leave = FacultyLeave(
+            faculty_id=faculty_id,
+            start_date=start_date,
+            end_date=end_date,
+            time_slot_id=time_slot_id,
+            reason=reason
+        )
+        self.db.add(leave)
+        self.db.commit()
+        self.db.refresh(leave)
+        return leave
+    
+    def delete_leave(self, faculty_id: int, leave_id: int) -> bool:
+        """Delete a leave record."""
+        result = self.db.execute(
+            delete(FacultyLeave).where(FacultyLeave.id == leave_id, FacultyLeave.faculty_id == faculty_id)
+        )
+        self.db.commit()
+        return result.rowcount > 0
+    
+    def get_free_faculty(self, time_slot_id: int, on_date: Optional[date] = None) -> List[Faculty]:
+        """Get faculty free in a weekly slot, and not on leave on ``on_date`` if given."""
+        blocked = exists().where(
+            FacultyAvailability.faculty_id == Faculty.id,
+            FacultyAvailability.time_slot_id == time_slot_id
+        )
+        query = self.db.query(Faculty).filter(~blocked)
+        
+        if on_date is not None:
+            on_leave = exists().where(
+                FacultyLeave.faculty_id == Faculty.id,
+                FacultyLeave.start_date <= on_date,
+                FacultyLeave.end_date >= on_date,
+                or_(FacultyLeave.time_slot_id.is_(None), FacultyLeave.time_slot_id == time_slot_id)
+            )
+            query = query.filter(~on_leave)
+        
+        return query.order_by(Faculty.id).all()
+    
+    def get_unavailable_masks(self, faculty_ids: List[int], week_start: Optional[date] = None) -> Dict[int, int]:
+        """
+        Map faculty_id -> unavailable slot bitmask for scheduling.
+        
+        Combines the precomputed weekly mask with leave overlapping the week
+        starting at ``week_start``. Bit n corresponds to slot_number n.
+        """
+        masks = dict(self.db.execute(
+            select(Faculty.id, Faculty.unavailable_mask).where(Faculty.id.in_(faculty_ids))
+        ).all())
+        if week_start is None:
+            return masks
+        
+        week_end = week_start + timedelta(days=6)
+        leaves = self.db.execute(
+            select(FacultyLeave.faculty_id, FacultyLeave.start_date, FacultyLeave.end_date, FacultyLeave.time_slot_id)
+            .where(
+                FacultyLeave.faculty_id.in_(faculty_ids),
+                FacultyLeave.start_date <= week_end,
+                FacultyLeave.end_date >= week_start
+            )
+        ).all()
+        if not leaves:
+            return masks
+        
+        day_slots = {}
+        slot_info = {}
+        for slot_id, day, slot_number in self.db.execute(select(TimeSlot.id, TimeSlot.day, TimeSlot.slot_number)):
+            day_slots.setdefault(day, []).append(slot_number)
+            slot_info[slot_id] = (day, slot_number)
+        
+        for faculty_id, start, end, time_slot_id in leaves:
+            current = max(start, week_start)
+            while current <= min(end, week_end):
+                day = WEEKDAYS[current.weekday()]
+                if time_slot_id is None:
+                    slot_numbers = day_slots.get(day, [])
+                elif slot_info.get(time_slot_id, (None,))[0] == day:
+                    slot_numbers = [slot_info[time_slot_id][1]]
+                else:
+                    slot_numbers = []
+                for slot_number in slot_numbers:
+                    masks[faculty_id] = (masks.get(faculty_id) or 0) | (1 << slot_number)
+                current += timedelta(days=1)
+        
+        return masks
+
+
+class FixedSlotService:
+    """Service for classes pinned to a slot by an admin."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def create(self, subject_id: int, faculty_id: int, batch_id: int, classroom_id: int,
+               time_slot_id: int, reason: str = None) -> FixedSlot:
+        """Pin a class to a time slot and classroom."""
+        fixed_slot = FixedSlot(
+            subject_id=subject_id,
+            faculty_id=faculty_id,
+            batch_id=batch_id,
+            classroom_id=classroom_id,
+            time_slot_id=time_slot_id,
+            reason=reason
+        )
+        self.db.add(fixed_slot)
+        self.db.commit()
+        self.db.refresh(fixed_slot)
+        return fixed_slot
+    
+    def get_all(self) -> List[FixedSlot]:
+        """Get all fixed slots."""
+        return self.db.query(FixedSlot).order_by(FixedSlot.id).all()
+    
+    def delete(self, fixed_slot_id: int) -> bool:
+        """Delete a fixed slot."""
+        result = self.db.execute(delete(FixedSlot).where(FixedSlot.id == fixed_slot_id))
+        self.db.commit()
+        return result.rowcount > 0
+    
+    def find_clash(self, batch_id: int, faculty_id: int, classroom_id: int, time_slot_id: int) -> Optional[FixedSlot]:
+        """Find a fixed slot already using the batch, faculty or classroom in a time slot."""
+        return self.db.query(FixedSlot).filter(
+            FixedSlot.time_slot_id == time_slot_id,
+            or_(
+                FixedSlot.batch_id == batch_id,
+                FixedSlot.faculty_id == faculty_id,
+                FixedSlot.classroom_id == classroom_id
+            )
+        ).first()
+    
+    def get_for_batches(self, batch_ids: List[int]) -> List[dict]:
+        """Fixed slots of the given batches as scheduler input, with slot_number as the grid slot."""
+        rows = self.db.execute(
+            select(
+                FixedSlot.batch_id, FixedSlot.subject_id, FixedSlot.faculty_id,
+                FixedSlot.classroom_id, TimeSlot.slot_number
+            )
+            .join(TimeSlot, TimeSlot.id == FixedSlot.time_slot_id)
+            .where(FixedSlot.batch_id.in_(batch_ids))
+            .order_by(FixedSlot.id)
+        )
+        return [
+            {"batch": batch_id, "subject": subject_id, "faculty": faculty_id,
+             "classroom": classroom_id, "slot": slot_number}
+            for batch_id, subject_id, faculty_id, classroom_id, slot_number in rows
+        ]
+
+
+class ElectivePreferenceService:
+    """Service for student elective preferences."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_for_batch(self, batch_id: int) -> List[ElectivePreference]:
+        """Get all preferences of a batch."""
+        return self.db.query(ElectivePreference).filter(
+            ElectivePreference.batch_id == batch_id
+        ).order_by(ElectivePreference.student_id, ElectivePreference.priority).all()
+    
+    def delete_for_batch(self, batch_id: int) -> int:
+        """Delete all preferences of a batch. Returns the number removed."""
+        result = self.db.execute(delete(ElectivePreference).where(ElectivePreference.batch_id == batch_id))
+        self.db.commit()
+        return result.rowcount
+    
+    def get_pairs_for_batches(self, batch_ids: List[int]) -> Dict[int, List[Tuple[int, int]]]:
+        """Map batch_id -> (student_id, subject_id) pairs, read in one query."""
+        rows = self.db.execute(
+            select(ElectivePreference.batch_id, ElectivePreference.student_id, ElectivePreference.subject_id)
+            .where(ElectivePreference.batch_id.in_(batch_ids))
+        )
+        pairs = {}
+        for batch_id, student_id, subject_id in rows:
+            pairs.setdefault(batch_id, []).append((student_id, subject_id))
+        return pairs
 
 
 class ConstraintsService:
@@ -322,7 +697,8 @@ class TimetableService:
                 faculty_id=entry.get('faculty'),
                 batch_id=entry.get('batch'),
                 classroom_id=entry.get('classroom'),
-                time_slot_id=time_slot_id
+                time_slot_id=time_slot_id,
+                is_fixed=entry.get('is_fixed', False)
             )
             self.db.add(tt_entry)
         
@@ -337,6 +713,36 @@ class TimetableService:
         """Get timetable by ID."""
         return self.db.query(TimetableOption).filter(TimetableOption.id == timetable_id).first()
     
+    def get_active_occupancy(self, exclude_batch_ids: List[int]) -> List[dict]:
+        """
+        Classes of active timetables as scheduler input, with slot_number as the grid slot.
+
+        Entries of the batches in ``exclude_batch_ids`` are left out: those
+        batches are being scheduled again, so their rooms and faculty are free.
+        """
+        rows = self.db.execute(
+            select(TimetableEntry.classroom_id, TimetableEntry.faculty_id, TimeSlot.slot_number)
+            .join(TimeSlot, TimeSlot.id == TimetableEntry.time_slot_id)
+            .join(TimetableOption, TimetableOption.id == TimetableEntry.timetable_id)
+            .where(TimetableOption.status == "active", TimetableEntry.batch_id.notin_(exclude_batch_ids))
+        )
+        return [
+            {"classroom": classroom_id, "faculty": faculty_id, "slot": slot_number}
+            for classroom_id, faculty_id, slot_number in rows
+        ]
+
+    def archive_overlapping(self, timetable_id: int) -> int:
+        """Archive the other active timetables sharing a batch with this one; returns how many."""
+        batch_ids = select(TimetableEntry.batch_id).where(TimetableEntry.timetable_id == timetable_id)
+        overlapping = select(TimetableEntry.timetable_id).where(TimetableEntry.batch_id.in_(batch_ids))
+        count = self.db.query(TimetableOption).filter(
+            TimetableOption.status == "active",
+            TimetableOption.id != timetable_id,
+            TimetableOption.id.in_(overlapping)
+        ).update({"status": "archived"}, synchronize_session=False)
+        self.db.commit()
+        return count
+
     def approve_timetable(self, timetable_id: int, admin_id: int, comments: str = None) -> bool:
         """Approve a timetable."""
         timetable = self.get_by_id(timetable_id)
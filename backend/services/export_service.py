@@ -0,0 +1,123 @@
+"""Service for streaming timetable exports."""
+import csv
+import io
+import json
+import time
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import TimetableEntry, Subject, Faculty, Batch, Classroom, TimeSlot
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_CHUNK_SIZE = 1000
+
+# After the first row, output is sent every this many rows or seconds,
+# whichever comes first
+EXPORT_FLUSH_ROWS = 100
+EXPORT_FLUSH_SECONDS = 0.5
+
+EXPORT_COLUMNS = [
+    "entry_id", "day", "slot_number", "start_time", "end_time",
+    "batch_id", "batch_name", "subject_id", "subject_code", "subject_name",
+    "faculty_id", "faculty_employee_id", "faculty_name",
+    "classroom_id", "classroom_name", "is_fixed"
+]
+
+
+class ExportService:
+    """Service for exporting timetable entries with constant memory."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def iter_rows(self, timetable_id: int, batch_id: Optional[int] = None,
+                  faculty_id: Optional[int] = None,
+                  classroom_id: Optional[int] = None) -> Iterator[dict]:
+        """
+        Yield flat entry rows for a timetable.
+
+        Rows come from a single joined query streamed with ``yield_per``,
+        so only one chunk is held in memory at a time.
+        """
+        stmt = (
+            select(
+                TimetableEntry.id.label("entry_id"),
+                TimeSlot.day,
+                TimeSlot.slot_number,
+                TimeSlot.start_time,
+                TimeSlot.end_time,
+                Batch.id.label("batch_id"),
+                Batch.name.label("batch_name"),
+                Subject.id.label("subject_id"),
+                Subject.code.label("subject_code"),
+                Subject.name.label("subject_name"),
+                Faculty.id.label("faculty_id"),
+                Faculty.employee_id.label("faculty_employee_id"),
+                Faculty.name.label("faculty_name"),
+                Classroom.id.label("classroom_id"),
+                Classroom.name.label("classroom_name"),
+                TimetableEntry.is_fixed,
+            )
+            .join(TimeSlot, TimeSlot.id == TimetableEntry.time_slot_id)
+            .join(Batch, Batch.id == TimetableEntry.batch_id)
+            .join(Subject, Subject.id == TimetableEntry.subject_id)
+            .join(Faculty, Faculty.id == TimetableEntry.faculty_id)
+            .join(Classroom, Classroom.id == TimetableEntry.classroom_id)
+            .where(TimetableEntry.timetable_id == timetable_id)
+            .order_by(TimeSlot.slot_number, TimetableEntry.id)
+        )
+        if batch_id is not None:
+            stmt = stmt.where(TimetableEntry.batch_id == batch_id)
+        if faculty_id is not None:
+            stmt = stmt.where(TimetableEntry.faculty_id == faculty_id)
+        if classroom_id is not None:
+            stmt = stmt.where(TimetableEntry.classroom_id == classroom_id)
+
+        result = self.db.execute(stmt.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        for row in result:
+            data = row._asdict()
+            data["start_time"] = str(data["start_time"]) if data["start_time"] else None
+            data["end_time"] = str(data["end_time"]) if data["end_time"] else None
+            data["is_fixed"] = bool(data["is_fixed"])
+            yield data
+
+    def stream_ndjson(self, timetable_id: int, **filters) -> Iterator[str]:
+        """Yield newline-delimited JSON, the first row immediately and then in small chunks."""
+        return _flushed(json.dumps(row) + "\n" for row in self.iter_rows(timetable_id, **filters))
+
+    def stream_csv(self, timetable_id: int, **filters) -> Iterator[str]:
+        """Yield the CSV header immediately, then rows in small chunks."""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        yield buffer.getvalue()
+
+        def lines():
+            for row in self.iter_rows(timetable_id, **filters):
+                buffer.seek(0)
+                buffer.truncate(0)
+                writer.writerow(row)
+                yield buffer.getvalue()
+
+        yield from _flushed(lines())
+
+
+def _flushed(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Join lines into chunks: the first line on its own, so a client sees data
+    as soon as the query returns, then every EXPORT_FLUSH_ROWS lines or
+    EXPORT_FLUSH_SECONDS, whichever comes first.
+    """
+    pending = []
+    flushed_at = None
+    for line in lines:
+        pending.append(line)
+        now = time.perf_counter()
+        if flushed_at is None or len(pending) >= EXPORT_FLUSH_ROWS or now - flushed_at >= EXPORT_FLUSH_SECONDS:
+            yield "".join(pending)
+            pending = []
+            flushed_at = now
+
+    if pending:
+        yield "".join(pending)
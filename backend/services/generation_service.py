@@ -0,0 +1,271 @@
+"""Services for timetable generation bookkeeping."""
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.orm import Session
+from models import GenerationCache, GenerationRun, TimetableOption
+from portfolio import STRATEGIES
+from scheduler import MODEL_VERSION, TimetableScheduler
+import metrics
+
+# Solver memory one generation request may use, in MB (see plan_generation)
+GENERATION_MEMORY_BUDGET_MB = float(os.getenv("GENERATION_MEMORY_BUDGET_MB", "2048"))
+
+
+def _canonical(value):
+    """Order-independent form of scheduler input: entity lists sorted by id, id lists sorted."""
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        items = [_canonical(item) for item in value]
+        if all(isinstance(item, dict) and 'id' in item for item in items):
+            return sorted(items, key=lambda item: str(item['id']))
+        if all(isinstance(item, (int, str)) for item in items):
+            return sorted(items, key=str)
+        return items
+    return value
+
+
+def problem_fingerprint(problem: dict, settings: dict) -> str:
+    """
+    Hash a loaded scheduling problem and solver settings.
+
+    ``problem`` is the output of ``SchedulingService.load_problem``, so it
+    already contains the qualifications, availability, fixed slots and
+    elective baskets read from the database; any change to those changes
+    the fingerprint.
+    """
+    payload = {
+        "model_version": MODEL_VERSION,
+        "problem": _canonical(problem),
+        "settings": _canonical(settings)
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def plan_generation(scheduler: TimetableScheduler, strategies: Optional[List[str]], relax: bool,
+                    budget_mb: Optional[float] = None) -> dict:
+    """
+    Fit a generation request into the memory budget before any model is built.
+
+    Uses ``TimetableScheduler.estimate_size``, counting the relaxed
+    re-solve when ``relax`` is set. Portfolio strategies each build their
+    own model, so their estimates add up; over budget, the request is
+    solved without the portfolio. A full-engine request over budget is
+    decomposed, and one that does not fit even then is rejected.
+
+    Returns:
+        dict with the ``engine`` and ``strategies`` to solve with, the
+        ``estimate`` for them, whether the engine was ``decomposed`` to fit,
+        and ``rejected``: None, or why the request cannot run
+    """
+    budget_mb = GENERATION_MEMORY_BUDGET_MB if budget_mb is None else budget_mb
+    estimates = {}
+
+    def estimate(engine):
+        if engine not in estimates:
+            estimates[engine] = scheduler.estimate_size(engine)
+            if relax:
+                relaxed = scheduler.estimate_size(engine, relaxed=True)
+                if relaxed['memory_mb'] > estimates[engine]['memory_mb']:
+                    estimates[engine] = relaxed
+        return estimates[engine]
+
+    if strategies:
+        engines = [STRATEGIES[name].get('constraints', {}).get('engine', scheduler.engine) for name in strategies]
+        total = {
+            key: sum(estimate(engine)[key] for engine in engines)
+            for key in ('variables', 'constraints', 'memory_mb')
+        }
+        if total['memory_mb'] <= budget_mb:
+            return {'engine': scheduler.engine, 'strategies': strategies, 'estimate': total,
+                    'decomposed': False, 'rejected': None}
+
+    for engine in dict.fromkeys((scheduler.engine, 'decomposed')):
+        if estimate(engine)['memory_mb'] <= budget_mb:
+            return {'engine': engine, 'strategies': None, 'estimate': estimate(engine),
+                    'decomposed': engine != scheduler.engine, 'rejected': None}
+
+    smallest = estimate('decomposed')
+    return {
+        'engine': 'decomposed', 'strategies': None, 'estimate': smallest, 'decomposed': True,
+        'rejected': (
+            f"Problem too large to solve: the decomposed model needs about {smallest['variables']} "
+            f"variables and {smallest['memory_mb']:.0f} MB, over the {budget_mb:.0f} MB budget. "
+            "Generate fewer batches at a time, for example one program with constraints.program, "
+            "or raise GENERATION_MEMORY_BUDGET_MB."
+        )
+    }
+
+
+def peak_memory_mb() -> Optional[float]:
+    """Peak resident memory of this process or its largest child so far, in MB; None where unknown."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (2 ** 20 if sys.platform == "darwin" else 1024)
+
+
+class GenerationCacheService:
+    """Service for reusing solver results of identical generation requests."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get(self, fingerprint: str) -> Optional[GenerationCache]:
+        """Get the cache entry for a fingerprint, counting the hit."""
+        entry = self.db.query(GenerationCache).filter(GenerationCache.fingerprint == fingerprint).first()
+        if entry:
+            entry.hit_count = (entry.hit_count or 0) + 1
+            entry.last_hit_at = datetime.utcnow()
+            self.db.commit()
+        return entry
+
+    def store(self, fingerprint: str, solutions: List[list], timetable_ids: List[int]) -> GenerationCache:
+        """Store solver results and the options saved from them."""
+        entry = self.db.query(GenerationCache).filter(GenerationCache.fingerprint == fingerprint).first()
+        if not entry:
+            entry = GenerationCache(fingerprint=fingerprint, solutions=solutions, timetable_ids=timetable_ids)
+            self.db.add(entry)
+        else:
+            entry.solutions = solutions
+            entry.timetable_ids = timetable_ids
+        self.db.commit()
+        self.db.refresh(entry)
+        return entry
+
+    def get_timetables(self, entry: GenerationCache) -> List[Optional[TimetableOption]]:
+        """The options saved for each cached solution, None where one was deleted since."""
+        ids = entry.timetable_ids or []
+        by_id = {
+            tt.id: tt
+            for tt in self.db.query(TimetableOption).filter(TimetableOption.id.in_(ids))
+        }
+        timetables = [by_id.get(tid) for tid in ids]
+        return timetables + [None] * (len(entry.solutions) - len(timetables))
+
+    def clear(self) -> int:
+        """Delete all cache entries. Returns the number removed."""
+        result = self.db.execute(delete(GenerationCache))
+        self.db.commit()
+        return result.rowcount
+
+
+# Columns averaged per day in run trends
+TREND_COLUMNS = (
+    "num_variables", "num_constraints", "load_seconds", "model_build_seconds",
+    "presolve_seconds", "solve_seconds", "persistence_seconds", "total_seconds"
+)
+
+
+class GenerationRunService:
+    """Service for solver telemetry recorded per generation request."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record(self, user_id: Optional[int], fingerprint: Optional[str], cached: bool,
+               total_seconds: float, **stats) -> GenerationRun:
+        """
+        Store one generation run and count it in the process metrics.
+
+        ``stats`` are ``TimetableScheduler.stats`` plus the timings measured
+        around it (``load_seconds``, ``persistence_seconds``); keys without a
+        matching column are ignored.
+        """
+        columns = GenerationRun.__table__.columns.keys()
+        run = GenerationRun(
+            user_id=user_id,
+            fingerprint=fingerprint,
+            cached=cached,
+            total_seconds=total_seconds,
+            **{key: value for key, value in stats.items() if key in columns}
+        )
+        self.db.add(run)
+        self.db.commit()
+        self.db.refresh(run)
+        metrics.observe_generation(run.status, run.total_seconds)
+        return run
+
+    def get_recent(self, limit: int = 50, cached: Optional[bool] = None) -> List[GenerationRun]:
+        """Get the latest runs, newest first."""
+        query = self.db.query(GenerationRun)
+        if cached is not None:
+            query = query.filter(GenerationRun.cached == cached)
+        return query.order_by(GenerationRun.id.desc()).limit(limit).all()
+
+    def get_trends(self, days: int = 30) -> List[dict]:
+        """
+        Daily aggregates over the last ``days``, oldest day first.
+
+        Timings and model sizes are averaged over solved runs only; cache
+        hits are counted separately so they do not hide solver slowdowns.
+        """
+        since = datetime.utcnow() - timedelta(days=days)
+        day = func.date(GenerationRun.created_at)
+        solved = GenerationRun.cached.is_(False)
+
+        def solved_only(column):
+            return case((solved, column))
+
+        stmt = (
+            select(
+                day.label("day"),
+                func.count(solved_only(GenerationRun.id)).label("runs"),
+                func.count(case((GenerationRun.cached.is_(True), GenerationRun.id))).label("cache_hits"),
+                func.max(solved_only(GenerationRun.total_seconds)).label("max_total_seconds"),
+                *[
+                    func.avg(solved_only(getattr(GenerationRun, column))).label(f"avg_{column}")
+                    for column in TREND_COLUMNS
+                ]
+            )
+            .where(GenerationRun.created_at >= since)
+            .group_by(day)
+            .order_by(day)
+        )
+        trends = []
+        for row in self.db.execute(stmt):
+            data = row._asdict()
+            data["day"] = str(data["day"])
+            trends.append(data)
+        return trends
+
+    def get_strategy_stats(self, days: int = 30) -> List[dict]:
+        """
+        Per-strategy results of portfolio runs over the last ``days``.
+
+        For each strategy: runs it was raced in, wins, runs where it found
+        solutions or proved infeasibility before being terminated, and its
+        mean seconds to report in those runs. Sorted by wins.
+        """
+        since = datetime.utcnow() - timedelta(days=days)
+        rows = self.db.execute(
+            select(GenerationRun.strategy, GenerationRun.strategy_results)
+            .where(GenerationRun.created_at >= since, GenerationRun.strategy_results.isnot(None))
+        )
+        stats = {}
+        for winner, results in rows:
+            for name, result in (results or {}).items():
+                entry = stats.setdefault(name, {"strategy": name, "runs": 0, "wins": 0, "finished": 0, "seconds": []})
+                entry["runs"] += 1
+                entry["wins"] += name == winner
+                if result.get("status") in ("OPTIMAL", "FEASIBLE", "INFEASIBLE"):
+                    entry["finished"] += 1
+                    entry["seconds"].append(result.get("seconds") or 0.0)
+        for entry in stats.values():
+            seconds = entry.pop("seconds")
+            entry["mean_seconds"] = sum(seconds) / len(seconds) if seconds else None
+        return sorted(stats.values(), key=lambda entry: (-entry["wins"], entry["strategy"]))
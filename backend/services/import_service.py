@@ -0,0 +1,187 @@
+"""Service for bulk importing input data entities."""
+from typing import Iterable, Iterator, List, Type
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.orm import Session
+from models import (
+    Classroom, Batch, Subject, Faculty, FacultyAvailability, FacultyLeave, ElectivePreference, TimeSlot
+)
+
+# Rows validated, uniqueness-checked and inserted per round trip
+IMPORT_CHUNK_SIZE = 500
+
+# Columns with a unique constraint, checked before inserting
+UNIQUE_FIELDS = {
+    Classroom: (),
+    Batch: (),
+    Subject: ("code",),
+    Faculty: ("employee_id", "email"),
+    ElectivePreference: (),
+}
+
+
+def _chunks(rows: Iterable[dict], size: int) -> Iterator[List[tuple]]:
+    """Group ``(row_number, row)`` pairs into lists of ``size``."""
+    chunk = []
+    for row_number, row in enumerate(rows, start=1):
+        chunk.append((row_number, row))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _format_validation_error(error: ValidationError) -> List[dict]:
+    return [
+        {"field": ".".join(str(part) for part in err["loc"]), "message": err["msg"]}
+        for err in error.errors()
+    ]
+
+
+class BulkImportService:
+    """Service for validating and inserting many rows in one transaction."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def import_rows(self, model: Type, schema: Type[BaseModel], rows: Iterable[dict]) -> dict:
+        """
+        Validate and insert rows for ``model``.
+
+        Args:
+            model: SQLAlchemy model to insert into
+            schema: Pydantic model used to validate each row
+            rows: Iterable of raw row dicts (JSON objects or CSV records)
+
+        Returns:
+            Import summary with per-row errors. Valid rows are inserted with
+            executemany and committed together; invalid rows are skipped.
+            Faculty ``availability`` and ``leaves`` go to faculty_availability
+            and faculty_leaves, the same as for a single create.
+        """
+        unique_fields = UNIQUE_FIELDS.get(model, ())
+        seen = {field: set() for field in unique_fields}
+        created = 0
+        errors = []
+        slot_numbers = (
+            dict(self.db.execute(select(TimeSlot.id, TimeSlot.slot_number)).all()) if model is Faculty else {}
+        )
+
+        try:
+            for chunk in _chunks(rows, IMPORT_CHUNK_SIZE):
+                valid = []
+                for row_number, row in chunk:
+                    try:
+                        valid.append((row_number, schema(**row).model_dump()))
+                    except ValidationError as e:
+                        errors.append({"row": row_number, "errors": _format_validation_error(e)})
+
+                if model is Faculty:
+                    valid = self._check_availability(valid, slot_numbers, errors)
+
+                existing = self._existing_values(model, unique_fields, [data for _, data in valid])
+
+                to_insert = []
+                for row_number, data in valid:
+                    duplicates = [
+                        {"field": field, "message": f"{field} '{data[field]}' already exists"}
+                        for field in unique_fields
+                        if data[field] in existing[field] or data[field] in seen[field]
+                    ]
+                    if duplicates:
+                        errors.append({"row": row_number, "errors": duplicates})
+                        continue
+                    for field in unique_fields:
+                        seen[field].add(data[field])
+                    to_insert.append(data)
+
+                if to_insert:
+                    if model is Faculty:
+                        availability = {
+                            data["employee_id"]: (data.pop("availability"), data.pop("leaves"))
+                            for data in to_insert
+                        }
+                    self.db.execute(insert(model), to_insert)
+                    if model is Faculty:
+                        self._insert_availability(availability, slot_numbers)
+                    created += len(to_insert)
+
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        errors.sort(key=lambda error: error["row"])
+        return {
+            "created": created,
+            "failed": len(errors),
+            "errors": errors
+        }
+
+    def _check_availability(self, rows: List[tuple], slot_numbers: dict, errors: List[dict]) -> List[tuple]:
+        """Drop faculty rows with unknown time slots or reversed leave, reporting them."""
+        checked = []
+        for row_number, data in rows:
+            row_errors = []
+            slot_ids = (data["availability"] or {}).get("unavailable_time_slot_ids", [])
+            unknown = sorted({tid for tid in slot_ids if tid not in slot_numbers})
+            if unknown:
+                row_errors.append({"field": "availability", "message": f"Unknown time slot ids: {unknown}"})
+            for index, leave in enumerate(data["leaves"] or []):
+                if leave["end_date"] < leave["start_date"]:
+                    row_errors.append({"field": f"leaves.{index}", "message": "end_date must not be before start_date"})
+                if leave["time_slot_id"] is not None and leave["time_slot_id"] not in slot_numbers:
+                    row_errors.append({"field": f"leaves.{index}",
+                                       "message": f"Unknown time slot id: {leave['time_slot_id']}"})
+            if row_errors:
+                errors.append({"row": row_number, "errors": row_errors})
+            else:
+                checked.append((row_number, data))
+        return checked
+
+    def _insert_availability(self, by_employee_id: dict, slot_numbers: dict):
+        """Insert the weekly unavailable slots, stored masks and leave of just-inserted faculty."""
+        by_employee_id = {
+            employee_id: (availability, leaves)
+            for employee_id, (availability, leaves) in by_employee_id.items()
+            if availability or leaves
+        }
+        if not by_employee_id:
+            return
+
+        faculty_ids = dict(self.db.execute(
+            select(Faculty.employee_id, Faculty.id).where(Faculty.employee_id.in_(by_employee_id))
+        ).all())
+        slot_rows, leave_rows, masks = [], [], []
+        for employee_id, (availability, leaves) in by_employee_id.items():
+            faculty_id = faculty_ids[employee_id]
+            slot_ids = sorted(set((availability or {}).get("unavailable_time_slot_ids", [])))
+            if slot_ids:
+                slot_rows.extend({"faculty_id": faculty_id, "time_slot_id": tid} for tid in slot_ids)
+                mask = sum(1 << n for n in {slot_numbers[tid] for tid in slot_ids})
+                masks.append({"id": faculty_id, "unavailable_mask": mask})
+            leave_rows.extend({"faculty_id": faculty_id, **leave} for leave in leaves or [])
+
+        if slot_rows:
+            self.db.execute(insert(FacultyAvailability), slot_rows)
+            self.db.execute(update(Faculty), masks)
+        if leave_rows:
+            self.db.execute(insert(FacultyLeave), leave_rows)
+
+    def _existing_values(self, model: Type, unique_fields: tuple, rows: List[dict]) -> dict:
+        """Look up which unique values of a chunk already exist, in one query."""
+        existing = {field: set() for field in unique_fields}
+        if not unique_fields or not rows:
+            return existing
+
+        columns = [getattr(model, field) for field in unique_fields]
+        clauses = [
+            column.in_({row[field] for row in rows})
+            for field, column in zip(unique_fields, columns)
+        ]
+        for record in self.db.execute(select(*columns).where(or_(*clauses))):
+            for field, value in zip(unique_fields, record):
+                existing[field].add(value)
+        return existing
@@ -0,0 +1,113 @@
+"""Service for improving stored timetables with Large Neighbourhood Search."""
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import TimetableEntry, TimeSlot, Subject, Faculty, Batch, Classroom
+from improver import TimetableImprover
+from services.data_service import TimetableService
+from services.scheduling_service import SchedulingService
+
+CLASSROOM_FIELDS = ("id", "name", "capacity", "type", "building", "floor")
+BATCH_FIELDS = ("id", "name", "program", "department", "year", "semester", "student_count", "shift")
+SUBJECT_FIELDS = ("id", "code", "name", "department", "type", "credits", "hours_per_week", "requires_lab")
+FACULTY_FIELDS = ("id", "name", "employee_id", "department", "max_hours_per_week")
+
+
+def _fields(record, fields) -> dict:
+    return {field: getattr(record, field) for field in fields}
+
+
+class ImprovementService:
+    """Service that loads a stored timetable into ``TimetableImprover`` and saves the result."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def load(self, timetable_id: int, constraints: dict, seed: Optional[int] = None) -> TimetableImprover:
+        """
+        Improver for a stored timetable option.
+
+        Entries are placed on the grid by their time slot's ``slot_number``.
+        Subjects are scheduled for the batches they appear with, and faculty
+        qualifications, availability and other programs' occupancy come
+        from the database as for generation.
+        """
+        slots_per_day = constraints.get('slots_per_day', 8)
+        rows = self.db.execute(
+            select(TimetableEntry.batch_id, TimetableEntry.subject_id, TimetableEntry.classroom_id,
+                   TimetableEntry.faculty_id, TimetableEntry.is_fixed, TimeSlot.slot_number)
+            .join(TimeSlot, TimeSlot.id == TimetableEntry.time_slot_id)
+            .where(TimetableEntry.timetable_id == timetable_id)
+        ).all()
+        if not rows:
+            raise ValueError("Timetable has no entries to improve")
+        schedule = [
+            {
+                'batch': row.batch_id,
+                'subject': row.subject_id,
+                'day': row.slot_number // slots_per_day,
+                'slot': row.slot_number % slots_per_day,
+                'classroom': row.classroom_id,
+                'faculty': row.faculty_id,
+                'is_fixed': bool(row.is_fixed)
+            }
+            for row in rows
+        ]
+
+        pairs = {(row.batch_id, row.subject_id) for row in rows}
+        subjects = {s.id: s for s in self.db.query(Subject).filter(Subject.id.in_({p[1] for p in pairs}))}
+        subject_dicts = [
+            dict(_fields(subjects[subject_id], SUBJECT_FIELDS), batch_id=batch_id)
+            for batch_id, subject_id in sorted(pairs) if subject_id in subjects
+        ]
+        batches = self.db.query(Batch).filter(Batch.id.in_({p[0] for p in pairs})).all()
+        classrooms = self.db.query(Classroom).filter(Classroom.available.isnot(False)).all()
+        faculty = self.db.query(Faculty).all()
+
+        problem = SchedulingService(self.db).load_problem(
+            [_fields(room, CLASSROOM_FIELDS) for room in classrooms],
+            [_fields(fac, FACULTY_FIELDS) for fac in faculty],
+            subject_dicts,
+            [_fields(batch, BATCH_FIELDS) for batch in batches],
+            constraints
+        )
+        return TimetableImprover(
+            problem['classrooms'], problem['faculty'], problem['subjects'], problem['batches'],
+            constraints, schedule, seed=seed, occupied=problem['occupied']
+        )
+
+    def improve(self, improver: TimetableImprover, name: str, time_limit: float,
+                user_id: int) -> Iterator[dict]:
+        """
+        Run LNS with an improver from ``load``, yielding progress events.
+
+        Yields one ``progress`` event per iteration and a final ``done``
+        event. When the penalty went down, the improved schedule is saved
+        as a new draft option called ``name``, whose id is in ``done``;
+        otherwise ``timetable_id`` is None.
+        """
+        initial = improver.penalty()
+        final = initial
+        iterations = improved = 0
+        for progress in improver.improve(time_limit):
+            iterations += 1
+            improved += progress['outcome'] == 'improved'
+            final = progress['penalty']
+            yield dict(progress, event="progress")
+
+        new_id = None
+        if final < initial:
+            new_id = TimetableService(self.db).create_timetable(
+                name=name,
+                entries=improver.schedule(),
+                generated_by=user_id
+            ).id
+        yield {
+            "event": "done",
+            "timetable_id": new_id,
+            "initial_penalty": initial,
+            "final_penalty": final,
+            "iterations": iterations,
+            "improvements": improved
+        }
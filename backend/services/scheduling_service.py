@@ -0,0 +1,94 @@
+"""Service for assembling scheduler input from the database."""
+from sqlalchemy.orm import Session
+from services.data_service import (
+    QualificationService, AvailabilityService, FixedSlotService, ElectivePreferenceService, TimetableService
+)
+from scheduler import group_electives
+from datetime import date
+from typing import List
+
+
+class SchedulingService:
+    """Service that loads a scheduling problem for ``TimetableScheduler``."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def load_problem(self, classrooms: List[dict], faculty: List[dict], subjects: List[dict],
+                     batches: List[dict], constraints: dict) -> dict:
+        """
+        Build scheduler input, filling in data stored in the database.
+
+        Faculty entries that do not carry a ``subjects`` list get their
+        qualifications from the faculty_subjects table, read in one query.
+        Entries without an ``availability_mask`` get one built from their
+        weekly unavailable slots and, when ``constraints['week_start']`` is
+        set, their leave during that week. Fixed slots of the requested
+        batches are loaded so the scheduler can treat them as constants.
+        Elective preferences are grouped into parallel baskets per batch.
+
+        With ``constraints['program']`` (UG or PG) only that program's
+        batches and their subjects are scheduled. Rooms and faculty used by
+        other batches' active timetables are loaded as occupied, so
+        programs can be scheduled one at a time around each other.
+
+        Returns:
+            Keyword arguments for ``TimetableScheduler``
+        """
+        faculty = [dict(fac) for fac in faculty]
+        program = constraints.get('program')
+        if program:
+            batches = [batch for batch in batches if batch.get('program') == program]
+            kept = {batch['id'] for batch in batches}
+            subjects = [subject for subject in subjects if subject.get('batch_id') in kept]
+
+        missing = [fac['id'] for fac in faculty if 'subjects' not in fac]
+        if missing:
+            qualifications = QualificationService(self.db).get_qualification_map(missing)
+            for fac in faculty:
+                if 'subjects' not in fac:
+                    fac['subjects'] = qualifications.get(fac['id'], [])
+
+        missing = [fac['id'] for fac in faculty if 'availability_mask' not in fac]
+        if missing:
+            week_start = constraints.get('week_start')
+            if isinstance(week_start, str):
+                week_start = date.fromisoformat(week_start)
+            total_slots = constraints.get('days', 5) * constraints.get('slots_per_day', 8)
+            full_grid = (1 << total_slots) - 1
+            unavailable = AvailabilityService(self.db).get_unavailable_masks(missing, week_start)
+            for fac in faculty:
+                if 'availability_mask' not in fac:
+                    fac['availability_mask'] = full_grid & ~(unavailable.get(fac['id']) or 0)
+
+        batch_ids = [batch['id'] for batch in batches]
+        fixed_slots = FixedSlotService(self.db).get_for_batches(batch_ids)
+        elective_baskets = self.build_elective_baskets(batch_ids, subjects, len(classrooms))
+        occupied = TimetableService(self.db).get_active_occupancy(batch_ids)
+
+        return {
+            "classrooms": classrooms,
+            "faculty": faculty,
+            "subjects": subjects,
+            "batches": batches,
+            "constraints": constraints,
+            "fixed_slots": fixed_slots,
+            "elective_baskets": elective_baskets,
+            "occupied": occupied
+        }
+
+    def build_elective_baskets(self, batch_ids: List[int], subjects: List[dict], max_basket_size: int) -> dict:
+        """
+        Group each batch's electives into baskets without shared students.
+
+        Only preferences for subjects scheduled for that batch are used.
+        """
+        scheduled = {(s.get('batch_id'), s['id']) for s in subjects}
+        preferences = ElectivePreferenceService(self.db).get_pairs_for_batches(batch_ids)
+
+        baskets = {}
+        for batch_id, pairs in preferences.items():
+            pairs = [(student, subject) for student, subject in pairs if (batch_id, subject) in scheduled]
+            if pairs:
+                baskets[batch_id] = group_electives(pairs, max_basket_size)
+        return baskets
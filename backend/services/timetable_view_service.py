@@ -0,0 +1,130 @@
+"""Service for building timetable API responses."""
+from typing import Dict, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import TimetableOption, TimetableEntry, Subject, Faculty, Batch, Classroom, TimeSlot
+
+# Order of the values in a compact entry
+COMPACT_ENTRY_FIELDS = ["id", "subject", "faculty", "batch", "classroom", "time_slot", "is_fixed"]
+
+# Entity columns included in responses, per lookup table
+LOOKUP_COLUMNS = {
+    "subjects": (Subject, ("id", "code", "name")),
+    "faculty": (Faculty, ("id", "name", "employee_id")),
+    "batches": (Batch, ("id", "name", "department")),
+    "classrooms": (Classroom, ("id", "name", "capacity")),
+    "time_slots": (TimeSlot, ("id", "day", "start_time", "end_time", "slot_number")),
+}
+
+ENTRY_COLUMNS = (
+    TimetableEntry.id, TimetableEntry.timetable_id, TimetableEntry.subject_id, TimetableEntry.faculty_id,
+    TimetableEntry.batch_id, TimetableEntry.classroom_id, TimetableEntry.time_slot_id, TimetableEntry.is_fixed
+)
+
+
+def _timetable_summary(timetable: TimetableOption) -> dict:
+    return {
+        "id": timetable.id,
+        "name": timetable.name,
+        "status": timetable.status,
+        "generated_at": timetable.generated_at.isoformat() if timetable.generated_at else None,
+        "utilization_rate": timetable.utilization_rate,
+        "conflict_count": timetable.conflict_count,
+        "quality_score": timetable.quality_score
+    }
+
+
+def _plain(value):
+    """Times as strings, so responses need no further encoding."""
+    return value if value is None or isinstance(value, (int, float, str, bool)) else str(value)
+
+
+class TimetableViewService:
+    """Service that serializes timetables with a fixed number of queries."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _entries_by_timetable(self, timetable_ids: List[int]) -> Dict[int, list]:
+        """Entry rows (see ``ENTRY_COLUMNS``) of the given timetables, in one query."""
+        grouped = {tid: [] for tid in timetable_ids}
+        if not timetable_ids:
+            return grouped
+        rows = self.db.execute(
+            select(*ENTRY_COLUMNS)
+            .where(TimetableEntry.timetable_id.in_(timetable_ids))
+            .order_by(TimetableEntry.id)
+        )
+        for row in rows:
+            grouped[row.timetable_id].append(row)
+        return grouped
+
+    def _lookup(self, entries: List) -> Dict[str, Dict[str, dict]]:
+        """Referenced subjects, faculty, batches, classrooms and time slots, one query per table."""
+        referenced = {
+            "subjects": {row.subject_id for row in entries},
+            "faculty": {row.faculty_id for row in entries},
+            "batches": {row.batch_id for row in entries},
+            "classrooms": {row.classroom_id for row in entries},
+            "time_slots": {row.time_slot_id for row in entries},
+        }
+        lookup = {}
+        for table, (model, columns) in LOOKUP_COLUMNS.items():
+            ids = referenced[table]
+            records = {}
+            if ids:
+                stmt = select(*[getattr(model, column) for column in columns]).where(model.id.in_(ids))
+                for record in self.db.execute(stmt):
+                    records[str(record.id)] = {column: _plain(value) for column, value in zip(columns, record)}
+            lookup[table] = records
+        return lookup
+
+    def compact(self, timetables: List[TimetableOption]) -> dict:
+        """
+        Timetables with entries as value lists plus one lookup table.
+
+        Each entry is ``[id, subject_id, faculty_id, batch_id, classroom_id,
+        time_slot_id, is_fixed]`` (see ``entry_fields``); the referenced
+        entities appear once each in ``lookup``, keyed by id.
+        """
+        grouped = self._entries_by_timetable([tt.id for tt in timetables])
+        all_entries = [row for rows in grouped.values() for row in rows]
+        return {
+            "entry_fields": COMPACT_ENTRY_FIELDS,
+            "timetables": [
+                dict(
+                    _timetable_summary(tt),
+                    entries=[
+                        [row.id, row.subject_id, row.faculty_id, row.batch_id,
+                         row.classroom_id, row.time_slot_id, bool(row.is_fixed)]
+                        for row in grouped[tt.id]
+                    ]
+                )
+                for tt in timetables
+            ],
+            "lookup": self._lookup(all_entries)
+        }
+
+    def full(self, timetables: List[TimetableOption]) -> List[dict]:
+        """Timetables with every entry carrying its nested subject, faculty, batch, classroom and time slot."""
+        view = self.compact(timetables)
+        lookup = view["lookup"]
+        missing_slot = {column: None for column in LOOKUP_COLUMNS["time_slots"][1]}
+
+        result = []
+        for timetable in view["timetables"]:
+            entries = []
+            for entry_id, subject_id, faculty_id, batch_id, classroom_id, time_slot_id, is_fixed in timetable["entries"]:
+                entries.append({
+                    "id": entry_id,
+                    "subject": lookup["subjects"].get(str(subject_id)),
+                    "faculty": lookup["faculty"].get(str(faculty_id)),
+                    "batch": lookup["batches"].get(str(batch_id)),
+                    "classroom": lookup["classrooms"].get(str(classroom_id)),
+                    "time_slot": lookup["time_slots"].get(str(time_slot_id), dict(missing_slot, id=time_slot_id)),
+                    "is_fixed": is_fixed
+                })
+            timetable["entries"] = entries
+            result.append(timetable)
+        return result